@@ -0,0 +1,271 @@
+"""
+TrafficTelligence Alerts
+Data-driven alert rules evaluated incrementally as readings arrive
+
+Live readings are compared against per-location, hour-of-week baselines taken
+from the rolling aggregates, and forecasts are compared against per-location
+capacity. Triggered alerts are kept in an active-alert index with dedup and
+expiry, so serving /api/alerts is a read of that index.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+import training
+from features import HOURS_PER_WEEK, epoch_hour_of_week
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+ADVERSE_WEATHER = ['rainy', 'snowy', 'foggy']
+
+DEFAULT_RULES = {
+    # Readings more than this fraction above the baseline volume raise an alert...
+    'volume_spike_ratio': 0.5,
+    # ...which is high severity beyond this fraction
+    'critical_spike_ratio': 0.85,
+    # Speed drop under adverse weather, as a fraction of the baseline speed
+    'weather_slowdown_ratio': 0.2,
+    # Capacity is this multiple of the busiest hour-of-day baseline volume
+    'capacity_headroom': 1.3,
+    # Readings older than this are history, not live traffic
+    'live_window_minutes': 120,
+    # Hours of the forecast compared against capacity
+    'forecast_hours': 3,
+    # Alerts not re-triggered within this time expire
+    'alert_ttl_minutes': 60,
+    # Hour-of-week buckets with fewer readings fall back to the hour-of-day baseline
+    'min_baseline_samples': 3
+}
+
+
+class AlertEngine:
+    """
+    Incremental rule evaluation over new readings
+
+    Baselines are recomputed from the rolling aggregates at most every
+    baseline_refresh_seconds. Between refreshes, evaluating a batch costs time
+    in proportion to the batch, not to the stored history.
+    """
+
+    def __init__(self, aggregates, predictor: Callable[[], Any], history_hours: int,
+                 rules: Dict[str, float] = None, baseline_refresh_seconds: float = 3600,
+                 forecast_interval_seconds: float = 300):
+        self.aggregates = aggregates
+        self.predictor = predictor
+        self.history_hours = history_hours
+        self.rules = {**DEFAULT_RULES, **(rules or {})}
+        self.baseline_refresh_seconds = baseline_refresh_seconds
+        self.forecast_interval_seconds = forecast_interval_seconds
+        self._active: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._baselines = None
+        self._baselines_at = None
+        self._forecast_at = None
+        self.rows_evaluated = 0
+        self.alerts_raised = 0
+
+    def evaluate(self, frame: pd.DataFrame) -> None:
+        """Check a batch of new readings against every rule"""
+        now = datetime.now()
+        live = frame[pd.DatetimeIndex(frame['timestamp']) >= now - timedelta(minutes=self.rules['live_window_minutes'])]
+
+        with self._lock:
+            baselines = self._current_baselines(now, live)
+            if not live.empty and baselines is not None:
+                self._evaluate_readings(live, baselines, now)
+                self.rows_evaluated += len(live)
+
+            if baselines is not None and (self._forecast_at is None or
+                                          time.monotonic() - self._forecast_at >= self.forecast_interval_seconds):
+                self._evaluate_forecast(baselines, now)
+                self._forecast_at = time.monotonic()
+
+    def invalidate_baselines(self) -> None:
+        """Recompute baselines on the next evaluation, e.g. after the aggregates were rebuilt"""
+        with self._lock:
+            self._baselines_at = None
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        """Return unexpired alerts, most severe and most recent first"""
+        with self._lock:
+            self._expire(datetime.now())
+            alerts = [dict(alert) for alert in self._active.values()]
+        alerts.sort(key=lambda alert: alert['last_updated'], reverse=True)
+        alerts.sort(key=lambda alert: SEVERITY_ORDER.get(alert['severity'], len(SEVERITY_ORDER)))
+        return alerts
+
+    def stats(self) -> Dict[str, Any]:
+        """Return evaluation counters"""
+        with self._lock:
+            return {
+                'rows_evaluated': self.rows_evaluated,
+                'alerts_raised': self.alerts_raised,
+                'active_alerts': len(self._active),
+                'baselines_computed_at': self._baselines_at[1].isoformat() if self._baselines_at else None
+            }
+
+    def _current_baselines(self, now: datetime, live: pd.DataFrame) -> Dict[str, Any]:
+        """Return baselines, recomputing them when stale or when a live reading has an unknown location"""
+        stale = self._baselines_at is None or time.monotonic() - self._baselines_at[0] >= self.baseline_refresh_seconds
+        if not stale and not live.empty:
+            stale = not set(live['location'].astype(str).unique()) <= set(self._baselines['index'])
+        if stale:
+            self._baselines = self._compute_baselines(now)
+            self._baselines_at = (time.monotonic(), now)
+        return self._baselines
+
+    def _compute_baselines(self, now: datetime) -> Dict[str, Any]:
+        """Per-location mean volume and speed by hour of week, from completed hours of history"""
+        fields = self.aggregates.analytics.FIELDS
+        end = now.replace(minute=0, second=0, microsecond=0)
+        hour_index, buckets, locations = self.aggregates.location_window(self.history_hours, end)
+        n_fields = len(fields)
+
+        by_week = np.zeros((HOURS_PER_WEEK, len(locations), n_fields))
+        np.add.at(by_week, epoch_hour_of_week(hour_index), buckets)
+        by_day = by_week.reshape(7, 24, len(locations), n_fields).sum(axis=0)
+
+        # Fall back to the hour of day where the hour of week has too few readings
+        counts = by_week[..., fields.index('count')]
+        sparse = counts < self.rules['min_baseline_samples']
+        sums = np.where(sparse[..., None], np.tile(by_day, (7, 1, 1)), by_week)
+        counts = sums[..., fields.index('count')]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume = sums[..., fields.index('vehicle_count')] / counts
+            speed = sums[..., fields.index('average_speed')] / counts
+            hourly_volume = by_day[..., fields.index('vehicle_count')] / by_day[..., fields.index('count')]
+
+        return {
+            'index': {name: i for i, name in enumerate(locations)},
+            'locations': locations,
+            'volume': volume,
+            'speed': speed,
+            'capacity': np.nan_to_num(hourly_volume, nan=0.0, posinf=0.0).max(axis=0, initial=0.0) * self.rules['capacity_headroom']
+        }
+
+    def _evaluate_readings(self, live: pd.DataFrame, baselines: Dict[str, Any], now: datetime) -> None:
+        """Apply the volume spike and weather slowdown rules to live readings"""
+        timestamps = pd.DatetimeIndex(live['timestamp'])
+        how = epoch_hour_of_week(np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64))
+        index = baselines['index']
+        locations = live['location'].astype(str).map(index).to_numpy(dtype=np.float64)
+        known = ~np.isnan(locations)
+        if not known.any():
+            return
+        locations = np.where(known, locations, 0).astype(np.int64)
+
+        volume = live['vehicle_count'].to_numpy(dtype=np.float64)
+        speed = live['average_speed'].to_numpy(dtype=np.float64)
+        baseline_volume = np.where(known, baselines['volume'][how, locations], np.nan)
+        baseline_speed = np.where(known, baselines['speed'][how, locations], np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            excess = volume / baseline_volume - 1
+            slowdown = 1 - speed / baseline_speed
+        adverse = live['weather_condition'].astype(str).str.lower().isin(ADVERSE_WEATHER).to_numpy()
+
+        candidates = pd.DataFrame({
+            'location': live['location'].astype(str).to_numpy(),
+            'timestamp': timestamps,
+            'volume': volume,
+            'baseline_volume': baseline_volume,
+            'excess': excess,
+            'speed': speed,
+            'baseline_speed': baseline_speed,
+            'slowdown': slowdown,
+            'weather': live['weather_condition'].astype(str).to_numpy()
+        })
+
+        # One alert per location and rule: the strongest reading in the batch
+        spikes = candidates[np.nan_to_num(excess, nan=-np.inf) >= self.rules['volume_spike_ratio']]
+        for row in spikes.loc[spikes.groupby('location')['excess'].idxmax()].itertuples():
+            critical = row.excess >= self.rules['critical_spike_ratio']
+            self._raise(now, 'critical_congestion', row.location, {
+                'severity': 'high' if critical else 'medium',
+                'message': f"{'Critical congestion' if critical else 'Heavy traffic'} detected - "
+                           f"{round(row.excess * 100)}% above normal volume",
+                'timestamp': row.timestamp.isoformat(),
+                'estimated_duration': f"{self.rules['alert_ttl_minutes']} minutes",
+                'recommended_action': 'Consider alternative routes',
+                'observed_volume': int(row.volume),
+                'baseline_volume': round(float(row.baseline_volume), 1)
+            })
+
+        slow = candidates[adverse & (np.nan_to_num(slowdown, nan=-np.inf) >= self.rules['weather_slowdown_ratio'])]
+        for row in slow.loc[slow.groupby('location')['slowdown'].idxmax()].itertuples():
+            self._raise(now, 'weather_impact', row.location, {
+                'severity': 'medium',
+                'message': f"{row.weather.title()} conditions reducing traffic flow by {round(row.slowdown * 100)}%",
+                'timestamp': row.timestamp.isoformat(),
+                'estimated_duration': f"{self.rules['alert_ttl_minutes']} minutes",
+                'recommended_action': 'Adjust signal timing for weather conditions',
+                'observed_speed': round(float(row.speed), 1),
+                'baseline_speed': round(float(row.baseline_speed), 1)
+            })
+
+    def _evaluate_forecast(self, baselines: Dict[str, Any], now: datetime) -> None:
+        """Compare the next hours' predicted volume at every location against its capacity"""
+        locations = baselines['locations']
+        hours = int(self.rules['forecast_hours'])
+        if not locations or hours <= 0:
+            return
+
+        start = pd.Timestamp(now.replace(minute=0, second=0, microsecond=0)) + pd.Timedelta(hours=1)
+        times = start + pd.to_timedelta(np.arange(hours), unit='h')
+        location_types = [training.location_type(name) for name in locations]
+        batch = self.predictor().predict_batch({
+            'hour': np.tile(times.hour.to_numpy(), len(locations)),
+            'day_of_week': np.tile(times.dayofweek.to_numpy(), len(locations)),
+            'location_type': np.repeat(location_types, hours),
+            'location': np.repeat(locations, hours),
+            'timestamp': np.tile(times.to_numpy(), len(locations))
+        }, use_cache=False)
+
+        predicted = batch['predicted_volume'].reshape(len(locations), hours)
+        capacity = baselines['capacity']
+        over = (predicted > capacity[:, None]) & (capacity[:, None] > 0)
+
+        for i in np.flatnonzero(over.any(axis=1)):
+            first = int(np.argmax(over[i]))
+            peak = int(predicted[i].max())
+            self._raise(now, 'capacity_forecast', locations[i], {
+                'severity': 'high' if peak > capacity[i] * 1.2 else 'medium',
+                'message': f"Predicted volume {peak} exceeds capacity {int(capacity[i])} "
+                           f"({round((peak / capacity[i] - 1) * 100)}% over)",
+                'timestamp': times[first].isoformat(),
+                'estimated_duration': f"{int(over[i].sum())} hours",
+                'recommended_action': 'Plan traffic diversion routes',
+                'predicted_volume': peak,
+                'capacity': int(capacity[i])
+            })
+
+    def _raise(self, now: datetime, alert_type: str, location: str, fields: Dict[str, Any]) -> None:
+        """Insert or refresh an alert, keyed on (type, location)"""
+        key = (alert_type, location)
+        existing = self._active.get(key)
+        if existing is None:
+            self.alerts_raised += 1
+        self._active[key] = {
+            'id': f"alert_{alert_type}_{location.lower().replace(' ', '_')}",
+            'type': alert_type,
+            'location': location,
+            **fields,
+            'first_detected': existing['first_detected'] if existing else now.isoformat(),
+            'last_updated': now.isoformat(),
+            'expires_at': (now + timedelta(minutes=self.rules['alert_ttl_minutes'])).isoformat()
+        }
+
+    def _expire(self, now: datetime) -> None:
+        """Drop alerts past their expiry time"""
+        cutoff = now.isoformat()
+        for key in [key for key, alert in self._active.items() if alert['expires_at'] <= cutoff]:
+            del self._active[key]
@@ -7,15 +7,35 @@ This Flask application provides the backend API for the TrafficTelligence system
 including machine learning models for traffic prediction and data processing.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import json
+import base64
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import os
+import threading
+import uuid
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from storage import TrafficStore, create_store
+import training
+from prediction import PredictionCache, TrafficPredictor
+from ingestion import IngestionBuffer, parse_batch, validate_batch
+from alerts import AlertEngine
+from online import OnlineCorrections
+from features import FeatureStore
+from streaming import FeedFull, LiveFeed, TOPICS
+import forecasting
+import uncertainty
+import encoding
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,221 +44,1020 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-class TrafficPredictor:
+class TrafficDataGenerator:
     """
-    Machine Learning model for traffic volume prediction
+    Generates realistic traffic data for demonstration purposes
     
-    This class implements a simplified ML model for demonstration purposes.
-    In a production environment, this would be replaced with more sophisticated
-    models like Random Forest, Neural Networks, or ensemble methods.
+    Data is produced columnar: the whole (timestamp x location) grid is built
+    with array operations from a seeded np.random.Generator, and dictionaries
+    are only materialized at the JSON boundary by frame_to_records.
     """
     
-    def __init__(self):
-        self.model_trained = False
-        self.feature_weights = {
-            'hour_of_day': 0.35,
-            'day_of_week': 0.18,
-            'weather_temp': 0.15,
-            'weather_condition': 0.12,
-            'special_events': 0.10,
-            'historical_avg': 0.10
+    LOCATIONS = ['Highway A1', 'Downtown Main St', 'Airport Road', 'Industrial Zone', 'Residential Area']
+    WEATHER_CONDITIONS = ['clear', 'cloudy', 'rainy', 'foggy']
+    CONGESTION_LEVELS = ['low', 'medium', 'high', 'critical']
+    ROAD_TYPES = ['Highway', 'Urban']
+    
+    # Base volume varies by location
+    BASE_VOLUMES = {
+        'Highway A1': 400,
+        'Downtown Main St': 300,
+        'Airport Road': 350,
+        'Industrial Zone': 200,
+        'Residential Area': 150
+    }
+    
+    # Hours generated per frame when streaming long ranges
+    CHUNK_HOURS = 24 * 30
+    
+    def __init__(self, seed: int = None):
+        self.rng = np.random.default_rng(seed)
+        self._base_volumes = np.array([self.BASE_VOLUMES[location] for location in self.LOCATIONS], dtype=np.float64)
+        self._road_codes = np.array([0 if 'Highway' in location else 1 for location in self.LOCATIONS], dtype=np.int8)
+    
+    def generate_historical_data(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Generate historical traffic data"""
+        return self.frame_to_records(self.generate_historical_frame(days))
+    
+    def generate_historical_frame(self, days: int = 30, end: datetime = None) -> pd.DataFrame:
+        """
+        Generate hourly historical traffic data as a columnar DataFrame
+        
+        Args:
+            days: Number of days of hourly data to generate
+            end: Exclusive end of the range (defaults to now)
+            
+        Returns:
+            DataFrame ordered by timestamp, then location
+        """
+        end = end or datetime.now()
+        hours = days * 24
+        return self._generate_block(end - timedelta(hours=hours), hours)
+    
+    def iter_historical_frames(self, days: int = 30, end: datetime = None):
+        """
+        Generate historical traffic data as a sequence of bounded-size frames
+        
+        Peak memory depends on CHUNK_HOURS rather than on the length of the
+        range, so multi-year ranges can be streamed into storage or serialized.
+        """
+        end = end or datetime.now()
+        return self.iter_frames_between(end - timedelta(hours=days * 24), end)
+    
+    def iter_frames_between(self, start: datetime, end: datetime):
+        """Generate hourly frames for every hour from start (inclusive) to end (exclusive)"""
+        hours = max(0, int((end - start) / timedelta(hours=1)))
+        
+        for offset in range(0, hours, self.CHUNK_HOURS):
+            yield self._generate_block(start + timedelta(hours=offset), min(self.CHUNK_HOURS, hours - offset))
+    
+    def _generate_block(self, start: datetime, hours: int) -> pd.DataFrame:
+        """Generate the (timestamp x location) grid for a contiguous range of hours"""
+        n_locations = len(self.LOCATIONS)
+        n_rows = hours * n_locations
+        rng = self.rng
+        
+        timestamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(hours), unit='h')
+        hour = np.repeat(timestamps.hour.to_numpy(), n_locations)
+        day_of_week = np.repeat(timestamps.dayofweek.to_numpy(), n_locations)
+        location_codes = np.tile(np.arange(n_locations, dtype=np.int8), hours)
+        base_volume = self._base_volumes[location_codes]
+        
+        # Apply time-based variations (rush hours, daytime, night/early morning)
+        volume_multiplier = np.select(
+            [((7 <= hour) & (hour <= 9)) | ((17 <= hour) & (hour <= 19)), (10 <= hour) & (hour <= 16)],
+            [1.6, 1.1],
+            default=0.4
+        )
+        
+        # Weekend adjustment
+        volume_multiplier = np.where(day_of_week >= 5, volume_multiplier * 0.7, volume_multiplier)
+        
+        # Add randomness
+        volume = (base_volume * volume_multiplier * rng.uniform(0.8, 1.2, n_rows)).astype(np.int32)
+        
+        # Generate other metrics
+        avg_speed = np.maximum(20, (80 - (volume / base_volume) * 30 + rng.uniform(-10, 10, n_rows)).astype(np.int32))
+        
+        # Congestion level based on volume
+        congestion_codes = np.select(
+            [volume > base_volume * 1.4, volume > base_volume * 1.1, volume > base_volume * 0.8],
+            [3, 2, 1],
+            default=0
+        ).astype(np.int8)
+        
+        return pd.DataFrame({
+            'timestamp': np.repeat(timestamps.to_numpy(), n_locations),
+            'location': pd.Categorical.from_codes(location_codes, self.LOCATIONS),
+            'vehicle_count': volume,
+            'average_speed': avg_speed,
+            'congestion_level': pd.Categorical.from_codes(congestion_codes, self.CONGESTION_LEVELS),
+            'weather_condition': pd.Categorical.from_codes(
+                rng.integers(0, len(self.WEATHER_CONDITIONS), n_rows, dtype=np.int8), self.WEATHER_CONDITIONS),
+            'temperature': rng.uniform(5, 35, n_rows).astype(np.int8),
+            'visibility': rng.uniform(1, 10, n_rows).astype(np.int8),
+            'road_type': pd.Categorical.from_codes(self._road_codes[location_codes], self.ROAD_TYPES),
+            'event_nearby': rng.random(n_rows) > 0.8
+        })
+    
+    @staticmethod
+    def frame_to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Materialize traffic rows as JSON-ready dictionaries"""
+        if frame.empty:
+            return []
+            
+        # Format each distinct hour and location once, then gather per row
+        time_codes, unique_times = pd.factorize(frame['timestamp'])
+        iso_times = np.datetime_as_string(np.asarray(unique_times, dtype='datetime64[us]'), unit='us')
+        id_times = [f"{iso[0:4]}{iso[5:7]}{iso[8:10]}_{iso[11:13]}" for iso in iso_times.tolist()]
+        iso_times = iso_times.tolist()
+        
+        locations = frame['location'].astype('category')
+        location_names = [str(name) for name in locations.cat.categories]
+        location_ids = [name.replace(' ', '_') for name in location_names]
+        location_codes = locations.cat.codes.tolist()
+        
+        columns = {
+            'id': [f"traffic_{id_times[t]}_{location_ids[l]}" for t, l in zip(time_codes.tolist(), location_codes)],
+            'timestamp': [iso_times[t] for t in time_codes.tolist()],
+            'location': [location_names[l] for l in location_codes],
+            'vehicle_count': frame['vehicle_count'].tolist(),
+            'average_speed': frame['average_speed'].tolist(),
+            'congestion_level': frame['congestion_level'].astype(str).tolist(),
+            'weather_condition': frame['weather_condition'].astype(str).tolist(),
+            'temperature': _nullable(frame['temperature']),
+            'visibility': _nullable(frame['visibility']),
+            'road_type': frame['road_type'].astype(str).tolist(),
+            'event_nearby': frame['event_nearby'].tolist()
         }
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+def _nullable(values: pd.Series) -> List[Any]:
+    """List a column with missing values as None, which serializes to JSON null rather than NaN"""
+    if not values.isna().any():
+        return values.tolist()
+    return values.astype(object).where(values.notna(), None).tolist()
+
+class TrafficAnalytics:
+    """
+    Vectorized aggregation engine for traffic analytics
+    
+    Raw rows are reduced with np.bincount into per-hour and per-weather
+    buckets holding row counts and metric sums. The /api/analytics payload is
+    then derived from those buckets alone, so the cost of summarizing does not
+    depend on how many rows were aggregated.
+    """
+    
+    # Columns of every bucket array
+    FIELDS = ['count', 'vehicle_count', 'average_speed', 'congested']
+    
+    # Supported analysis metrics: bucket field, payload key and ranking direction
+    METRICS = {
+        'volume': {'field': 'vehicle_count', 'key': 'average_volume', 'higher_is_peak': True},
+        'speed': {'field': 'average_speed', 'key': 'average_speed', 'higher_is_peak': False},
+        'congestion': {'field': 'congested', 'key': 'congestion_rate', 'higher_is_peak': True}
+    }
+    
+    WEATHER_CONDITIONS = ['clear', 'cloudy', 'rainy', 'snowy', 'foggy', 'other']
+    CONGESTED_LEVELS = ['high', 'critical']
+    
+    # Relative change in a per-reading mean below which a trend is 'stable'
+    TREND_THRESHOLD = 0.05
+    
+    def aggregate(self, frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Reduce raw traffic rows to per-hour and per-weather bucket sums
         
-    def predict_volume(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        Args:
+            frame: Traffic rows with timestamp, vehicle_count, average_speed,
+                congestion_level and weather_condition columns
+            
+        Returns:
+            Dictionary with 'hourly' (24 x FIELDS) and 'weather'
+            (WEATHER_CONDITIONS x FIELDS) arrays
         """
-        Predict traffic volume based on input features
+        values = self.bucket_values(frame)
+        hour = pd.DatetimeIndex(frame['timestamp']).hour.to_numpy()
+        
+        return {
+            'hourly': self._bucket(hour, 24, values),
+            'weather': self._bucket(self.weather_codes(frame['weather_condition']), len(self.WEATHER_CONDITIONS), values)
+        }
+    
+    def bucket_values(self, frame: pd.DataFrame) -> np.ndarray:
+        """Per-row contributions to each of FIELDS"""
+        return np.column_stack([
+            np.ones(len(frame)),
+            frame['vehicle_count'].to_numpy(dtype=np.float64),
+            frame['average_speed'].to_numpy(dtype=np.float64),
+            frame['congestion_level'].isin(self.CONGESTED_LEVELS).to_numpy(dtype=np.float64)
+        ]).reshape(len(frame), len(self.FIELDS))
+    
+    def summarize(self, aggregates: Dict[str, np.ndarray], metric: str = 'volume', period: str = '7d') -> Dict[str, Any]:
+        """
+        Build the analytics payload from bucket sums
         
         Args:
-            features: Dictionary containing prediction features
+            aggregates: Bucket arrays as returned by aggregate
+            metric: Metric used to rank peak hours and weather impact
+            period: Analysis period echoed in the summary
             
         Returns:
-            Dictionary with prediction results and confidence
+            Dictionary with summary, peak_hours and weather_impact sections
         """
-        try:
-            # Extract features
-            hour = features.get('hour', datetime.now().hour)
-            day_of_week = features.get('day_of_week', datetime.now().weekday())
-            temperature = features.get('temperature', 20)
-            weather = features.get('weather_condition', 'clear')
-            has_events = features.get('special_events', False)
-            location_type = features.get('location_type', 'urban')
-            
-            # Base volume calculation (simplified model)
-            base_volume = 200
-            
-            # Hour of day impact (rush hours have higher traffic)
-            if 7 <= hour <= 9 or 17 <= hour <= 19:
-                hour_multiplier = 1.8
-            elif 10 <= hour <= 16:
-                hour_multiplier = 1.2
-            elif 20 <= hour <= 22:
-                hour_multiplier = 1.1
-            else:
-                hour_multiplier = 0.6
-                
-            # Day of week impact
-            if day_of_week < 5:  # Weekdays
-                day_multiplier = 1.3
-            elif day_of_week == 5:  # Friday
-                day_multiplier = 1.5
-            else:  # Weekend
-                day_multiplier = 0.8
-                
-            # Weather impact
-            weather_multipliers = {
-                'clear': 1.0,
-                'cloudy': 0.95,
-                'rainy': 0.75,
-                'snowy': 0.5,
-                'foggy': 0.65
-            }
-            weather_multiplier = weather_multipliers.get(weather.lower(), 1.0)
+        if metric not in self.METRICS:
+            raise ValueError(f"Unsupported metric '{metric}', expected one of {sorted(self.METRICS)}")
             
-            # Temperature impact (extreme temperatures reduce traffic)
-            if -10 <= temperature <= 30:
-                temp_multiplier = 1.0
-            elif temperature > 30:
-                temp_multiplier = 0.9 - (temperature - 30) * 0.01
+        hourly = aggregates['hourly']
+        totals = hourly.sum(axis=0)
+        count = self._column(totals, 'count')
+        
+        peak_hours = [
+            {'hour': f"{hour:02d}:00", **entry}
+            for hour, entry in self._rank(hourly, metric)
+        ]
+        weather_impact = [
+            {'condition': self.WEATHER_CONDITIONS[code].title(), **entry}
+            for code, entry in self._rank(aggregates['weather'], metric, relative=True)
+        ]
+        
+        return {
+            'summary': {
+                'total_volume': int(self._column(totals, 'vehicle_count')),
+                'average_speed': round(float(self._column(totals, 'average_speed') / count) if count else 0.0, 1),
+                'congestion_events': int(self._column(totals, 'congested')),
+                'analysis_period': period,
+                'metric': metric
+            },
+            'peak_hours': peak_hours[:5],  # Top 5 peak hours
+            'weather_impact': weather_impact
+        }
+    
+    def trends(self, current: Dict[str, np.ndarray], previous: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Compare two consecutive windows of bucket sums
+        
+        Args:
+            current: Bucket arrays for the most recent window, as returned by aggregate
+            previous: Bucket arrays for the window of the same length before it
+            
+        Returns:
+            Dictionary with volume_trend, speed_trend and efficiency_score, the
+            share of current readings that were not congested
+        """
+        current_totals = current['hourly'].sum(axis=0)
+        previous_totals = previous['hourly'].sum(axis=0)
+        count = self._column(current_totals, 'count')
+        
+        return {
+            'volume_trend': self._trend(current_totals, previous_totals, 'vehicle_count', ('increasing', 'decreasing')),
+            'speed_trend': self._trend(current_totals, previous_totals, 'average_speed', ('improving', 'declining')),
+            'efficiency_score': round(100.0 * (1.0 - float(self._column(current_totals, 'congested') / count)), 1) if count else 0.0
+        }
+    
+    def weather_codes(self, conditions: pd.Series) -> np.ndarray:
+        """Encode weather conditions as indices into WEATHER_CONDITIONS"""
+        codes, uniques = pd.factorize(conditions)
+        other = self.WEATHER_CONDITIONS.index('other')
+        lookup = np.array([
+            self.WEATHER_CONDITIONS.index(name) if name in self.WEATHER_CONDITIONS else other
+            for name in (str(value).lower() for value in uniques)
+        ] + [other], dtype=np.int64)
+        return lookup[codes]  # Missing values (code -1) map to 'other'
+    
+    def _rank(self, buckets: np.ndarray, metric: str, relative: bool = False):
+        """Yield (bucket index, payload entry) pairs ordered from most to least significant"""
+        spec = self.METRICS[metric]
+        counts = self._column(buckets, 'count')
+        present = np.flatnonzero(counts > 0)
+        if not len(present):
+            return
+            
+        volume_means = self._column(buckets, 'vehicle_count')[present] / counts[present]
+        means = self._column(buckets, spec['field'])[present] / counts[present]
+        baseline = means.mean()
+        order = np.argsort(-means if spec['higher_is_peak'] else means, kind='stable')
+        
+        for i in order.tolist():
+            entry = {'average_volume': int(volume_means[i])}
+            if metric != 'volume':
+                entry[spec['key']] = round(float(means[i]), 3 if metric == 'congestion' else 1)
+            if relative:
+                entry['impact_factor'] = float(means[i] / baseline) if baseline else 0.0
+            elif spec['higher_is_peak']:
+                entry['peak_indicator'] = bool(means[i] > baseline * 1.2)
             else:
-                temp_multiplier = 0.9 - abs(temperature + 10) * 0.02
+                entry['peak_indicator'] = bool(means[i] < baseline / 1.2)
+            yield int(present[i]), entry
+    
+    def _trend(self, current: np.ndarray, previous: np.ndarray, field: str, labels: Tuple[str, str]) -> str:
+        """Label a change in a field's per-reading mean between two totals vectors; 'stable' within TREND_THRESHOLD"""
+        current_count, previous_count = self._column(current, 'count'), self._column(previous, 'count')
+        if not current_count or not previous_count:
+            return 'stable'
+            
+        previous_mean = self._column(previous, field) / previous_count
+        change = (self._column(current, field) / current_count - previous_mean) / previous_mean if previous_mean else 0.0
+        if abs(change) <= self.TREND_THRESHOLD:
+            return 'stable'
+        return labels[0] if change > 0 else labels[1]
+    
+    def _column(self, buckets: np.ndarray, field: str) -> np.ndarray:
+        """Select one field from a bucket array (or totals vector)"""
+        return buckets[..., self.FIELDS.index(field)]
+    
+    @staticmethod
+    def _bucket(codes: np.ndarray, size: int, values: np.ndarray) -> np.ndarray:
+        """Sum every value column into `size` buckets selected by codes"""
+        return np.column_stack([
+            np.bincount(codes, weights=values[:, j], minlength=size) for j in range(values.shape[1])
+        ]).reshape(size, values.shape[1])
+
+class RollingAggregates:
+    """
+    Incrementally maintained hourly bucket sums for analytics and alerts
+    
+    Readings are folded into ring buffers indexed by hour, one split by
+    weather condition and one by location, holding the TrafficAnalytics
+    FIELDS sums. Applying a batch costs time in proportion to the batch, and a
+    7d/30d/90d query merges at most retention_hours buckets without touching
+    raw rows. A reading that replaces a stored one is applied after the stored
+    one is removed, so re-sent readings are counted once.
+    """
+    
+    def __init__(self, analytics: TrafficAnalytics, retention_hours: int):
+        self.analytics = analytics
+        self.retention_hours = retention_hours
+        n_fields = len(analytics.FIELDS)
+        self.by_weather = np.zeros((retention_hours, len(analytics.WEATHER_CONDITIONS), n_fields))
+        self.by_location = np.zeros((retention_hours, 0, n_fields))
+        self.locations: List[str] = []
+        self._location_index: Dict[str, int] = {}
+        self.head = None  # Newest hour held, in hours since the epoch
+        self.rows_applied = 0
+        self._lock = threading.RLock()
+    
+    def update(self, frame: pd.DataFrame) -> None:
+        """Fold a batch of readings into the buckets"""
+        self._apply(frame, 1)
+    
+    def remove(self, frame: pd.DataFrame) -> None:
+        """Take previously applied readings back out of the buckets, e.g. ones a re-sent reading replaced"""
+        self._apply(frame, -1)
+    
+    def _apply(self, frame: pd.DataFrame, sign: int) -> None:
+        """Add (sign 1) or subtract (sign -1) a batch of readings"""
+        if frame.empty:
+            return
+            
+        hour_index = self.hour_index(frame['timestamp'])
+        values = sign * self.analytics.bucket_values(frame)
+        weather = self.analytics.weather_codes(frame['weather_condition'])
+        location_codes, location_names = pd.factorize(frame['location'].astype(str))
+        
+        with self._lock:
+            locations = np.array([self._location_slot(name) for name in location_names], dtype=np.int64)[location_codes]
+            newest = int(hour_index.max())
+            if sign > 0 and (self.head is None or newest > self.head):
+                self._advance(newest)
+            if self.head is None:
+                return
                 
-            # Special events impact
-            event_multiplier = 1.3 if has_events else 1.0
-            
-            # Location type impact
-            location_multipliers = {
-                'highway': 1.5,
-                'urban': 1.2,
-                'suburban': 1.0,
-                'rural': 0.7
-            }
-            location_multiplier = location_multipliers.get(location_type, 1.0)
-            
-            # Calculate predicted volume
-            predicted_volume = int(base_volume * hour_multiplier * day_multiplier * 
-                                 weather_multiplier * temp_multiplier * 
-                                 event_multiplier * location_multiplier)
-            
-            # Add some randomness to simulate real-world variation
-            variation = np.random.normal(0, predicted_volume * 0.1)
-            predicted_volume = max(50, int(predicted_volume + variation))
-            
-            # Calculate confidence based on feature reliability
-            confidence_factors = []
-            confidence_factors.append(0.9 if 6 <= hour <= 22 else 0.7)  # Time reliability
-            confidence_factors.append(0.85 if day_of_week < 5 else 0.75)  # Day reliability
-            confidence_factors.append(0.8 if weather in ['clear', 'cloudy'] else 0.6)  # Weather reliability
-            
-            confidence = np.mean(confidence_factors)
-            
-            # Feature importance for this prediction
-            feature_importance = {
-                'historical_patterns': self.feature_weights['historical_avg'] + np.random.uniform(-0.05, 0.05),
-                'weather_conditions': self.feature_weights['weather_condition'] + self.feature_weights['weather_temp'] + np.random.uniform(-0.03, 0.03),
-                'time_factors': self.feature_weights['hour_of_day'] + self.feature_weights['day_of_week'] + np.random.uniform(-0.02, 0.02),
-                'special_events': self.feature_weights['special_events'] + np.random.uniform(-0.02, 0.02)
-            }
+            # Readings older than the retention window are dropped
+            keep = hour_index > self.head - self.retention_hours
+            slots = hour_index[keep] % self.retention_hours
+            np.add.at(self.by_weather, (slots, weather[keep]), values[keep])
+            np.add.at(self.by_location, (slots, locations[keep]), values[keep])
+            self.rows_applied += sign * int(keep.sum())
+            
+            if sign < 0:
+                # Readings written by another process were never added here; never go below zero
+                np.maximum(self.by_weather, 0, out=self.by_weather)
+                np.maximum(self.by_location, 0, out=self.by_location)
+    
+    def rebuild(self, frame: pd.DataFrame) -> None:
+        """Replace every bucket with sums computed from frame"""
+        with self._lock:
+            self.by_weather[:] = 0
+            self.by_location[:] = 0
+            self.head = None
+            self.rows_applied = 0
+            self.update(frame)
+    
+    def window(self, hours: int, end: datetime) -> Dict[str, np.ndarray]:
+        """
+        Merge buckets for the hours in [end - hours, end)
+        
+        Returns:
+            Dictionary with 'hourly' (24 x FIELDS) and 'weather'
+            (WEATHER_CONDITIONS x FIELDS) arrays, as TrafficAnalytics.aggregate
+        """
+        with self._lock:
+            hour_index = self._window_hours(hours, end)
+            buckets = self.by_weather[hour_index % self.retention_hours]
             
+        hourly = np.zeros((24, buckets.shape[2]))
+        np.add.at(hourly, hour_index % 24, buckets.sum(axis=1))
+        return {'hourly': hourly, 'weather': buckets.sum(axis=0)}
+    
+    def location_window(self, hours: int, end: datetime):
+        """
+        Per-hour, per-location sums for the hours in [end - hours, end)
+        
+        Returns:
+            Tuple of (hour indexes, hours x locations x FIELDS sums, location names)
+        """
+        with self._lock:
+            hour_index = self._window_hours(hours, end)
+            return hour_index, self.by_location[hour_index % self.retention_hours, :len(self.locations)], list(self.locations)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Describe the buckets held"""
+        with self._lock:
             return {
-                'predicted_volume': predicted_volume,
-                'confidence': round(confidence, 3),
-                'feature_importance': feature_importance,
-                'factors': {
-                    'hour_impact': round(hour_multiplier, 2),
-                    'day_impact': round(day_multiplier, 2),
-                    'weather_impact': round(weather_multiplier, 2),
-                    'temperature_impact': round(temp_multiplier, 2),
-                    'event_impact': round(event_multiplier, 2),
-                    'location_impact': round(location_multiplier, 2)
-                }
+                'retention_hours': self.retention_hours,
+                'locations': len(self.locations),
+                'rows_applied': self.rows_applied,
+                'newest_hour': pd.Timestamp(self.head, unit='h').isoformat() if self.head is not None else None
             }
+    
+    @staticmethod
+    def hour_index(timestamps: pd.Series) -> np.ndarray:
+        """Hours since the epoch for naive local timestamps; modulo 24 gives the hour of day"""
+        return np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+    
+    def _window_hours(self, hours: int, end: datetime) -> np.ndarray:
+        """Hour indexes of a window that are still held in the ring"""
+        if self.head is None:
+            return np.empty(0, dtype=np.int64)
+        last = int(self.hour_index(np.array([end], dtype='datetime64[us]'))[0]) - 1
+        first = max(last - hours + 1, self.head - self.retention_hours + 1)
+        return np.arange(first, min(last, self.head) + 1, dtype=np.int64)
+    
+    def _advance(self, newest: int) -> None:
+        """Move the ring head to newest, clearing the slots of hours that fall out of the window"""
+        if self.head is None or newest - self.head >= self.retention_hours:
+            self.by_weather[:] = 0
+            self.by_location[:] = 0
+        else:
+            slots = np.arange(self.head + 1, newest + 1) % self.retention_hours
+            self.by_weather[slots] = 0
+            self.by_location[slots] = 0
+        self.head = newest
+    
+    def _location_slot(self, name: str) -> int:
+        """Index of a location in by_location, growing the array for new locations"""
+        index = self._location_index.get(name)
+        if index is None:
+            index = self._location_index[name] = len(self.locations)
+            self.locations.append(name)
+            if index >= self.by_location.shape[1]:
+                grown = np.zeros((self.retention_hours, max(8, 2 * self.by_location.shape[1]), self.by_location.shape[2]))
+                grown[:, :self.by_location.shape[1]] = self.by_location
+                self.by_location = grown
+        return index
+
+# Initialize ML model, data generator and analytics engine
+MODEL_DIR = os.environ.get('ML_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+)
+
+# Online corrections learned from streaming readings between full retrains
+ONLINE_LEARNING = os.environ.get('ONLINE_LEARNING', 'True').lower() == 'true'
+ONLINE_HALF_LIFE_HOURS = float(os.environ.get('ONLINE_HALF_LIFE_HOURS', 7 * 24))
+ONLINE_SEED_HOURS = int(os.environ.get('ONLINE_SEED_HOURS', 7 * 24))
+
+def new_online_corrections():
+    """Empty online corrections, or None when online learning is disabled"""
+    return OnlineCorrections(half_life_hours=ONLINE_HALF_LIFE_HOURS) if ONLINE_LEARNING else None
+
+# Historical averages, calendar flags and category codes shared by every predictor
+feature_store = FeatureStore()
+
+predictor = TrafficPredictor(model_dir=MODEL_DIR, cache=prediction_cache, online=new_online_corrections(),
+                             feature_store=feature_store)
+data_generator = TrafficDataGenerator()
+analytics_engine = TrafficAnalytics()
+
+# Persistent store for traffic observations; the data generator is one producer that fills it
+HISTORY_DAYS = 90
+DATABASE_URL = os.environ.get(
+    'DATABASE_URL', 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic.db'))
+traffic_store: TrafficStore = create_store(DATABASE_URL)
+_store_refresh_lock = threading.Lock()
+
+# Live readings are written to the store in micro-batches
+ingestion_buffer = IngestionBuffer(
+    traffic_store,
+    max_rows=int(os.environ.get('INGEST_BATCH_ROWS', 20000)),
+    max_delay=float(os.environ.get('INGEST_MAX_DELAY', 0.5))
+)
+INGEST_MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', 64 * 1024 * 1024))
+
+def current_hour() -> datetime:
+    """Start of the current hour, the newest timestamp held in the store"""
+    return datetime.now().replace(minute=0, second=0, microsecond=0)
+
+# Synthetic readings fill hours with no data; disable once real sensors feed the ingestion API
+SYNTHETIC_DATA = os.environ.get('SYNTHETIC_DATA', 'True').lower() == 'true'
+
+def refresh_traffic_store() -> None:
+    """Fill the store with generated observations up to the current hour, and reconcile derived state when due"""
+    reconcile_derived_state()
+    if not SYNTHETIC_DATA:
+        return
+        
+    with _store_refresh_lock:
+        end = current_hour() + timedelta(hours=1)
+        start = end - timedelta(days=HISTORY_DAYS)
+        latest = traffic_store.latest_timestamp()
+        if latest is not None:
+            start = max(start, latest.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
             
-        except Exception as e:
-            logger.error(f"Error in prediction: {str(e)}")
-            return {
-                'predicted_volume': 200,
-                'confidence': 0.5,
-                'error': str(e)
+        generated = False
+        for frame in data_generator.iter_frames_between(start, end):
+            record_observations(frame)
+            generated = True
+            
+        # Callers read aggregates next, so let the subscribers catch up with the new hours
+        if generated:
+            ingestion_buffer.drain()
+
+def record_observations(frame: pd.DataFrame) -> None:
+    """Write observations to the store and queue them for every observation subscriber"""
+    ingestion_buffer.write(frame)
+
+def history_start() -> datetime:
+    """Oldest timestamp of the history window used for analytics and training"""
+    return current_hour() + timedelta(hours=1) - timedelta(days=HISTORY_DAYS)
+
+# Hourly bucket sums and historical averages maintained as data arrives, seeded once from the stored history
+rolling_aggregates = RollingAggregates(analytics_engine, retention_hours=HISTORY_DAYS * 24)
+_stored_history = traffic_store.query(start=history_start())
+rolling_aggregates.update(_stored_history)
+feature_store.update(_stored_history)
+del _stored_history
+
+def seed_online_corrections(model: TrafficPredictor) -> None:
+    """
+    Learn a predictor's online corrections from the most recent stored readings
+    
+    Readings are replayed a day at a time, as they arrived, so the residuals
+    behind prediction intervals are measured on data not yet learned. Those
+    a trained model was fitted on still correct it, but do not count towards
+    its intervals.
+    """
+    if model.online is None:
+        return
+        
+    history = traffic_store.query(start=current_hour() - timedelta(hours=ONLINE_SEED_HOURS))
+    for _, readings in history.groupby(pd.DatetimeIndex(history['timestamp']).floor('D'), sort=True):
+        model.online.update(readings, model.base_prediction, model.fitted_until)
+
+def update_online_corrections(frame: pd.DataFrame) -> None:
+    """Fold a batch of new readings into the current predictor's corrections (observation subscriber)"""
+    model = predictor
+    if model.online is not None:
+        model.online.update(frame, model.base_prediction, model.fitted_until)
+
+seed_online_corrections(predictor)
+
+# Alert rules are evaluated against each new batch, never on poll
+alert_engine = AlertEngine(rolling_aggregates, predictor=lambda: predictor, history_hours=HISTORY_DAYS * 24)
+
+# Hours of upcoming predictions pushed to live dashboard subscribers
+STREAM_FORECAST_HOURS = 6
+
+def live_predictions() -> Dict[str, List[Dict[str, Any]]]:
+    """Predict the next STREAM_FORECAST_HOURS at every stored location in one batch"""
+    locations = traffic_store.locations()
+    if not locations:
+        return {}
+        
+    start = pd.Timestamp(current_hour()) + pd.Timedelta(hours=1)
+    times = start + pd.to_timedelta(np.arange(STREAM_FORECAST_HOURS), unit='h')
+    batch = predictor.predict_batch({
+        'hour': np.tile(times.hour.to_numpy(), len(locations)),
+        'day_of_week': np.tile(times.dayofweek.to_numpy(), len(locations)),
+        'location_type': np.repeat([training.location_type(name) for name in locations], STREAM_FORECAST_HOURS),
+        'location': np.repeat(locations, STREAM_FORECAST_HOURS),
+        'timestamp': np.tile(times.to_numpy(), len(locations))
+    })
+    
+    volumes = batch['predicted_volume'].reshape(len(locations), STREAM_FORECAST_HOURS).tolist()
+    confidences = batch['confidence'].reshape(len(locations), STREAM_FORECAST_HOURS).tolist()
+    timestamps = [timestamp.isoformat() for timestamp in times]
+    return {
+        location: [
+            {'timestamp': timestamp, 'predicted_volume': volume, 'confidence': confidence}
+            for timestamp, volume, confidence in zip(timestamps, volumes[i], confidences[i])
+        ]
+        for i, location in enumerate(locations)
+    }
+
+# Live dashboard push channel; one ticker computes updates for all connected clients
+live_feed = LiveFeed(
+    alerts=alert_engine.active_alerts,
+    predictions=live_predictions,
+    to_records=TrafficDataGenerator.frame_to_records,
+    on_tick=refresh_traffic_store,
+    tick_seconds=float(os.environ.get('STREAM_TICK_SECONDS', 2)),
+    prediction_interval_seconds=float(os.environ.get('STREAM_PREDICTION_INTERVAL', 60)),
+    max_queue=int(os.environ.get('STREAM_MAX_QUEUE', 256)),
+    max_subscribers=int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 100))
+)
+
+# Called from the ingestion buffer's subscriber thread with every batch written to the store, whether
+# generated or ingested. Online corrections learn from a batch before the feature store folds it into
+# the historical averages.
+observation_subscribers = [rolling_aggregates.update, update_online_corrections, feature_store.update,
+                           alert_engine.evaluate, live_feed.publish_readings]
+for subscriber in observation_subscribers:
+    ingestion_buffer.subscribe(subscriber)
+
+# Called first with the stored rows a batch replaced, so re-sent readings are not counted twice
+for subscriber in [rolling_aggregates.remove, feature_store.remove]:
+    ingestion_buffer.subscribe_replaced(subscriber)
+
+# Background retraining runs in a separate process so it never blocks request workers
+_training_executor = None
+_training_executor_lock = threading.Lock()
+
+def training_executor() -> ProcessPoolExecutor:
+    """Process pool for training jobs, created on first use"""
+    global _training_executor
+    with _training_executor_lock:
+        if _training_executor is None:
+            _training_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return _training_executor
+
+def _reset_training_executor() -> None:
+    """Drop a broken process pool so the next job starts a fresh one"""
+    global _training_executor
+    with _training_executor_lock:
+        _training_executor = None
+
+# Bulk forecasts above this many rows are spread over a pool of forecasting processes
+FORECAST_PARALLEL_ROWS = int(os.environ.get('FORECAST_PARALLEL_ROWS', 100000))
+FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', min(4, os.cpu_count() or 1)))
+_forecast_executor = None
+_forecast_executor_lock = threading.Lock()
+
+def forecast_executor() -> ProcessPoolExecutor:
+    """Process pool for bulk forecast chunks, created on first use"""
+    global _forecast_executor
+    with _forecast_executor_lock:
+        if _forecast_executor is None:
+            _forecast_executor = ProcessPoolExecutor(max_workers=FORECAST_WORKERS,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return _forecast_executor
+
+def _reset_forecast_executor() -> None:
+    """Drop a broken process pool so the next request starts a fresh one"""
+    global _forecast_executor
+    with _forecast_executor_lock:
+        _forecast_executor = None
+
+def swap_predictor(path: str) -> None:
+    """
+    Load an artifact into a fresh predictor and swap it in
+    
+    The replacement is fully loaded before the module-level reference is
+    rebound, so requests either use the old model or the new one, never a
+    partially loaded one. Online corrections learned against the old model
+    are dropped; the new one starts from corrections re-learned on recent
+    readings.
+    """
+    global predictor
+    replacement = TrafficPredictor(model_dir=MODEL_DIR, cache=prediction_cache, online=new_online_corrections(),
+                                   feature_store=feature_store)
+    replacement.load(path)
+    seed_online_corrections(replacement)
+    predictor = replacement
+    
+    # Keys include the model version, but free the old model's entries right away
+    prediction_cache.clear()
+
+def submit_retrain_job() -> Dict[str, Any]:
+    """Queue a background training job and return its initial status"""
+    refresh_traffic_store()
+    job_id = uuid.uuid4().hex[:12]
+    status = training.write_job_status(
+        MODEL_DIR, job_id,
+        status='queued',
+        stage='queued',
+        progress=0.0,
+        submitted_at=datetime.now().isoformat(),
+        old_accuracy=predictor.model_info()['accuracy']
+    )
+    
+    future = training_executor().submit(training.run_training_job, job_id, DATABASE_URL, MODEL_DIR, history_start())
+    future.add_done_callback(lambda done: _finish_retrain_job(job_id, status['old_accuracy'], done))
+    logger.info(f"Queued model retraining job {job_id}")
+    return status
+
+def _finish_retrain_job(job_id: str, old_accuracy: float, future: Future) -> None:
+    """Hot-swap the trained model in and record the job outcome"""
+    try:
+        result = future.result()
+        swap_predictor(result['path'])
+        new_accuracy = result['metrics']['accuracy']
+        
+        training.write_job_status(
+            MODEL_DIR, job_id,
+            status='succeeded',
+            stage='done',
+            progress=1.0,
+            finished_at=datetime.now().isoformat(),
+            training_info={
+                'model_version': result['version'],
+                'data_points_used': result['data_points_used'],
+                'training_time_seconds': result['training_time_seconds'],
+                'old_accuracy': old_accuracy,
+                'new_accuracy': new_accuracy,
+                'improvement': round(new_accuracy - old_accuracy, 2) if old_accuracy is not None else None,
+                'metrics': result['metrics'],
+                'retrained_at': result['trained_at']
             }
+        )
+        logger.info(f"Retraining job {job_id} finished: model {result['version']} {result['metrics']}")
+        
+    except Exception as e:
+        logger.error(f"Error in retraining job {job_id}: {str(e)}")
+        if isinstance(e, BrokenProcessPool):
+            _reset_training_executor()
+        training.write_job_status(MODEL_DIR, job_id, status='failed', finished_at=datetime.now().isoformat(), error=str(e))
 
-class TrafficDataGenerator:
+# Process lifecycle, for health checks and preforking servers (see gunicorn.conf.py)
+process_started = time.monotonic()
+worker_spawn_seconds = None
+
+def warm_up() -> None:
     """
-    Generates realistic traffic data for demonstration purposes
+    Build the state requests would otherwise build on first use
+    
+    Under a preforking server this runs once in the parent, so workers start
+    with the stored history, alert baselines and model in memory and share
+    those pages copy-on-write.
+    """
+    refresh_traffic_store()
+    logger.info(f"Warmed up with model {predictor.model_version} and {len(traffic_store.locations())} locations")
+
+def prepare_fork() -> None:
+    """Release resources a forked worker must not inherit"""
+    ingestion_buffer.drain()
+    traffic_store.close()
+
+def reload_model() -> bool:
+    """Swap in the latest artifact if it is not the one loaded; returns whether the model changed"""
+    path = training.latest_artifact_path(MODEL_DIR)
+    if path is None or (predictor.model_trained and path == predictor.artifact_path):
+        return False
+    swap_predictor(path)
+    return True
+
+def rebuild_derived_state() -> None:
     """
+    Recompute the in-memory views of the store from the store itself
     
-    @staticmethod
-    def generate_historical_data(days: int = 30) -> List[Dict[str, Any]]:
-        """Generate historical traffic data"""
-        data = []
-        locations = ['Highway A1', 'Downtown Main St', 'Airport Road', 'Industrial Zone', 'Residential Area']
-        weather_conditions = ['clear', 'cloudy', 'rainy', 'foggy']
+    Rolling aggregates, historical averages, online corrections and alert
+    baselines are kept per process and only see the readings that process
+    wrote. A worker forked from a preloaded parent calls this before serving,
+    so it starts from everything in the store, including readings earlier
+    workers ingested since the parent built its state (e.g. before a reload),
+    and reconcile_derived_state repeats it every DERIVED_STATE_REFRESH_SECONDS.
+    """
+    global _derived_state_built
+    with ingestion_buffer.exclusive():
+        history = traffic_store.query(start=history_start())
+        rolling_aggregates.rebuild(history)
+        feature_store.rebuild(history)
+        model = predictor
+        if model.online is not None:
+            model.online.reset()
+            seed_online_corrections(model)
+        alert_engine.invalidate_baselines()
+        _derived_state_built = time.monotonic()
+    prediction_cache.clear()
+
+# Seconds between rebuilds of the derived state from the store, which pick up readings other
+# worker processes wrote; 0 disables them
+DERIVED_STATE_REFRESH_SECONDS = float(os.environ.get('DERIVED_STATE_REFRESH_SECONDS', 300))
+_derived_state_built = time.monotonic()
+_derived_state_lock = threading.Lock()
+
+def reconcile_derived_state() -> None:
+    """Rebuild the derived state once it is DERIVED_STATE_REFRESH_SECONDS old; one thread rebuilds, others move on"""
+    if DERIVED_STATE_REFRESH_SECONDS <= 0 or time.monotonic() - _derived_state_built < DERIVED_STATE_REFRESH_SECONDS:
+        return
+    if _derived_state_lock.acquire(blocking=False):
+        try:
+            rebuild_derived_state()
+        finally:
+            _derived_state_lock.release()
+
+def record_worker_start(spawn_seconds: float) -> None:
+    """Record how long this worker took from fork to serving, and log its memory"""
+    global process_started, worker_spawn_seconds
+    process_started = time.monotonic()
+    worker_spawn_seconds = spawn_seconds
+    memory = {name: round(value / (1024 * 1024), 1) for name, value in metrics.process_memory().items()}
+    logger.info(f"Worker {os.getpid()} ready in {spawn_seconds * 1000:.1f} ms, memory MB {memory}")
+
+def readiness_checks() -> Dict[str, Dict[str, Any]]:
+    """Check that this process can serve: the store answers queries and the model is loaded"""
+    checks = {}
+    try:
+        latest = traffic_store.latest_timestamp()
+        checks['store'] = {'ok': True, 'latest_timestamp': latest.isoformat() if latest else None}
+    except Exception as e:
+        checks['store'] = {'ok': False, 'error': str(e)}
         
-        for i in range(days * 24):  # Hourly data
-            timestamp = datetime.now() - timedelta(hours=days * 24 - i)
-            
-            for location in locations:
-                # Generate realistic traffic patterns
-                hour = timestamp.hour
-                day_of_week = timestamp.weekday()
-                
-                # Base volume varies by location
-                base_volumes = {
-                    'Highway A1': 400,
-                    'Downtown Main St': 300,
-                    'Airport Road': 350,
-                    'Industrial Zone': 200,
-                    'Residential Area': 150
-                }
-                
-                base_volume = base_volumes[location]
-                
-                # Apply time-based variations
-                if 7 <= hour <= 9 or 17 <= hour <= 19:  # Rush hours
-                    volume_multiplier = 1.6
-                elif 10 <= hour <= 16:  # Daytime
-                    volume_multiplier = 1.1
-                else:  # Night/early morning
-                    volume_multiplier = 0.4
-                    
-                # Weekend adjustment
-                if day_of_week >= 5:
-                    volume_multiplier *= 0.7
-                    
-                # Add randomness
-                volume = int(base_volume * volume_multiplier * np.random.uniform(0.8, 1.2))
-                
-                # Generate other metrics
-                avg_speed = max(20, int(80 - (volume / base_volume) * 30 + np.random.uniform(-10, 10)))
-                
-                # Congestion level based on volume
-                if volume > base_volume * 1.4:
-                    congestion = 'critical'
-                elif volume > base_volume * 1.1:
-                    congestion = 'high'
-                elif volume > base_volume * 0.8:
-                    congestion = 'medium'
-                else:
-                    congestion = 'low'
-                
-                data.append({
-                    'id': f"traffic_{timestamp.strftime('%Y%m%d_%H')}_{location.replace(' ', '_')}",
-                    'timestamp': timestamp.isoformat(),
-                    'location': location,
-                    'vehicle_count': volume,
-                    'average_speed': avg_speed,
-                    'congestion_level': congestion,
-                    'weather_condition': np.random.choice(weather_conditions),
-                    'temperature': int(np.random.uniform(5, 35)),
-                    'visibility': int(np.random.uniform(1, 10)),
-                    'road_type': 'Highway' if 'Highway' in location else 'Urban',
-                    'event_nearby': np.random.random() > 0.8
-                })
-                
-        return data
+    try:
+        model = predictor
+        latest_path = training.latest_artifact_path(MODEL_DIR)
+        checks['model'] = {
+            'ok': True,
+            'version': model.model_version,
+            'latest_artifact_loaded': latest_path is None or latest_path == model.artifact_path
+        }
+    except Exception as e:
+        checks['model'] = {'ok': False, 'error': str(e)}
+    return checks
 
-# Initialize ML model and data generator
-predictor = TrafficPredictor()
-data_generator = TrafficDataGenerator()
+# Request and stage timing, exposed for Prometheus at /api/metrics
+metrics_registry = metrics.MetricsRegistry(prefix='traffic')
+request_seconds = metrics_registry.histogram(
+    'request_duration_seconds', 'Time to build each response, until its body starts streaming', ['endpoint', 'method'])
+requests_total = metrics_registry.counter('requests_total', 'Requests handled', ['endpoint', 'method', 'status'])
+stage_seconds = metrics_registry.histogram(
+    'stage_duration_seconds', 'Time spent in each stage of an endpoint', ['endpoint', 'stage'])
+
+# Opt-in profiling of individual requests; see RequestProfiler for the modes
+request_profiler = metrics.RequestProfiler(
+    mode=os.environ.get('PROFILING', 'off').lower(),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01)),
+    slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 500)),
+    engine=os.environ.get('PROFILER', 'cprofile').lower()
+)
+
+def endpoint_label() -> str:
+    """Route pattern of the current request, which keeps label cardinality bounded"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def timed(stage: str):
+    """Context manager recording a stage of the current endpoint"""
+    return stage_seconds.time(endpoint=endpoint_label(), stage=stage)
+
+def collect_component_metrics() -> List[metrics.Sample]:
+    """Counters kept by the cache, predictor, ingestion buffer, alert engine, live feed and feature store"""
+    cache = prediction_cache.stats()
+    model = predictor
+    ingestion = ingestion_buffer.stats()
+    alerting = alert_engine.stats()
+    features = feature_store.stats()
+    return [
+        ('prediction_cache_hits_total', 'counter', 'Prediction cache hits', [({}, cache['hits'])]),
+        ('prediction_cache_misses_total', 'counter', 'Prediction cache misses', [({}, cache['misses'])]),
+        ('prediction_cache_hit_ratio', 'gauge', 'Prediction cache hit ratio since start', [({}, cache['hit_rate'])]),
+        ('prediction_cache_entries', 'gauge', 'Prediction cache entries', [({}, cache['size'])]),
+        ('model_inference_calls_total', 'counter', 'Model inference passes by the current model',
+         [({'model_version': model.model_version}, model.inference_calls)]),
+        ('model_inference_rows_total', 'counter', 'Rows computed by the current model',
+         [({'model_version': model.model_version}, model.rows_computed)]),
+        ('ingested_rows_total', 'counter', 'Readings written to the store, ingested or generated', [({}, ingestion['rows_written'])]),
+        ('ingestion_pending_rows', 'gauge', 'Readings waiting to be written', [({}, ingestion['pending_rows'])]),
+        ('ingestion_batches_awaiting_subscribers', 'gauge', 'Written batches not yet applied to derived state',
+         [({}, ingestion['batches_awaiting_subscribers'])]),
+        ('alerts_active', 'gauge', 'Active alerts', [({}, alerting['active_alerts'])]),
+        ('alerts_raised_total', 'counter', 'Alerts raised', [({}, alerting['alerts_raised'])]),
+        ('stream_subscribers', 'gauge', 'Connected live feed clients', [({}, live_feed.stats()['subscribers'])]),
+        ('online_updates_total', 'counter', 'Online correction updates since the current model was loaded',
+         [({}, model.online.updates if model.online is not None else 0)]),
+        ('online_rows_total', 'counter', 'Readings learned by online corrections since the current model was loaded',
+         [({}, model.online.rows_applied if model.online is not None else 0)]),
+        ('feature_store_rows_total', 'counter', 'Readings folded into the feature store', [({}, features['rows_applied'])]),
+        ('feature_store_locations', 'gauge', 'Locations with historical averages', [({}, features['locations'])])
+    ]
+
+metrics_registry.collector(collect_component_metrics)
+
+def collect_process_metrics() -> List[metrics.Sample]:
+    """Memory of this process and how long it took to start serving"""
+    samples = [
+        (f'process_{name}_memory_bytes', 'gauge', f'{name.upper()} memory of this process', [({}, value)])
+        for name, value in metrics.process_memory().items()
+    ]
+    if worker_spawn_seconds is not None:
+        samples.append(('worker_spawn_seconds', 'gauge', 'Time from fork to serving for this worker',
+                        [({}, worker_spawn_seconds)]))
+    return samples
+
+metrics_registry.collector(collect_process_metrics)
+
+@app.before_request
+def start_request_timer():
+    """Record the request start, and start the profiler if this request is selected"""
+    g.request_started = time.perf_counter()
+    if request_profiler.enabled:
+        g.profile_requested = bool(request.headers.get('X-Profile'))
+        g.profiler = request_profiler.start(g.profile_requested)
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """Record latency and status, attaching the id of a kept profile report"""
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = endpoint_label()
+    request_seconds.observe(elapsed, endpoint=endpoint, method=request.method)
+    requests_total.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        report_id = request_profiler.finish(profiler, f"{request.method} {request.full_path}", elapsed,
+                                            always_keep=g.profile_requested)
+        if report_id:
+            response.headers['X-Profile-Id'] = report_id
+            logger.info(f"Profiled {request.method} {request.path} in {elapsed * 1000:.1f} ms: report {report_id}")
+    return response
+
+@app.teardown_request
+def release_profiler(error: BaseException = None) -> None:
+    """Stop the profiler of a request that failed before after_request ran"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        request_profiler.finish(profiler, f"{request.method} {request.full_path} (failed)",
+                                time.perf_counter() - g.request_started, always_keep=True)
+
+# Downsampling options for /api/traffic-data: bucket width per resolution
+RESOLUTIONS = {'raw': None, 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+def encode_cursor(row: pd.Series) -> str:
+    """Opaque pagination cursor for a row's (timestamp, location) key"""
+    key = f"{int(pd.Timestamp(row['timestamp']).value // 1000)}|{row['location']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor, returning a (timestamp, location) key"""
+    try:
+        micros, location = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|', 1)
+        return pd.Timestamp(int(micros), unit='us').to_pydatetime(), location
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed cursor '{cursor}'") from e
+
+def parse_quantiles(value: Any) -> Optional[Tuple[float, ...]]:
+    """Quantile levels from a JSON list or a comma-separated string, or None when not requested"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = [level for level in value.split(',') if level.strip()]
+    return uncertainty.parse_levels(value)
+
+def parse_weather_forecast(value: Any) -> Dict[str, Any]:
+    """Weather forecast with a finite temperature and a condition, defaulting to 20 degrees and clear"""
+    forecast = {} if value is None else value
+    if not isinstance(forecast, dict):
+        raise ValueError("'weather_forecast' must be an object")
+    temperature = forecast.get('temperature', 20)
+    if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not np.isfinite(temperature):
+        raise ValueError("'weather_forecast.temperature' must be a number")
+    condition = forecast.get('condition', 'clear')
+    if not isinstance(condition, str):
+        raise ValueError("'weather_forecast.condition' must be a string")
+    return {'temperature': float(temperature), 'condition': condition}
+
+def parse_special_events(value: Any) -> List[Any]:
+    """Expected special events, as a list"""
+    events = [] if value is None else value
+    if not isinstance(events, list):
+        raise ValueError("'special_events' must be a list")
+    return events
+
+def encoded_response(body: Any, fmt: str) -> Response:
+    """
+    Build a response in a negotiated format, compressed as the client's Accept-Encoding allows
+    
+    A streamed body is encoded while the response is sent; the time spent
+    producing it is recorded as the endpoint's serialization stage.
+    """
+    content_encoding = encoding.negotiate_encoding(request.accept_encodings)
+    if isinstance(body, bytes):
+        chunks = [body]
+    else:
+        chunks = stage_seconds.time_iter(body, endpoint=endpoint_label(), stage='serialization')
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    return Response(encoding.compress(chunks, content_encoding), mimetype=encoding.MIMETYPES[fmt], headers=headers)
+
+@app.cli.command('train-model')
+def train_model_command():
+    """Train the traffic model from stored history and save a new artifact"""
+    refresh_traffic_store()
+    result = training.run_training(DATABASE_URL, MODEL_DIR, history_start())
+    print(json.dumps(result, indent=2))
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -249,6 +1068,32 @@ def health_check():
         'version': '1.0.0'
     })
 
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness check: the process answers requests; the store and model are not touched"""
+    return jsonify({
+        'status': 'alive',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.monotonic() - process_started, 1)
+    })
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: the store answers queries and the model is loaded; 503 otherwise"""
+    checks = readiness_checks()
+    ready = all(check['ok'] for check in checks.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'timestamp': datetime.now().isoformat(),
+        'checks': checks,
+        'worker': {
+            'pid': os.getpid(),
+            'spawn_seconds': worker_spawn_seconds,
+            'uptime_seconds': round(time.monotonic() - process_started, 1),
+            'memory_mb': {name: round(value / (1024 * 1024), 1) for name, value in metrics.process_memory().items()}
+        }
+    }), 200 if ready else 503
+
 @app.route('/api/traffic-data', methods=['GET'])
 def get_traffic_data():
     """Get current traffic data"""
@@ -269,26 +1114,123 @@ def get_traffic_data():
         else:  # 24h default
             hours = 24
             
-        data = data_generator.generate_historical_data(days=max(1, hours // 24))
+        limit = request.args.get('limit', '100')
+        limit = None if limit == 'all' else int(limit)
+        if limit is not None and limit < 1:
+            return jsonify({'error': "'limit' must be a positive number or 'all'"}), 400
+            
+        before = decode_cursor(request.args['before']) if request.args.get('before') else None
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+        if before is not None and after is not None:
+            return jsonify({'error': "Pass either 'before' or 'after', not both"}), 400
+        if (before is not None or after is not None) and limit is None:
+            return jsonify({'error': "Cursors need a numeric 'limit'"}), 400
+            
+        resolution = request.args.get('resolution', 'raw')
+        if resolution not in RESOLUTIONS:
+            return jsonify({'error': f"Unsupported resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}"}), 400
+        bucket = RESOLUTIONS[resolution]
         
-        # Filter by location if specified
-        if location != 'all':
-            data = [item for item in data if location.lower() in item['location'].lower()]
+        fmt = encoding.negotiate_format(request.args.get('format'), request.accept_mimetypes)
+        
+        with timed('data_fetch'):
+            refresh_traffic_store()
+            end = current_hour() + timedelta(hours=1)
+            start = end - timedelta(hours=hours)
+            
+            # Filter by location if specified
+            locations = None if location == 'all' else traffic_store.match_locations(location)
+            to_records = data_generator.frame_to_records if bucket is None else encoding.frame_to_rows
+            cursors = {}
+            
+            # Rows the range holds at the requested resolution: readings, or location buckets
+            total_records = traffic_store.count(start, end, locations, bucket)
+            if fmt == 'columns' and limit is None and total_records > encoding.MAX_COLUMNS_ROWS:
+                return jsonify({'error': f"Format 'columns' is limited to {encoding.MAX_COLUMNS_ROWS} rows without "
+                                         f"paging, and the range holds {total_records}; pass a numeric 'limit' "
+                                         f"or use a streamed format"}), 400
+                
+            if limit is None:
+                # The whole range, streamed oldest first in chunks
+                batches = (traffic_store.iter_query(start, end, locations) if bucket is None else
+                           [traffic_store.query_resampled(bucket, start, end, locations)])
+            else:
+                # Keyset page: an index range scan reading only this page's rows, plus one to detect more
+                newest_first = after is None
+                if bucket is None:
+                    page = traffic_store.query(start, end, locations, limit + 1, newest_first, before, after)
+                else:
+                    page = traffic_store.query_resampled(bucket, start, end, locations, limit + 1, newest_first, before, after)
+                has_more = len(page) > limit
+                page = page.iloc[:limit]
+                if newest_first:
+                    page = page.iloc[::-1]
+            
+                has_older = has_more if newest_first else True
+                has_newer = has_more if not newest_first else before is not None
+                cursors = {
+                    'older_cursor': encode_cursor(page.iloc[0]) if has_older and len(page) else None,
+                    'newer_cursor': encode_cursor(page.iloc[-1]) if has_newer and len(page) else None
+                }
+                batches = [page]
+            
+            meta = {
+                'total_records': total_records,
+                'time_range': time_range,
+                'location_filter': location,
+                'resolution': resolution,
+                **cursors
+            }
             
-        # Sort by timestamp
-        data.sort(key=lambda x: x['timestamp'])
+        return encoded_response(encoding.encode_table(batches, fmt, meta, to_records), fmt)
         
+    except encoding.NotAcceptable as e:
+        return jsonify({'error': str(e)}), 406
+    except ValueError as e:
+        return jsonify({'error': f"Invalid parameter: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error fetching traffic data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/traffic-data/ingest', methods=['POST'])
+def ingest_traffic_data():
+    """Ingest a batch of live sensor readings sent as NDJSON or CSV"""
+    try:
+        if request.content_length and request.content_length > INGEST_MAX_BYTES:
+            return jsonify({'error': f"Batch exceeds {INGEST_MAX_BYTES} bytes"}), 413
+            
+        fmt = request.args.get('format') or ('csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson')
+        try:
+            readings, rejected, errors = validate_batch(parse_batch(request.get_data(), fmt))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        if readings.empty and rejected:
+            return jsonify({'error': 'No valid readings in batch', 'rejected': rejected, 'errors': errors}), 400
+            
+        ingestion_buffer.submit(readings)
+        
+        # Optionally wait until the readings are queryable and reflected in aggregates, alerts and predictions
+        if request.args.get('wait', 'false').lower() == 'true':
+            ingestion_buffer.flush()
+            ingestion_buffer.drain()
+            
         return jsonify({
-            'data': data[-100:],  # Return last 100 records
-            'total_records': len(data),
-            'time_range': time_range,
-            'location_filter': location
-        })
+            'accepted': len(readings),
+            'rejected': rejected,
+            'errors': errors,
+            'ingestion': ingestion_buffer.stats()
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error fetching traffic data: {str(e)}")
+        logger.error(f"Error ingesting traffic data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/traffic-data/ingest', methods=['GET'])
+def get_ingestion_stats():
+    """Get ingestion throughput counters"""
+    return jsonify(ingestion_buffer.stats())
+
 @app.route('/api/predictions', methods=['POST'])
 def get_predictions():
     """Get traffic volume predictions"""
@@ -298,50 +1240,181 @@ def get_predictions():
         
         # Extract prediction parameters
         location = data.get('location', 'urban')
-        hours_ahead = data.get('hours_ahead', 24)
-        weather_forecast = data.get('weather_forecast', {})
-        special_events = data.get('special_events', [])
-        
-        predictions = []
-        
-        for i in range(hours_ahead):
-            future_time = datetime.now() + timedelta(hours=i)
+        try:
+            if not isinstance(location, str):
+                raise ValueError("'location' must be a string")
+            hours_ahead = int(data.get('hours_ahead', 24))
+            weather_forecast = parse_weather_forecast(data.get('weather_forecast'))
+            special_events = parse_special_events(data.get('special_events'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f"Invalid prediction request: {str(e)}"}), 400
+        if not 1 <= hours_ahead <= forecasting.MAX_HORIZON_HOURS:
+            return jsonify({'error': f"'hours_ahead' must be between 1 and {forecasting.MAX_HORIZON_HOURS}"}), 400
+            
+        try:
+            quantiles = parse_quantiles(data.get('quantiles', request.args.get('quantiles')))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f"Invalid quantiles: {str(e)}"}), 400
             
-            # Prepare features for prediction
-            features = {
-                'hour': future_time.hour,
-                'day_of_week': future_time.weekday(),
-                'temperature': weather_forecast.get('temperature', 20),
-                'weather_condition': weather_forecast.get('condition', 'clear'),
+        fmt = encoding.negotiate_format(request.args.get('format'), request.accept_mimetypes)
+        
+        # Build the whole horizon as one feature matrix
+        with timed('feature_build'):
+            start_time = pd.Timestamp(datetime.now())
+            future_times = start_time + pd.to_timedelta(np.arange(hours_ahead), unit='h')
+            features = pd.DataFrame({
+                'hour': future_times.hour,
+                'day_of_week': future_times.dayofweek,
+                'temperature': weather_forecast['temperature'],
+                'weather_condition': weather_forecast['condition'],
                 'special_events': len(special_events) > 0,
-                'location_type': location
-            }
+                'location_type': location,
+                'location': location,
+                'timestamp': future_times
+            })
             
-            # Get prediction
-            prediction = predictor.predict_volume(features)
+        # Get predictions for every hour in one pass, from one model even if a retrain swaps it meanwhile
+        with timed('inference'):
+            model = predictor
+            batch = model.predict_batch(features, quantiles=quantiles)
             
-            predictions.append({
-                'timestamp': future_time.isoformat(),
-                'predicted_volume': prediction['predicted_volume'],
-                'confidence': prediction['confidence'],
-                'factors': prediction.get('factors', {}),
-                'feature_importance': prediction.get('feature_importance', {})
+            # Columnar formats get the factors, importances and quantiles flattened into columns
+            table = pd.DataFrame({
+                'timestamp': future_times,
+                'predicted_volume': batch['predicted_volume'],
+                'confidence': batch['confidence'],
+                **batch['factors'],
+                **batch['feature_importance'],
+                **{f"quantile_{level:g}": batch['quantiles'][:, i].astype(np.int64) for i, level in enumerate(quantiles or ())}
             })
             
-        return jsonify({
-            'predictions': predictions,
-            'model_info': {
-                'type': 'ensemble',
-                'accuracy': 94.2,
-                'last_trained': (datetime.now() - timedelta(hours=2)).isoformat(),
-                'features_used': list(predictor.feature_weights.keys())
-            }
-        })
+        meta = {'model_info': model.model_info()}
+        if quantiles:
+            meta['intervals'] = {'levels': list(quantiles), 'method': batch['interval_method']}
+            
+        def to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+            return [
+                {
+                    'timestamp': timestamp.isoformat(),
+                    **prediction
+                }
+                for timestamp, prediction in zip(future_times, model.batch_to_records(batch))
+            ]
+            
+        return encoded_response(encoding.encode_table([table], fmt, meta, to_records, key='predictions'), fmt)
         
+    except encoding.NotAcceptable as e:
+        return jsonify({'error': str(e)}), 406
+    except uncertainty.ResidualsUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error generating predictions: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stream', methods=['GET'])
+def stream_updates():
+    """Push new readings, alert changes and changed predictions as Server-Sent Events"""
+    locations = [name.strip() for name in request.args.get('locations', '').split(',') if name.strip()]
+    topics = [name.strip() for name in request.args.get('topics', ','.join(TOPICS)).split(',') if name.strip()]
+    unknown = [name for name in topics if name not in TOPICS]
+    if unknown:
+        return jsonify({'error': f"Unknown topics: {', '.join(unknown)}; expected any of {', '.join(TOPICS)}"}), 400
+        
+    try:
+        subscription = live_feed.subscribe(locations or None, topics)
+    except FeedFull as e:
+        # Another worker may have room; clients reconnect on their own
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        
+    return Response(live_feed.stream(subscription), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stream/stats', methods=['GET'])
+def get_stream_stats():
+    """Get live feed subscriber and event counters"""
+    return jsonify(live_feed.stats())
+
+@app.route('/api/predictions/bulk', methods=['POST'])
+def get_bulk_predictions():
+    """Stream hourly predictions for many locations over a horizon of up to 14 days as NDJSON"""
+    try:
+        data = request.get_json() or {}
+        
+        locations = data.get('locations') or traffic_store.locations()
+        if not isinstance(locations, list) or not all(isinstance(name, str) for name in locations):
+            return jsonify({'error': "'locations' must be a list of location names"}), 400
+            
+        start = pd.Timestamp(data['start']) if data.get('start') else pd.Timestamp(current_hour()) + pd.Timedelta(hours=1)
+        if start.tzinfo is not None:
+            start = start.tz_convert(datetime.now().astimezone().tzinfo).tz_localize(None)
+            
+        hours = int(data['horizon_hours']) if 'horizon_hours' in data else int(data.get('horizon_days', 1)) * 24
+        if not 1 <= hours <= forecasting.MAX_HORIZON_HOURS:
+            return jsonify({'error': f"Horizon must be between 1 and {forecasting.MAX_HORIZON_HOURS} hours"}), 400
+            
+        quantiles = parse_quantiles(data.get('quantiles'))
+        weather_forecast = parse_weather_forecast(data.get('weather_forecast'))
+        special_events = parse_special_events(data.get('special_events'))
+        
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid bulk forecast request: {str(e)}"}), 400
+        
+    rows = len(locations) * hours
+    model = predictor
+    if quantiles is not None:
+        # Fail before streaming rather than partway through the body
+        try:
+            model.interval_table(quantiles)
+        except uncertainty.ResidualsUnavailable as e:
+            return jsonify({'error': str(e)}), 503
+            
+    executor = forecast_executor() if rows >= FORECAST_PARALLEL_ROWS and FORECAST_WORKERS > 1 else None
+    chunks = forecasting.iter_forecast(
+        model, locations, start.to_pydatetime(), hours,
+        weather=weather_forecast,
+        special_events=len(special_events) > 0,
+        executor=executor,
+        max_in_flight=2 * FORECAST_WORKERS,
+        quantiles=quantiles
+    )
+    chunks = stage_seconds.time_iter(chunks, endpoint=endpoint_label(), stage='forecast')
+    
+    def generate():
+        try:
+            yield from chunks
+        except BrokenProcessPool:
+            _reset_forecast_executor()
+            logger.error("Forecast worker pool broke during a bulk forecast")
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming bulk predictions: {str(e)}")
+            raise
+            
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'X-Forecast-Rows': str(rows),
+        'X-Model-Version': model.model_version
+    })
+
+@app.route('/api/predictions/cache', methods=['GET'])
+def get_prediction_cache_stats():
+    """Get prediction cache size and hit/miss counters"""
+    return jsonify(prediction_cache.stats())
+
+@app.route('/api/model/online', methods=['GET'])
+def get_online_learning_stats():
+    """Get online correction update counters"""
+    online = predictor.online
+    if online is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'model_version': predictor.model_version, **online.stats()})
+
+@app.route('/api/model/features', methods=['GET'])
+def get_feature_store_stats():
+    """Get feature store size and update counters"""
+    return jsonify(feature_store.stats())
+
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Get traffic analytics and insights"""
@@ -358,145 +1431,96 @@ def get_analytics():
         else:
             days = 90
             
-        historical_data = data_generator.generate_historical_data(days=days)
-        
-        # Calculate analytics
-        total_volume = sum(item['vehicle_count'] for item in historical_data)
-        avg_speed = np.mean([item['average_speed'] for item in historical_data])
-        congestion_events = len([item for item in historical_data if item['congestion_level'] in ['high', 'critical']])
-        
-        # Peak hours analysis
-        hourly_volumes = {}
-        for item in historical_data:
-            hour = datetime.fromisoformat(item['timestamp']).hour
-            if hour not in hourly_volumes:
-                hourly_volumes[hour] = []
-            hourly_volumes[hour].append(item['vehicle_count'])
-            
-        peak_hours = []
-        for hour, volumes in hourly_volumes.items():
-            avg_volume = np.mean(volumes)
-            peak_hours.append({
-                'hour': f"{hour:02d}:00",
-                'average_volume': int(avg_volume),
-                'peak_indicator': avg_volume > np.mean([np.mean(v) for v in hourly_volumes.values()]) * 1.2
-            })
+        if metric not in analytics_engine.METRICS:
+            return jsonify({'error': f"Unsupported metric '{metric}'"}), 400
             
-        peak_hours.sort(key=lambda x: x['average_volume'], reverse=True)
-        
-        # Weather impact analysis
-        weather_impact = {}
-        for item in historical_data:
-            condition = item['weather_condition']
-            if condition not in weather_impact:
-                weather_impact[condition] = []
-            weather_impact[condition].append(item['vehicle_count'])
-            
-        weather_analysis = []
-        for condition, volumes in weather_impact.items():
-            weather_analysis.append({
-                'condition': condition.title(),
-                'average_volume': int(np.mean(volumes)),
-                'impact_factor': np.mean(volumes) / np.mean([np.mean(v) for v in weather_impact.values()])
-            })
+        fmt = encoding.negotiate_format(request.args.get('format'), request.accept_mimetypes, encoding.DOCUMENT_FORMATS)
+        
+        with timed('data_fetch'):
+            refresh_traffic_store()
             
-        return jsonify({
-            'summary': {
-                'total_volume': total_volume,
-                'average_speed': round(avg_speed, 1),
-                'congestion_events': congestion_events,
-                'analysis_period': period
-            },
-            'peak_hours': peak_hours[:5],  # Top 5 peak hours
-            'weather_impact': weather_analysis,
-            'trends': {
-                'volume_trend': 'increasing' if np.random.random() > 0.5 else 'stable',
-                'speed_trend': 'improving' if np.random.random() > 0.5 else 'declining',
-                'efficiency_score': round(np.random.uniform(75, 95), 1)
-            }
-        })
+        # Merge the pre-aggregated hourly buckets for the period; raw rows are never rescanned
+        with timed('aggregation'):
+            end = current_hour() + timedelta(hours=1)
+            aggregates = rolling_aggregates.window(days * 24, end=end)
+            analytics = analytics_engine.summarize(aggregates, metric=metric, period=period)
+            # Trends compare the second half of the period with the first
+            half = days * 12
+            analytics['trends'] = analytics_engine.trends(
+                rolling_aggregates.window(half, end=end),
+                rolling_aggregates.window(half, end=end - timedelta(hours=half))
+            )
+            
+        with timed('serialization'):
+            body = encoding.encode_document(analytics, fmt)
+            
+        return encoded_response(body, fmt)
         
+    except encoding.NotAcceptable as e:
+        return jsonify({'error': str(e)}), 406
     except Exception as e:
         logger.error(f"Error generating analytics: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/model/retrain', methods=['POST'])
 def retrain_model():
-    """Retrain the ML model with new data"""
+    """Start retraining the ML model with new data in the background"""
     try:
-        # In a real implementation, this would retrain the actual ML model
-        # For demo purposes, we'll simulate the retraining process
-        
-        training_data_size = np.random.randint(10000, 50000)
-        training_time = np.random.uniform(30, 120)  # seconds
-        
-        # Simulate model performance improvement
-        old_accuracy = 94.2
-        new_accuracy = min(99.0, old_accuracy + np.random.uniform(0.1, 2.0))
+        job = submit_retrain_job()
         
         return jsonify({
-            'status': 'success',
-            'message': 'Model retrained successfully',
-            'training_info': {
-                'data_points_used': training_data_size,
-                'training_time_seconds': round(training_time, 1),
-                'old_accuracy': old_accuracy,
-                'new_accuracy': round(new_accuracy, 2),
-                'improvement': round(new_accuracy - old_accuracy, 2),
-                'retrained_at': datetime.now().isoformat()
-            }
-        })
+            'status': 'accepted',
+            'message': 'Model retraining started',
+            'job_id': job['job_id'],
+            'status_url': f"/api/model/jobs/{job['job_id']}",
+            'job': job
+        }), 202
         
     except Exception as e:
         logger.error(f"Error retraining model: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/model/jobs/<job_id>', methods=['GET'])
+def get_model_job(job_id: str):
+    """Get the status and progress of a retraining job"""
+    try:
+        job = training.read_job_status(MODEL_DIR, job_id)
+        if job is None:
+            return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+            
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Error fetching job status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request, stage and component metrics in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/profiles', methods=['GET'])
+def get_profiles():
+    """List the kept profile reports"""
+    return jsonify({'mode': request_profiler.mode, 'engine': request_profiler.engine, 'profiles': request_profiler.reports()})
+
+@app.route('/api/metrics/profiles/<report_id>', methods=['GET'])
+def get_profile(report_id: str):
+    """Get one profile report as text"""
+    report = request_profiler.report(report_id)
+    if report is None:
+        return jsonify({'error': f"Unknown profile report '{report_id}'"}), 404
+    return Response(report['report'], mimetype='text/plain')
+
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
     """Get current traffic alerts and notifications"""
     try:
-        # Generate mock alerts
-        alerts = []
-        
-        # Critical congestion alert
-        if np.random.random() > 0.7:
-            alerts.append({
-                'id': 'alert_001',
-                'type': 'critical_congestion',
-                'severity': 'high',
-                'location': 'Highway A1',
-                'message': 'Critical congestion detected - 85% above normal volume',
-                'timestamp': datetime.now().isoformat(),
-                'estimated_duration': '45 minutes',
-                'recommended_action': 'Consider alternative routes'
-            })
-            
-        # Weather impact alert
-        if np.random.random() > 0.8:
-            alerts.append({
-                'id': 'alert_002',
-                'type': 'weather_impact',
-                'severity': 'medium',
-                'location': 'Downtown Area',
-                'message': 'Heavy rain expected to reduce traffic flow by 20%',
-                'timestamp': (datetime.now() + timedelta(hours=2)).isoformat(),
-                'estimated_duration': '2 hours',
-                'recommended_action': 'Adjust signal timing for weather conditions'
-            })
-            
-        # Maintenance alert
-        if np.random.random() > 0.9:
-            alerts.append({
-                'id': 'alert_003',
-                'type': 'maintenance',
-                'severity': 'low',
-                'location': 'Airport Road',
-                'message': 'Scheduled maintenance will close one lane',
-                'timestamp': (datetime.now() + timedelta(days=1)).isoformat(),
-                'estimated_duration': '4 hours',
-                'recommended_action': 'Plan traffic diversion routes'
-            })
-            
+        refresh_traffic_store()
+        
+        # Alerts are maintained as readings arrive; serving them is a read of the active index
+        alerts = alert_engine.active_alerts()
+        
         return jsonify({
             'alerts': alerts,
             'total_active_alerts': len(alerts),
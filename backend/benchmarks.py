@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+TrafficTelligence Benchmarks
+Microbenchmarks and load tests for the API and model hot paths
+
+Microbenchmarks time prediction, data generation and analytics at the 1h,
+24h, 7d, 30d and 90d scales. The load test drives every endpoint with
+concurrent requests through the Flask test client, or against a running
+server with --url, and reports p50/p95/p99 latency, throughput and peak RSS
+(plus per-worker memory for a preforking server given --server-pid). It
+also starts two retraining jobs, which swap in a new model as they finish.
+Results are written as JSON. Pass an earlier results file as --baseline to
+compare against it; the exit status is 1 when anything regressed.
+
+    python benchmarks.py --output results.json
+    python benchmarks.py --baseline results.json --tolerance 0.2
+    python benchmarks.py --url http://localhost:5000 --server-pid 1234 --skip-micro
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Scale name to hours of data
+SCALES = {'1h': 1, '24h': 24, '7d': 7 * 24, '30d': 30 * 24, '90d': 90 * 24}
+
+# Endpoints exercised by the load test: (name, method, path, body). Bodies are JSON, 'ndjson' for an
+# ingestion batch, or 'sse' for an event stream, timed to its first event. A path may name a value
+# from an earlier endpoint's response, such as the {job_id} of a retrain.
+# /api/metrics/profiles/<report_id> is left out: reports only exist with the profiler enabled.
+ENDPOINTS = [
+    ('health', 'GET', '/api/health', None),
+    ('health_live', 'GET', '/api/health/live', None),
+    ('health_ready', 'GET', '/api/health/ready', None),
+    ('traffic_data', 'GET', '/api/traffic-data', None),
+    ('traffic_data_7d_columns', 'GET', '/api/traffic-data?time_range=7d&limit=all&format=columns', None),
+    ('traffic_data_30d_daily', 'GET', '/api/traffic-data?time_range=30d&resolution=day&limit=all', None),
+    ('ingest', 'POST', '/api/traffic-data/ingest', 'ndjson'),
+    ('ingest_stats', 'GET', '/api/traffic-data/ingest', None),
+    ('predictions', 'POST', '/api/predictions', {'location': 'urban', 'hours_ahead': 24}),
+    ('predictions_intervals', 'POST', '/api/predictions',
+     {'location': 'urban', 'hours_ahead': 24, 'quantiles': [0.05, 0.5, 0.95]}),
+    ('predictions_bulk_7d', 'POST', '/api/predictions/bulk', {'horizon_days': 7}),
+    ('prediction_cache_stats', 'GET', '/api/predictions/cache', None),
+    ('analytics_7d', 'GET', '/api/analytics?period=7d', None),
+    ('analytics_90d', 'GET', '/api/analytics?period=90d&metric=congestion', None),
+    ('alerts', 'GET', '/api/alerts', None),
+    ('stream', 'GET', '/api/stream', 'sse'),
+    ('stream_stats', 'GET', '/api/stream/stats', None),
+    ('model_online', 'GET', '/api/model/online', None),
+    ('model_features', 'GET', '/api/model/features', None),
+    ('model_retrain', 'POST', '/api/model/retrain', None),
+    ('model_job', 'GET', '/api/model/jobs/{job_id}', None),
+    ('metrics', 'GET', '/api/metrics', None),
+    ('metrics_profiles', 'GET', '/api/metrics/profiles', None)
+]
+
+# Timed requests for endpoints where each request starts real work, such as a training job
+MAX_REQUESTS = {'model_retrain': 1}
+
+# Response fields later endpoint paths may refer to
+CAPTURED_FIELDS = ('job_id',)
+
+
+def peak_rss_mb(pid: int = None) -> Optional[float]:
+    """Peak resident set size of this process, or of another process on Linux"""
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def worker_memory_mb(server_pid: int) -> Dict[str, Dict[str, float]]:
+    """Memory of each child of a server process, such as gunicorn workers, by pid on Linux"""
+    import metrics
+    try:
+        with open(f"/proc/{server_pid}/task/{server_pid}/children") as f:
+            children = [int(pid) for pid in f.read().split()]
+    except OSError:
+        return {}
+    return {
+        str(pid): {name: round(value / (1024 * 1024), 1) for name, value in metrics.process_memory(pid).items()}
+        for pid in children
+    }
+
+
+def time_call(func: Callable[[], Any], repeat: int, number: int = 1) -> Dict[str, Any]:
+    """Time func over repeat rounds of number calls each; reports per-call milliseconds"""
+    func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'min_ms': round(min(samples), 4),
+        'max_ms': round(max(samples), 4),
+        'rounds': repeat,
+        'calls_per_round': number
+    }
+
+
+def run_microbenchmarks(app_module: Any, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Time prediction, data generation and analytics hot paths"""
+    results = {}
+    predictor = app_module.predictor
+    generator = app_module.TrafficDataGenerator(seed=42)
+    analytics = app_module.analytics_engine
+    rolling = app_module.rolling_aggregates
+    end = app_module.current_hour() + timedelta(hours=1)
+
+    def record(name: str, func: Callable[[], Any], number: int = 1, rows: int = None) -> None:
+        result = time_call(func, repeat, number)
+        if rows:
+            result['rows'] = rows
+            result['rows_per_second'] = round(rows / (result['median_ms'] / 1000)) if result['median_ms'] else None
+        results[name] = result
+        print(f"  {name:<40} {result['median_ms']:>10.3f} ms")
+
+    features = {'hour': 8, 'day_of_week': 2, 'temperature': 18, 'weather_condition': 'rainy',
+                'special_events': False, 'location_type': 'urban'}
+    record('predict_volume', lambda: predictor.predict_volume(features), number=50)
+
+    rng = np.random.default_rng(0)
+    for n_rows in (24, 10000):
+        batch = {
+            'hour': rng.integers(0, 24, n_rows),
+            'day_of_week': rng.integers(0, 7, n_rows),
+            'temperature': rng.uniform(-5, 35, n_rows).round(),
+            'weather_condition': rng.choice(['clear', 'cloudy', 'rainy', 'snowy', 'foggy'], n_rows),
+            'special_events': rng.random(n_rows) < 0.1,
+            'location_type': rng.choice(['highway', 'urban', 'suburban', 'rural'], n_rows)
+        }
+        record(f"predict_batch_cached_{n_rows}", lambda: predictor.predict_batch(batch), rows=n_rows)
+        record(f"predict_batch_uncached_{n_rows}",
+               lambda: predictor.predict_batch(batch, rng=np.random.default_rng(1)), rows=n_rows)
+
+        located = dict(batch, location=rng.choice(generator.LOCATIONS, n_rows),
+                       timestamp=np.datetime64(end, 'h') - rng.integers(0, 24 * 90, n_rows).astype('timedelta64[h]'))
+        record(f"encode_features_{n_rows}", lambda: app_module.feature_store.encode(located), rows=n_rows)
+
+    # A dashboard polling the same day of hourly predictions, served from the prediction cache or computed
+    # every time; a trained model costs more to evaluate than the multipliers, so the cache saves more
+    import training
+    from prediction import PredictionCache, TrafficPredictor
+    trained = TrafficPredictor(cache=PredictionCache(), feature_store=app_module.feature_store)
+    history = pd.concat(list(generator.iter_frames_between(end - timedelta(days=30), end)), ignore_index=True)
+    trained.load(training.save_artifact(training.train_model(history), tempfile.mkdtemp(prefix='traffic-bench-model-')))
+    times = pd.Timestamp(end) + pd.to_timedelta(np.arange(24), unit='h')
+    poll = {'hour': times.hour.to_numpy(), 'day_of_week': times.dayofweek.to_numpy(), 'location_type': 'highway',
+            'location': 'Highway A1', 'timestamp': times.to_numpy()}
+    for label, model in (('heuristic', predictor), ('trained', trained)):
+        record(f"predict_poll_24_cached_{label}", lambda: model.predict_batch(poll), rows=24)
+        record(f"predict_poll_24_uncached_{label}", lambda: model.predict_batch(poll, use_cache=False), rows=24)
+
+    for scale, hours in SCALES.items():
+        start = end - timedelta(hours=hours)
+        n_rows = hours * len(generator.LOCATIONS)
+        record(f"generate_frame_{scale}", lambda: list(generator.iter_frames_between(start, end)), rows=n_rows)
+        record(f"generate_records_{scale}",
+               lambda: [generator.frame_to_records(frame) for frame in generator.iter_frames_between(start, end)],
+               rows=n_rows)
+
+        frame = pd.concat(list(generator.iter_frames_between(start, end)), ignore_index=True)
+        record(f"analytics_raw_{scale}",
+               lambda: analytics.summarize(analytics.aggregate(frame), metric='volume', period=scale), rows=n_rows)
+        record(f"analytics_rolling_{scale}",
+               lambda: analytics.summarize(rolling.window(hours, end), metric='volume', period=scale))
+        record(f"feature_store_update_{scale}", lambda: app_module.FeatureStore().update(frame), rows=n_rows)
+
+    return results
+
+
+def ingest_body(app_module: Any, n_rows: int = 100) -> bytes:
+    """An NDJSON batch of current readings for the ingestion endpoint"""
+    now = datetime.now().replace(microsecond=0)
+    locations = app_module.TrafficDataGenerator.LOCATIONS
+    lines = [
+        json.dumps({
+            'timestamp': (now - timedelta(seconds=i)).isoformat(),
+            'location': locations[i % len(locations)],
+            'vehicle_count': 100 + i % 50,
+            'average_speed': 40 + i % 20
+        })
+        for i in range(n_rows)
+    ]
+    return '\n'.join(lines).encode()
+
+
+def run_load_test(send: Callable[[str, str, Any], Tuple[int, bytes]], requests: int, concurrency: int,
+                  ingest: bytes, endpoints: List[tuple] = ENDPOINTS) -> Dict[str, Dict[str, Any]]:
+    """
+    Drive each endpoint with concurrent requests
+
+    Args:
+        send: Callable taking (method, path, body) and returning the status
+            code and response body
+        requests: Requests per endpoint, after a short warm-up
+        concurrency: Requests in flight at once
+        ingest: NDJSON body used for the ingestion endpoint
+    """
+    results = {}
+    captured = {}
+    for name, method, path, body in endpoints:
+        body = ingest if body == 'ndjson' else body
+        path = path.format(**captured)
+        count = min(requests, MAX_REQUESTS.get(name, requests))
+        for _ in range(min(3, count)):
+            content = send(method, path, body)[1]
+            captured.update(response_fields(content))
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def one(_: int) -> None:
+            started = time.perf_counter()
+            try:
+                status = send(method, path, body)[0]
+            except Exception as e:
+                status = str(e)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not isinstance(status, int) or status >= 400:
+                    errors.append(status)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(count)))
+        wall = time.perf_counter() - started
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        results[name] = {
+            'requests': count,
+            'concurrency': concurrency,
+            'errors': len(errors),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'throughput_rps': round(count / wall, 1)
+        }
+        print(f"  {name:<40} p50 {p50:>9.2f} ms  p95 {p95:>9.2f} ms  p99 {p99:>9.2f} ms  "
+              f"{results[name]['throughput_rps']:>8.1f} req/s" + (f"  errors {len(errors)}" if errors else ''))
+    return results
+
+
+def response_fields(content: bytes) -> Dict[str, str]:
+    """CAPTURED_FIELDS found at the top level of a JSON response body"""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {name: str(data[name]) for name in CAPTURED_FIELDS if name in data}
+
+
+def in_process_sender(app_module: Any) -> Callable[[str, str, Any], Tuple[int, bytes]]:
+    """Send requests in-process, with one Flask test client per thread"""
+    local = threading.local()
+
+    def send(method: str, path: str, body: Any) -> Tuple[int, bytes]:
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        if body == 'sse':
+            # The stream never ends: read its first event, then disconnect
+            response = client.open(path, method=method, buffered=False)
+            try:
+                return response.status_code, next(iter(response.response), b'')
+            finally:
+                response.close()
+        if isinstance(body, bytes):
+            response = client.open(path, method=method, data=body, content_type='application/x-ndjson')
+        else:
+            response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+    return send
+
+
+def http_sender(base_url: str) -> Callable[[str, str, Any], Tuple[int, bytes]]:
+    """Send requests to a running server over HTTP"""
+    def send(method: str, path: str, body: Any) -> Tuple[int, bytes]:
+        if body == 'sse':
+            data, content_type = None, 'application/json'
+        elif isinstance(body, bytes):
+            data, content_type = body, 'application/x-ndjson'
+        else:
+            data, content_type = (json.dumps(body).encode() if body is not None else None), 'application/json'
+        request = urllib.request.Request(base_url.rstrip('/') + path, data=data, method=method,
+                                         headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, response.readline() if body == 'sse' else response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    return send
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """List benchmarks slower than the baseline by more than tolerance (a fraction) and min_delta_ms"""
+    regressions = []
+    sections = [('micro', 'median_ms'), ('load', 'p95_ms')]
+    print(f"\nComparison with baseline from {baseline.get('meta', {}).get('started_at')}:")
+    for section, key in sections:
+        for name, result in results.get(section, {}).items():
+            reference = baseline.get(section, {}).get(name)
+            if not reference or not reference.get(key):
+                continue
+            ratio = result[key] / reference[key]
+            flag = ''
+            if ratio > 1 + tolerance and result[key] - reference[key] > min_delta_ms:
+                flag = '  REGRESSION'
+                regressions.append(f"{section}.{name}")
+            print(f"  {section}.{name:<40} {reference[key]:>10.3f} -> {result[key]:>10.3f} {key}  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results JSON')
+    parser.add_argument('--baseline', help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before flagging, as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Slowdowns smaller than this many milliseconds are treated as noise')
+    parser.add_argument('--repeat', type=int, default=7, help='Timing rounds per microbenchmark')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint in the load test')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests in the load test')
+    parser.add_argument('--url', help='Load test a running server, e.g. a local gunicorn, instead of the test client')
+    parser.add_argument('--server-pid', type=int,
+                        help='Server process whose peak RSS, and its workers\' memory, to report with --url')
+    parser.add_argument('--skip-micro', action='store_true', help='Skip the microbenchmarks')
+    parser.add_argument('--skip-load', action='store_true', help='Skip the load test')
+    args = parser.parse_args(argv)
+
+    # Benchmark against a throwaway database and model directory unless configured otherwise
+    workdir = tempfile.mkdtemp(prefix='traffic-bench-')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'traffic.db'))
+    os.environ.setdefault('ML_MODEL_PATH', os.path.join(workdir, 'models'))
+
+    started = time.perf_counter()
+    import app as app_module
+    startup_seconds = time.perf_counter() - started
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'started_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or 'test_client',
+            'database_url': os.environ['DATABASE_URL'],
+            'model_version': app_module.predictor.model_version,
+            'app_import_seconds': round(startup_seconds, 3)
+        }
+    }
+
+    if not args.skip_micro:
+        print('Microbenchmarks:')
+        results['micro'] = run_microbenchmarks(app_module, args.repeat)
+        results['meta']['peak_rss_mb_after_micro'] = peak_rss_mb()
+
+    if not args.skip_load:
+        print(f"Load test ({args.requests} requests per endpoint, concurrency {args.concurrency}):")
+        send = http_sender(args.url) if args.url else in_process_sender(app_module)
+        results['load'] = run_load_test(send, args.requests, args.concurrency, ingest_body(app_module))
+        results['meta']['server_peak_rss_mb'] = peak_rss_mb(args.server_pid) if args.url else peak_rss_mb()
+        if args.url and args.server_pid:
+            # rss counts pages shared with the master in full; private is what each worker adds
+            results['meta']['server_workers_mb'] = worker_memory_mb(args.server_pid)
+            for pid, memory in results['meta']['server_workers_mb'].items():
+                print(f"  worker {pid}: {memory}")
+
+    results['meta']['peak_rss_mb'] = peak_rss_mb()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
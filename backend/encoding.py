@@ -0,0 +1,241 @@
+"""
+TrafficTelligence Response Encoding
+Content negotiation, compact formats and streaming compression for API responses
+
+Tabular payloads are encoded batch by batch, so large results are streamed
+instead of being built as one list of dictionaries. Besides the default JSON
+rows, clients can ask for column-oriented JSON, NDJSON, MessagePack or Arrow
+IPC, and for gzip or zstd compression. MessagePack, Arrow and zstd are used
+when their packages are installed.
+"""
+
+import io
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MIMETYPES = {
+    'json': 'application/json',
+    'columns': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Accept header media types, in the order they are preferred on equal quality
+ACCEPTED_MIMETYPES = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.apache.arrow.stream': 'arrow'
+}
+
+# Formats for nested documents such as analytics; Arrow and NDJSON only carry tables
+DOCUMENT_FORMATS = ['json', 'columns', 'msgpack']
+
+# A 'columns' document holds every row in memory before it is sent, so endpoints reject larger unpaged tables
+MAX_COLUMNS_ROWS = 100000
+
+
+class NotAcceptable(ValueError):
+    """No supported response format matches the request"""
+
+
+def available_formats() -> List[str]:
+    """Formats whose optional packages are installed"""
+    return [fmt for fmt in MIMETYPES
+            if not (fmt == 'msgpack' and msgpack is None) and not (fmt == 'arrow' and pa is None)]
+
+
+def negotiate_format(requested: Optional[str], accept: Any, supported: Iterable[str] = MIMETYPES) -> str:
+    """
+    Choose a response format
+
+    Args:
+        requested: Explicit 'format' query parameter, which takes precedence
+        accept: The request's Accept header as werkzeug MIMEAccept
+        supported: Formats the endpoint can produce
+
+    Returns:
+        Format name, one of MIMETYPES
+    """
+    usable = [fmt for fmt in supported if fmt in available_formats()]
+    if requested:
+        if requested not in usable:
+            raise NotAcceptable(f"Unsupported format '{requested}', expected one of {', '.join(usable)}")
+        return requested
+
+    offered = [mimetype for mimetype, fmt in ACCEPTED_MIMETYPES.items() if fmt in usable]
+    best = accept.best_match(offered) if accept else None
+    return ACCEPTED_MIMETYPES[best] if best else 'json'
+
+
+def negotiate_encoding(accept_encoding: Any) -> Optional[str]:
+    """Choose zstd or gzip compression from the Accept-Encoding header, or None for identity"""
+    offered = (['zstd'] if zstandard is not None else []) + ['gzip']
+    return accept_encoding.best_match(offered) if accept_encoding else None
+
+
+def compress(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a stream of chunks, flushing after each one so clients can decode incrementally"""
+    if encoding is None:
+        yield from chunks
+        return
+
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        flush_mode = zlib.Z_SYNC_FLUSH
+
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(flush_mode)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_table(batches: Iterable[pd.DataFrame], fmt: str, meta: Dict[str, Any],
+                 to_records: Callable[[pd.DataFrame], List[Dict[str, Any]]], key: str = 'data') -> Iterator[bytes]:
+    """
+    Encode a table, delivered as a sequence of frames, in the given format
+
+    Row formats use to_records for each batch; columnar formats encode the
+    frame columns directly. JSON documents carry meta alongside the table
+    under key; MessagePack sends meta first, followed by one map of column
+    arrays per batch; Arrow sends meta as schema metadata. The 'columns'
+    format is the one exception to streaming: each column must be complete
+    before the next starts, so the table is collected first (see
+    MAX_COLUMNS_ROWS).
+    """
+    if fmt == 'json':
+        yield _json(meta)[:-1].encode() + (b',' if meta else b'') + f'"{key}":['.encode()
+        first = True
+        for batch in batches:
+            records = to_records(batch)
+            if records:
+                yield (b'' if first else b',') + _json(records)[1:-1].encode()
+                first = False
+        yield b']}'
+
+    elif fmt == 'ndjson':
+        for batch in batches:
+            records = to_records(batch)
+            if records:
+                yield ('\n'.join(_json(record) for record in records) + '\n').encode()
+
+    elif fmt == 'columns':
+        columns: Dict[str, list] = {}
+        for batch in batches:
+            for name, values in columns_to_lists(batch).items():
+                columns.setdefault(name, []).extend(values)
+        yield _json({**meta, key: columns}).encode()
+
+    elif fmt == 'msgpack':
+        packer = msgpack.Packer()
+        yield packer.pack(meta)
+        for batch in batches:
+            if len(batch):
+                yield packer.pack(columns_to_lists(batch))
+
+    elif fmt == 'arrow':
+        yield from _encode_arrow(batches, meta)
+
+    else:
+        raise NotAcceptable(f"Unsupported format '{fmt}'")
+
+
+def encode_document(document: Dict[str, Any], fmt: str) -> bytes:
+    """Encode a nested, JSON-serializable document; lists of uniform objects become columns in 'columns' format"""
+    if fmt == 'json':
+        return _json(document).encode()
+    if fmt == 'columns':
+        return _json(_columnize(document)).encode()
+    if fmt == 'msgpack':
+        return msgpack.packb(document)
+    raise NotAcceptable(f"Format '{fmt}' is not available for this endpoint, expected one of {', '.join(DOCUMENT_FORMATS)}")
+
+
+def columns_to_lists(frame: pd.DataFrame) -> Dict[str, list]:
+    """Convert a frame to one JSON-ready list per column; timestamps become ISO strings and missing values None"""
+    columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            micros = values.to_numpy(dtype='datetime64[us]')
+            whole_seconds = not (micros.astype(np.int64) % 1000000).any()
+            columns[name] = np.datetime_as_string(micros, unit='s' if whole_seconds else 'us').tolist()
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            columns[name] = values.astype(str).tolist()
+        elif values.isna().any():
+            columns[name] = values.astype(object).where(values.notna(), None).tolist()
+        else:
+            columns[name] = values.tolist()
+    return columns
+
+
+def frame_to_rows(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a frame to JSON-ready row dictionaries, with values as in columns_to_lists"""
+    columns = columns_to_lists(frame)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _encode_arrow(batches: Iterable[pd.DataFrame], meta: Dict[str, Any]) -> Iterator[bytes]:
+    """Write frames as an Arrow IPC stream; categoricals stay dictionary-encoded"""
+    sink = io.BytesIO()
+    writer = schema = None
+    for batch in batches:
+        if writer is None:
+            schema = pa.Schema.from_pandas(batch, preserve_index=False).with_metadata({'meta': _json(meta)})
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(pa.RecordBatch.from_pandas(batch, schema=schema, preserve_index=False))
+        yield _take(sink)
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.schema([]).with_metadata({'meta': _json(meta)}))
+    writer.close()
+    yield _take(sink)
+
+
+def _take(sink: io.BytesIO) -> bytes:
+    """Return the bytes written to a sink so far and empty it"""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def _columnize(value: Any) -> Any:
+    """Turn lists of objects with identical keys into objects of lists, recursively"""
+    if isinstance(value, dict):
+        return {key: _columnize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value) and all(item.keys() == value[0].keys() for item in value):
+            return {key: _columnize([item[key] for item in value]) for key in value[0]}
+        return [_columnize(item) for item in value]
+    return value
+
+
+def _json(value: Any) -> str:
+    """Compact JSON"""
+    return json.dumps(value, separators=(',', ':'))
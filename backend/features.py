@@ -0,0 +1,269 @@
+"""
+TrafficTelligence Feature Store
+Precomputed calendar, weather and historical-average features as integer-coded arrays
+
+Model inputs are read from small precomputed tables rather than derived row
+by row: categories become int8 codes through one lookup per distinct value,
+holiday flags come from a per-day table built once, and the mean volume of
+every location and location type per hour of the week is kept as running
+sums that each new batch of readings is folded into. Encoding a batch of
+prediction or observation rows is then a factorize plus a few gathers.
+Training and inference encode through the same store, so both see features
+computed the same way.
+"""
+
+import copy
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+HOURS_PER_WEEK = 7 * 24
+
+WEATHER_CATEGORIES = ['clear', 'cloudy', 'rainy', 'snowy', 'foggy']
+LOCATION_TYPES = ['highway', 'urban', 'suburban', 'rural']
+
+# Days covered by the holiday table; dates outside it count as ordinary days
+CALENDAR_START = '2000-01-01'
+CALENDAR_END = '2060-12-31'
+
+
+def encode_categories(values: Any, categories: list) -> np.ndarray:
+    """Encode strings as int8 indices into categories (case-insensitive); unknown values become -1"""
+    if not isinstance(values, (pd.Series, pd.Categorical)):
+        values = np.asarray(values).reshape(-1)
+        if values.strides == (0,) and len(values):
+            # One value broadcast over the batch
+            return np.full(len(values), encode_categories(values[:1], categories)[0], dtype=np.int8)
+    codes, uniques = pd.factorize(values)
+    names = [str(name).lower() for name in uniques]
+    lookup = np.array([categories.index(name) if name in categories else -1 for name in names] + [-1], dtype=np.int8)
+    return lookup[codes]
+
+
+def hour_of_week(hour: Any, day_of_week: Any) -> np.ndarray:
+    """Hour of the week, Monday 00:00 being 0"""
+    return ((np.asarray(day_of_week, dtype=np.int64) % 7) * 24 + np.asarray(hour, dtype=np.int64) % 24).astype(np.int16)
+
+
+def epoch_hour_of_week(hour_index: Any) -> np.ndarray:
+    """Hour of the week, as hour_of_week, of hours counted since the epoch (1970-01-01 was a Thursday)"""
+    hour_index = np.asarray(hour_index, dtype=np.int64)
+    return hour_of_week(hour_index % 24, hour_index // 24 + 3)
+
+
+@lru_cache(maxsize=1)
+def holiday_table() -> np.ndarray:
+    """Holiday flag for every day from CALENDAR_START to CALENDAR_END, built once per process"""
+    first = np.datetime64(CALENDAR_START, 'D')
+    flags = np.zeros((np.datetime64(CALENDAR_END, 'D') - first).astype(np.int64) + 1, dtype=np.int8)
+    holidays = USFederalHolidayCalendar().holidays(CALENDAR_START, CALENDAR_END)
+    flags[(np.asarray(holidays, dtype='datetime64[D]') - first).astype(np.int64)] = 1
+    return flags
+
+
+def holidays(timestamps: Any) -> np.ndarray:
+    """Holiday flag (0 or 1) of each timestamp's date"""
+    table = holiday_table()
+    days = (np.asarray(timestamps, dtype='datetime64[D]') - np.datetime64(CALENDAR_START, 'D')).astype(np.int64)
+    inside = (days >= 0) & (days < len(table))
+    return np.where(inside, table[np.clip(days, 0, len(table) - 1)], 0).astype(np.int8)
+
+
+class FeatureStore:
+    """
+    Model input features, updated incrementally as readings arrive
+
+    Historical averages are the mean observed volume of a row's location in
+    its hour of the week, falling back to the mean of its location type, and
+    NaN where neither has readings. Rows are encoded into the columns named
+    in training.FEATURE_COLUMNS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slots: Dict[str, int] = {}
+        self.location_sums = np.zeros((8, HOURS_PER_WEEK))
+        self.location_counts = np.zeros((8, HOURS_PER_WEEK), dtype=np.int64)
+        self.type_sums = np.zeros((len(LOCATION_TYPES), HOURS_PER_WEEK))
+        self.type_counts = np.zeros((len(LOCATION_TYPES), HOURS_PER_WEEK), dtype=np.int64)
+        self.location_means = np.full((8, HOURS_PER_WEEK), np.nan, dtype=np.float32)
+        self.type_means = np.full((len(LOCATION_TYPES), HOURS_PER_WEEK), np.nan, dtype=np.float32)
+        self.rows_applied = 0
+        self.updated_at = None
+        self.last_update_ms = None
+
+    @classmethod
+    def from_history(cls, history: pd.DataFrame) -> 'FeatureStore':
+        """Store holding the averages of a frame of stored observations"""
+        store = cls()
+        store.update(history)
+        return store
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """Fold a batch of observations, as written to the TrafficStore, into the historical averages"""
+        self._apply(frame, 1)
+
+    def remove(self, frame: pd.DataFrame) -> None:
+        """Take previously folded observations back out, e.g. ones a re-sent reading replaced"""
+        self._apply(frame, -1)
+
+    def _apply(self, frame: pd.DataFrame, sign: int) -> None:
+        """Add (sign 1) or subtract (sign -1) a batch of observations"""
+        if frame.empty:
+            return
+
+        started = datetime.now()
+        timestamps = pd.DatetimeIndex(frame['timestamp'])
+        cells = hour_of_week(timestamps.hour.to_numpy(), timestamps.dayofweek.to_numpy()).astype(np.int64)
+        types = encode_categories(frame['road_type'], LOCATION_TYPES).astype(np.int64)
+        volume = sign * frame['vehicle_count'].to_numpy(dtype=np.float64)
+        codes, names = pd.factorize(frame['location'].astype(str))
+
+        with self._lock:
+            slots = np.array([self._slot(name) for name in names], dtype=np.int64)[codes]
+            self._add(self.location_sums, self.location_counts, slots * HOURS_PER_WEEK + cells, volume, sign)
+            typed = types >= 0
+            self._add(self.type_sums, self.type_counts, types[typed] * HOURS_PER_WEEK + cells[typed], volume[typed],
+                      sign)
+
+            # Rebuild the compact mean tables read at prediction time
+            self.location_means = self._means(self.location_sums, self.location_counts)
+            self.type_means = self._means(self.type_sums, self.type_counts)
+            self.rows_applied += sign * len(frame)
+            self.updated_at = datetime.now()
+            self.last_update_ms = round((self.updated_at - started).total_seconds() * 1000, 2)
+
+    def rebuild(self, frame: pd.DataFrame) -> None:
+        """Replace every average with ones computed from frame"""
+        rebuilt = FeatureStore.from_history(frame)
+        with self._lock:
+            self.__dict__.update(rebuilt.__getstate__())
+
+    def encode(self, columns: Dict[str, np.ndarray], exclude: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """
+        Encode prediction columns into model input columns
+
+        Args:
+            columns: Equal-length arrays for hour, day_of_week, temperature,
+                weather_condition, special_events and location_type, plus
+                optional location names and timestamps; without them the
+                historical average falls back to the location type's and
+                no row is a holiday
+            exclude: Optional readings, one per row, to leave out of each
+                row's historical average, for rows already folded into the
+                store such as training observations
+
+        Returns:
+            Columns hour, day_of_week, temperature, weather_code,
+            special_events, location_type_code, holiday and historical_avg
+        """
+        hour = np.asarray(columns['hour'], dtype=np.int64)
+        day_of_week = np.asarray(columns['day_of_week'], dtype=np.int64)
+        location_types = encode_categories(columns['location_type'], LOCATION_TYPES)
+        timestamps = columns.get('timestamp')
+        return {
+            'hour': hour,
+            'day_of_week': day_of_week,
+            'temperature': np.asarray(columns['temperature'], dtype=np.float64),
+            'weather_code': encode_categories(columns['weather_condition'], WEATHER_CATEGORIES),
+            'special_events': np.asarray(columns['special_events'], dtype=bool),
+            'location_type_code': location_types,
+            'holiday': holidays(timestamps) if timestamps is not None else np.zeros(len(hour), dtype=np.int8),
+            'historical_avg': self.historical_averages(
+                location_types, hour_of_week(hour, day_of_week), columns.get('location'), exclude)
+        }
+
+    def historical_averages(self, location_types: np.ndarray, cells: np.ndarray,
+                            locations: Optional[np.ndarray] = None, exclude: np.ndarray = None) -> np.ndarray:
+        """Historical average volume per row, from its location's cell or else its location type's"""
+        cells = np.asarray(cells, dtype=np.int64)
+        known_type = location_types >= 0
+        with self._lock:
+            if locations is not None:
+                codes, names = pd.factorize(np.asarray(locations).reshape(-1))
+                slots = np.array([self.slots.get(str(name), -1) for name in names] + [-1], dtype=np.int64)[codes]
+            else:
+                slots = np.full(len(cells), -1, dtype=np.int64)
+            known_location = slots >= 0
+
+            if exclude is None:
+                by_type = self.type_means[location_types, cells]
+                by_location = self.location_means[slots, cells]
+            else:
+                by_type = self._mean_without(self.type_sums, self.type_counts, location_types, cells, exclude)
+                by_location = self._mean_without(self.location_sums, self.location_counts, slots, cells, exclude)
+
+        # Index -1 reads the last row of a table, so unknown keys are masked afterwards
+        by_type = np.where(known_type, by_type, np.nan)
+        by_location = np.where(known_location, by_location, np.nan)
+        return np.where(np.isnan(by_location), by_type, by_location).astype(np.float64)
+
+    def snapshot(self) -> 'FeatureStore':
+        """Independent copy of the store, e.g. to send to a worker process"""
+        with self._lock:
+            return copy.deepcopy(self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return update counters and the size of the tables"""
+        with self._lock:
+            tables = [self.location_means, self.type_means, self.location_sums, self.location_counts,
+                      self.type_sums, self.type_counts]
+            return {
+                'rows_applied': self.rows_applied,
+                'locations': len(self.slots),
+                'location_cells_with_data': int((self.location_counts > 0).sum()),
+                'memory_bytes': int(sum(table.nbytes for table in tables)),
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+                'last_update_ms': self.last_update_ms
+            }
+
+    def _slot(self, name: str) -> int:
+        """Row of a location in the location tables, growing them for new locations"""
+        index = self.slots.setdefault(name, len(self.slots))
+        if index >= self.location_sums.shape[0]:
+            self.location_sums = np.vstack([self.location_sums, np.zeros_like(self.location_sums)])
+            self.location_counts = np.vstack([self.location_counts, np.zeros_like(self.location_counts)])
+        return index
+
+    @staticmethod
+    def _add(sums: np.ndarray, counts: np.ndarray, cells: np.ndarray, values: np.ndarray, sign: int = 1) -> None:
+        """Add values and a count of sign to each flat cell of the sum and count tables"""
+        sums += np.bincount(cells, weights=values, minlength=sums.size).reshape(sums.shape)
+        counts += sign * np.bincount(cells, minlength=counts.size).reshape(counts.shape)
+        if sign < 0:
+            # Observations written by another process were never added here; never go below zero
+            np.maximum(counts, 0, out=counts)
+            sums[counts == 0] = 0
+
+    @staticmethod
+    def _means(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Compact float32 mean table, NaN where a cell has no readings"""
+        means = np.full(sums.shape, np.nan)
+        np.divide(sums, counts, out=means, where=counts > 0)
+        return means.astype(np.float32)
+
+    @staticmethod
+    def _mean_without(sums: np.ndarray, counts: np.ndarray, rows: np.ndarray, cells: np.ndarray,
+                      exclude: np.ndarray) -> np.ndarray:
+        """Cell means with one reading per row taken back out"""
+        remaining = counts[rows, cells] - 1
+        means = np.full(len(cells), np.nan)
+        np.divide(sums[rows, cells] - np.asarray(exclude, dtype=np.float64), remaining, out=means, where=remaining > 0)
+        return means
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {key: value for key, value in self.__dict__.items() if key != '_lock'}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'FeatureStore':
+        clone = object.__new__(FeatureStore)
+        clone.__setstate__(copy.deepcopy(self.__getstate__(), memo))
+        return clone
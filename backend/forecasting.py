@@ -0,0 +1,141 @@
+"""
+TrafficTelligence Bulk Forecasting
+Multi-location, multi-horizon forecasts streamed as NDJSON
+
+A bulk request covers every (location, hour) pair of a horizon. The pairs are
+cut into chunks of whole locations; each chunk is predicted in one vectorized
+pass and serialized to NDJSON text. Large requests spread the chunks over a
+process pool, so both inference and serialization run in parallel, while a
+bounded number of chunks in flight keeps memory flat however many rows the
+request covers.
+"""
+
+import json
+from collections import deque
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import training
+from features import FeatureStore
+from online import OnlineCorrections
+from prediction import PredictionCache, TrafficPredictor
+
+# Upper bound on the rows predicted and serialized as one unit of work
+CHUNK_ROWS = 20000
+
+# Longest horizon a bulk request may cover
+MAX_HORIZON_HOURS = 14 * 24
+
+# Predictor of a pool worker process, reloaded when the requested artifact changes
+_worker_predictor: Optional[TrafficPredictor] = None
+
+
+def forecast_chunk(predictor: TrafficPredictor, locations: List[str], start: datetime, hours: int,
+                   weather: Dict[str, Any], special_events: bool, quantiles: Tuple[float, ...] = None) -> str:
+    """
+    Predict every hour of the horizon for a group of locations
+
+    With quantiles, each line also carries a quantiles object keyed by level.
+
+    Returns:
+        NDJSON text with one line per (location, hour), location-major
+    """
+    times = pd.Timestamp(start) + pd.to_timedelta(np.arange(hours), unit='h')
+    batch = predictor.predict_batch({
+        'hour': np.tile(times.hour.to_numpy(), len(locations)),
+        'day_of_week': np.tile(times.dayofweek.to_numpy(), len(locations)),
+        'temperature': weather.get('temperature', 20),
+        'weather_condition': weather.get('condition', 'clear'),
+        'special_events': special_events,
+        'location_type': np.repeat([training.location_type(name) for name in locations], hours),
+        'location': np.repeat(locations, hours),
+        'timestamp': np.tile(times.to_numpy(), len(locations))
+    }, quantiles=quantiles, use_cache=False)
+
+    volumes = batch['predicted_volume'].tolist()
+    confidences = batch['confidence'].tolist()
+    prefixes = [f'{{"location":{json.dumps(name)},"timestamp":"' for name in locations]
+    stamps = [timestamp.isoformat() for timestamp in times]
+    if quantiles is None:
+        suffixes = ['}\n'] * len(volumes)
+    else:
+        names = [f'"{level:g}":' for level in quantiles]
+        suffixes = [
+            ',"quantiles":{' + ','.join(name + str(value) for name, value in zip(names, row)) + '}}\n'
+            for row in batch['quantiles'].astype(np.int64).tolist()
+        ]
+    return ''.join(
+        f'{prefixes[i // hours]}{stamps[i % hours]}","predicted_volume":{volume},"confidence":{confidence}{suffix}'
+        for i, (volume, confidence, suffix) in enumerate(zip(volumes, confidences, suffixes))
+    )
+
+
+def forecast_chunk_in_worker(artifact_path: Optional[str], online: Optional[OnlineCorrections],
+                             feature_store: FeatureStore, locations: List[str], start: datetime, hours: int,
+                             weather: Dict[str, Any], special_events: bool, quantiles: Tuple[float, ...] = None) -> str:
+    """
+    Process pool entry point for forecast_chunk, using this process's own predictor for artifact_path
+
+    online and feature_store are the request's snapshots of the parent's
+    online corrections and feature store.
+    """
+    global _worker_predictor
+    if _worker_predictor is None or _worker_predictor.artifact_path != artifact_path:
+        predictor = TrafficPredictor(cache=PredictionCache())
+        if artifact_path is not None:
+            predictor.load(artifact_path)
+        _worker_predictor = predictor
+    _worker_predictor.online = online
+    _worker_predictor.feature_store = feature_store
+    return forecast_chunk(_worker_predictor, locations, start, hours, weather, special_events, quantiles)
+
+
+def iter_forecast(predictor: TrafficPredictor, locations: List[str], start: datetime, hours: int,
+                  weather: Dict[str, Any] = None, special_events: bool = False,
+                  executor: Executor = None, max_in_flight: int = 4,
+                  quantiles: Tuple[float, ...] = None) -> Iterator[str]:
+    """
+    Yield NDJSON chunks for a bulk forecast, in location order
+
+    Args:
+        predictor: Predictor used in-process, and whose artifact pool workers load
+        locations: Locations to forecast
+        start: Timestamp of the first forecast hour
+        hours: Number of hourly forecasts per location
+        weather: Optional forecast with 'temperature' and 'condition'
+        special_events: Whether special events are expected
+        executor: Process pool to spread chunks over; chunks are computed
+            in-process when omitted
+        max_in_flight: Chunks submitted to the pool ahead of the one being sent
+        quantiles: Optional quantile levels to add to every line
+    """
+    weather = weather or {}
+    step = max(1, CHUNK_ROWS // hours)
+    groups = (locations[i:i + step] for i in range(0, len(locations), step))
+
+    if executor is None:
+        for group in groups:
+            yield forecast_chunk(predictor, group, start, hours, weather, special_events, quantiles)
+        return
+
+    # Same artifact, corrections and features for every chunk, even if a retrain swaps the model mid-request
+    artifact_path = predictor.artifact_path if predictor.model_trained else None
+    online = predictor.online.snapshot() if predictor.online is not None else None
+    feature_store = predictor.feature_store.snapshot()
+    pending = deque()
+    try:
+        for group in groups:
+            pending.append(executor.submit(forecast_chunk_in_worker, artifact_path, online, feature_store, group,
+                                           start, hours, weather, special_events, quantiles))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The client went away or a chunk failed: drop the work not yet started
+        for future in pending:
+            future.cancel()
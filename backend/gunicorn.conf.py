@@ -0,0 +1,128 @@
+"""
+TrafficTelligence Production Server
+gunicorn configuration: preloaded shared state, worker class and model reloads
+
+The app is imported once in the master, which seeds the store and loads the
+model before forking, so workers start in milliseconds and share those pages
+copy-on-write. The master watches the model pointer file and, when a new
+artifact lands, loads it and replaces the workers gracefully (the same as
+sending it SIGHUP). Aggregates, historical averages and online corrections
+are per process, so each worker rebuilds them from the store before serving;
+that picks up readings ingested by the workers it replaces. Each worker logs
+its spawn time and memory when it starts.
+
+Run from the backend directory with:
+
+    gunicorn
+
+Settings are read from GUNICORN_* environment variables, see the README.
+"""
+
+import gc
+import os
+import signal
+import threading
+import time
+from typing import Dict, Optional
+
+_config_loaded = time.monotonic()
+
+wsgi_app = 'app:app'
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Build models and reference tables once in the master instead of once per worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# gthread serves the I/O-bound endpoints (streams, ingestion, database reads) from a
+# thread pool per worker; gevent suits many long-lived live feed connections
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', (os.cpu_count() or 1) + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Each live feed client holds a thread (or connection) for as long as it is connected; cap them per
+# worker so half stay free for other requests. Beyond the cap /api/stream answers 503
+os.environ.setdefault('STREAM_MAX_SUBSCRIBERS',
+                      str(max(1, (worker_connections if worker_class == 'gevent' else threads) // 2)))
+
+# Live feed clients hold a connection open; they reconnect on their own after a restart
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Seconds between checks for a new model artifact; 0 disables reloads
+MODEL_POLL_SECONDS = float(os.environ.get('MODEL_POLL_SECONDS', 5))
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so its locks and sockets are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def when_ready(server):
+    """Warm up the preloaded app and start watching for new model artifacts"""
+    if server.cfg.preload_app:
+        import app as backend
+        import training
+        backend.warm_up()
+        server.log.info(f"App preloaded in {time.monotonic() - _config_loaded:.2f} s, "
+                        f"master memory MB {_memory_mb(os.getpid())}")
+        if MODEL_POLL_SECONDS > 0:
+            pointer = os.path.join(backend.MODEL_DIR, training.LATEST_POINTER)
+            threading.Thread(target=_watch_model, args=(pointer,), name='model-watcher', daemon=True).start()
+
+
+def on_reload(server):
+    """Load a new model into the master before the replacement workers are forked"""
+    if server.cfg.preload_app:
+        import app as backend
+        if backend.reload_model():
+            server.log.info(f"Reloading workers with model {backend.predictor.model_version}")
+
+
+def pre_fork(server, worker):
+    """Start the spawn clock and make the master's state safe and cheap to share"""
+    worker.spawn_started = time.monotonic()
+    if server.cfg.preload_app:
+        import app as backend
+        backend.prepare_fork()
+        # Objects that exist now are never collected, so the collector does not
+        # touch (and copy) their pages in every worker
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    """Catch up with readings stored since the master built its state, and report the spawn time"""
+    import app as backend
+    if worker.cfg.preload_app:
+        backend.rebuild_derived_state()
+    backend.record_worker_start(time.monotonic() - worker.spawn_started)
+
+
+def _watch_model(pointer: str) -> None:
+    """
+    Signal the master to reload when the model pointer file changes
+
+    Runs in a master thread, so it only stats the file and sends SIGHUP;
+    the master's own loop does the reload.
+    """
+    last_seen = _modified(pointer)
+    while True:
+        time.sleep(MODEL_POLL_SECONDS)
+        modified = _modified(pointer)
+        if modified != last_seen:
+            last_seen = modified
+            os.kill(os.getpid(), signal.SIGHUP)
+
+
+def _modified(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _memory_mb(pid: int) -> Dict[str, float]:
+    import metrics
+    return {name: round(value / (1024 * 1024), 1) for name, value in metrics.process_memory(pid).items()}
@@ -0,0 +1,315 @@
+"""
+TrafficTelligence Ingestion
+Bulk ingestion of live sensor readings
+
+Batches of readings arrive as NDJSON or CSV, are parsed and validated with
+column-wise checks, and are queued in an IngestionBuffer. The buffer writes
+micro-batches into the TrafficStore and hands every written batch to its
+subscribers, which keep derived state such as aggregates and alerts up to date.
+"""
+
+import io
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from storage import TrafficStore
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['timestamp', 'location', 'vehicle_count', 'average_speed']
+
+CONGESTION_LEVELS = ['low', 'medium', 'high', 'critical']
+
+# Readings stamped further ahead than this are rejected as clock errors
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Invalid rows described individually in a response; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_batch(body: bytes, fmt: str) -> pd.DataFrame:
+    """
+    Parse a request body of readings into a DataFrame
+
+    Args:
+        body: Raw request body
+        fmt: 'ndjson' (one JSON object per line) or 'csv' (with a header row)
+
+    Returns:
+        DataFrame with one row per reading, columns as sent
+    """
+    if not body.strip():
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    if fmt == 'csv':
+        return pd.read_csv(io.BytesIO(body), skipinitialspace=True)
+    if fmt == 'ndjson':
+        return pd.read_json(io.BytesIO(body), lines=True, convert_dates=False, dtype=False)
+    raise ValueError(f"Unsupported ingestion format '{fmt}', expected 'ndjson' or 'csv'")
+
+
+def validate_batch(raw: pd.DataFrame, now: datetime = None):
+    """
+    Validate and normalize a batch of readings with vectorized checks
+
+    Optional fields are filled in: congestion_level is derived from speed,
+    weather_condition defaults to 'unknown', road_type follows the location name
+    and event_nearby defaults to False. Duplicate (location, timestamp) pairs
+    keep the last reading.
+
+    Returns:
+        Tuple of (valid readings in TrafficStore.COLUMNS layout, number of
+        rejected rows, list of error descriptions for the first rejected rows)
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in raw.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    now = now or datetime.now()
+    n_rows = len(raw)
+    timestamps = _parse_timestamps(raw['timestamp'])
+    locations = raw['location'].astype('string').str.strip()
+    counts = pd.to_numeric(raw['vehicle_count'], errors='coerce')
+    speeds = pd.to_numeric(raw['average_speed'], errors='coerce')
+
+    checks = {
+        'invalid timestamp': timestamps.isna().to_numpy(),
+        'timestamp in the future': (timestamps > now + MAX_CLOCK_SKEW).fillna(False).to_numpy(),
+        'missing location': (locations.isna() | (locations == '')).fillna(True).to_numpy(dtype=bool),
+        'vehicle_count must be a non-negative number': ~(counts >= 0).fillna(False).to_numpy(dtype=bool),
+        'average_speed must be between 0 and 250': ~speeds.between(0, 250).fillna(False).to_numpy(dtype=bool)
+    }
+
+    congestion = _optional(raw, 'congestion_level', n_rows).astype('string').str.lower()
+    checks['unknown congestion_level'] = (congestion.notna() & ~congestion.isin(CONGESTION_LEVELS)).to_numpy(dtype=bool)
+
+    invalid = np.zeros(n_rows, dtype=bool)
+    for failed in checks.values():
+        invalid |= failed
+
+    errors = [
+        {'row': int(row), 'errors': [reason for reason, failed in checks.items() if failed[row]]}
+        for row in np.flatnonzero(invalid)[:MAX_REPORTED_ERRORS]
+    ]
+
+    valid = ~invalid
+    speeds = speeds[valid].to_numpy(dtype=np.float64)
+    derived_congestion = np.select([speeds < 20, speeds < 35, speeds < 55], ['critical', 'high', 'medium'], default='low')
+    locations = locations[valid].astype(str)
+    weather = _optional(raw, 'weather_condition', n_rows)[valid].astype('string').str.lower().fillna('unknown')
+    road_type = _optional(raw, 'road_type', n_rows)[valid].astype('string')
+    events = _optional(raw, 'event_nearby', n_rows)[valid]
+
+    frame = pd.DataFrame({
+        'timestamp': timestamps[valid].to_numpy(),
+        'location': locations.to_numpy(),
+        'vehicle_count': np.round(counts[valid].to_numpy(dtype=np.float64)).astype(np.int64),
+        'average_speed': speeds,
+        'congestion_level': congestion[valid].fillna(pd.Series(derived_congestion, index=locations.index)).to_numpy(),
+        'weather_condition': weather.to_numpy(),
+        'temperature': pd.to_numeric(_optional(raw, 'temperature', n_rows)[valid], errors='coerce').to_numpy(),
+        'visibility': pd.to_numeric(_optional(raw, 'visibility', n_rows)[valid], errors='coerce').to_numpy(),
+        'road_type': road_type.fillna(pd.Series(
+            np.where(locations.str.contains('Highway', regex=False), 'Highway', 'Urban'), index=locations.index)).to_numpy(),
+        'event_nearby': events.map(_parse_flag).fillna(False).to_numpy(dtype=bool)
+    })
+    frame = frame.drop_duplicates(['location', 'timestamp'], keep='last').sort_values(['timestamp', 'location'])
+
+    return frame.reset_index(drop=True), int(invalid.sum()), errors
+
+
+def _optional(raw: pd.DataFrame, name: str, n_rows: int) -> pd.Series:
+    """Return an optional column, or an all-missing one when it was not sent"""
+    return raw[name] if name in raw.columns else pd.Series([None] * n_rows, index=raw.index, dtype=object)
+
+
+def _parse_flag(value: Any) -> Any:
+    """Interpret booleans sent as JSON booleans, numbers or strings"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'y', 't')
+    return bool(value)
+
+
+def _parse_timestamps(values: pd.Series) -> pd.Series:
+    """Parse ISO 8601 timestamps to naive local time; readings with an offset are converted"""
+    parsed = pd.to_datetime(values.astype('string'), errors='coerce', format='ISO8601', utc=True)
+    has_offset = values.astype('string').str.contains(r'(?:Z|[+-]\d{2}:?\d{2})$', regex=True).fillna(False)
+
+    local_zone = datetime.now().astimezone().tzinfo
+    converted = parsed.dt.tz_convert(local_zone).dt.tz_localize(None)
+    naive = parsed.dt.tz_localize(None)
+    return converted.where(has_offset.to_numpy(dtype=bool), naive).astype('datetime64[us]')
+
+
+class IngestionBuffer:
+    """
+    Micro-batching writer between the ingestion API and the TrafficStore
+
+    Validated frames are queued in memory. A batch is written once max_rows
+    readings are pending, or after at most max_delay seconds by a background
+    flusher thread, whichever comes first. Writing only persists the batch:
+    a background consumer thread then hands it to subscribers, in write
+    order, so derived-state updates never hold up the next write. Replaced-row
+    subscribers first receive the stored rows a batch overwrote, so state
+    summed from batches can take them back out. At most max_queued_batches
+    written batches wait for the consumer before writers block.
+    """
+
+    def __init__(self, store: TrafficStore, max_rows: int = 20000, max_delay: float = 0.5,
+                 max_queued_batches: int = 64):
+        self.store = store
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._written = queue.Queue(maxsize=max_queued_batches)
+        self._consumer_lock = threading.Lock()
+        self._consumer = None
+        self._subscribers: List[Callable[[pd.DataFrame], None]] = []
+        self._replaced_subscribers: List[Callable[[pd.DataFrame], None]] = []
+        self.rows_received = 0
+        self.rows_written = 0
+        self.rows_replaced = 0
+        self.batches_written = 0
+        self.last_flush_at = None
+
+    def subscribe(self, callback: Callable[[pd.DataFrame], None]) -> None:
+        """Register a callback invoked with each batch after it is written"""
+        self._subscribers.append(callback)
+
+    def subscribe_replaced(self, callback: Callable[[pd.DataFrame], None]) -> None:
+        """Register a callback invoked with the stored rows each batch replaced, before the batch's callbacks"""
+        self._replaced_subscribers.append(callback)
+
+    def submit(self, frame: pd.DataFrame) -> int:
+        """Queue validated readings; returns the number of rows now pending"""
+        if frame.empty:
+            return self._pending_rows
+
+        with self._lock:
+            self._pending.append(frame)
+            self._pending_rows += len(frame)
+            self.rows_received += len(frame)
+            pending = self._pending_rows
+            self._ensure_flusher()
+
+        if pending >= self.max_rows:
+            self.flush()
+        return self._pending_rows
+
+    def flush(self) -> int:
+        """Write all pending readings as one batch, queued for subscribers; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                frames, self._pending, self._pending_rows = self._pending, [], 0
+            if not frames:
+                return 0
+
+            batch = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            return self._write(batch)
+
+    def write(self, frame: pd.DataFrame) -> int:
+        """Write a batch right away, bypassing the pending readings, and queue it for subscribers"""
+        if frame.empty:
+            return 0
+        with self._flush_lock:
+            return self._write(frame)
+
+    def drain(self) -> None:
+        """Block until subscribers have received every batch written so far"""
+        if self._written.unfinished_tasks:
+            self._ensure_consumer()
+        self._written.join()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """
+        Hold off writes until the block exits, e.g. while state derived from the
+        store is rebuilt from it; on entry subscribers have seen every write
+        """
+        with self._flush_lock:
+            self.drain()
+            yield
+
+    def _write(self, batch: pd.DataFrame) -> int:
+        """Write a batch and queue it for subscribers; the caller holds the flush lock"""
+        # Frames queued separately may repeat a reading; the store keeps the last, and so must subscribers
+        batch = batch.drop_duplicates(['location', 'timestamp'], keep='last')
+        replaced = self.store.upsert(batch)
+        self.rows_written += len(batch)
+        self.rows_replaced += len(replaced)
+        self.batches_written += 1
+        self.last_flush_at = datetime.now()
+
+        self._ensure_consumer()
+        self._written.put((replaced, batch))
+        return len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return ingestion counters"""
+        return {
+            'rows_received': self.rows_received,
+            'rows_written': self.rows_written,
+            'rows_replaced': self.rows_replaced,
+            'batches_written': self.batches_written,
+            'pending_rows': self._pending_rows,
+            'batches_awaiting_subscribers': self._written.unfinished_tasks,
+            'max_batch_rows': self.max_rows,
+            'max_delay_seconds': self.max_delay,
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None
+        }
+
+    def _ensure_flusher(self) -> None:
+        """Start the background flusher thread in this process if it is not running"""
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run_flusher, name='ingestion-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        """Flush pending readings at most max_delay seconds after they arrive"""
+        while True:
+            time.sleep(self.max_delay)
+            if self._pending_rows:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error flushing ingested readings: {str(e)}")
+
+    def _ensure_consumer(self) -> None:
+        """Start the subscriber thread in this process if it is not running"""
+        with self._consumer_lock:
+            if self._consumer is None or not self._consumer.is_alive():
+                # A queue inherited across fork still lists the parent's thread as its waiter, and would
+                # wake that thread instead of the new one, so hand any batches over to a fresh queue
+                stale, self._written = self._written, queue.Queue(maxsize=self._written.maxsize)
+                while not stale.empty():
+                    self._written.put_nowait(stale.get_nowait())
+                self._consumer = threading.Thread(target=self._run_consumer, name='ingestion-subscribers', daemon=True)
+                self._consumer.start()
+
+    def _run_consumer(self) -> None:
+        """Hand written batches to subscribers, in write order"""
+        while True:
+            replaced, batch = self._written.get()
+            try:
+                callbacks = [(callback, replaced) for callback in self._replaced_subscribers if not replaced.empty]
+                for callback, frame in callbacks + [(callback, batch) for callback in self._subscribers]:
+                    try:
+                        callback(frame)
+                    except Exception as e:
+                        logger.error(f"Error in ingestion subscriber {getattr(callback, '__qualname__', callback)}: "
+                                     f"{str(e)}")
+            finally:
+                self._written.task_done()
@@ -0,0 +1,279 @@
+"""
+TrafficTelligence Metrics
+Request latency histograms, stage timers and an opt-in request profiler
+
+Metrics are kept in process memory and rendered in the Prometheus text
+exposition format. Recording a sample costs a bisect and a locked increment,
+so instrumentation stays cheap enough to leave on. The profiler is off unless
+configured, and then only profiles the requests it selects.
+"""
+
+import bisect
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Latency buckets in seconds, upper bounds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A collector returns samples as (metric name, type, help, [(labels, value)])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(zip(self.labels, key))} {_number(value)}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def time_iter(self, chunks: Iterable[Any], **labels: str) -> Iterator[Any]:
+        """Pass chunks through, observing the total time spent producing them"""
+        elapsed = 0.0
+        iterator = iter(chunks)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    return
+                elapsed += time.perf_counter() - started
+                yield chunk
+        finally:
+            self.observe(elapsed, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        lines = []
+        for key, values in series:
+            labels = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Owns the metrics of one process and renders them for scraping"""
+
+    def __init__(self, prefix: str = 'traffic'):
+        self.prefix = prefix
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[Sample]]] = []
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], List[Sample]]) -> None:
+        """Register a callable read at scrape time, for values that other components already count"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.type}"]
+            lines += metric.render()
+        for collect in self._collectors:
+            for name, metric_type, help, samples in collect():
+                name = f"{self.prefix}_{name}"
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {metric_type}"]
+                lines += [f"{name}{_labels(labels.items())} {_number(value)}" for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request profiler
+
+    Modes: 'off'; 'header', which profiles requests sent with an X-Profile
+    header; and 'sample', which also profiles a random sample_rate fraction
+    of requests. Sampled reports are kept only for requests slower than
+    slow_ms, in a bounded in-memory store. One request is profiled at a time.
+    """
+
+    MODES = ('off', 'header', 'sample')
+
+    def __init__(self, mode: str = 'off', sample_rate: float = 0.01, slow_ms: float = 500.0,
+                 engine: str = 'cprofile', keep: int = 50):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {', '.join(self.MODES)}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.engine = 'pyinstrument' if engine == 'pyinstrument' and pyinstrument is not None else 'cprofile'
+        self.keep = keep
+        self._reports: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._busy = threading.Lock()
+        self._sequence = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def start(self, requested: bool) -> Optional[Any]:
+        """Start profiling the current request if it is selected; returns a handle for finish"""
+        selected = requested or (self.mode == 'sample' and random.random() < self.sample_rate)
+        if not self.enabled or not selected or not self._busy.acquire(blocking=False):
+            return None
+        profiler = pyinstrument.Profiler() if self.engine == 'pyinstrument' else cProfile.Profile()
+        profiler.start() if self.engine == 'pyinstrument' else profiler.enable()
+        return profiler
+
+    def finish(self, profiler: Any, label: str, elapsed: float, always_keep: bool = False) -> Optional[str]:
+        """Stop a profiler from start; returns the report id when the request was slow enough to keep"""
+        try:
+            if self.engine == 'pyinstrument':
+                profiler.stop()
+            else:
+                profiler.disable()
+            if not always_keep and elapsed * 1000 < self.slow_ms:
+                return None
+
+            if self.engine == 'pyinstrument':
+                text = profiler.output_text(unicode=False, color=False)
+            else:
+                buffer = io.StringIO()
+                pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(40)
+                text = buffer.getvalue()
+        finally:
+            self._busy.release()
+
+        self._sequence += 1
+        report_id = f"{int(time.time())}-{self._sequence}"
+        self._reports[report_id] = {
+            'id': report_id,
+            'request': label,
+            'duration_ms': round(elapsed * 1000, 2),
+            'engine': self.engine,
+            'recorded_at': datetime.now().isoformat(),
+            'report': text
+        }
+        while len(self._reports) > self.keep:
+            self._reports.popitem(last=False)
+        return report_id
+
+    def reports(self) -> List[Dict[str, Any]]:
+        """Summaries of the kept reports, newest first"""
+        return [{key: value for key, value in report.items() if key != 'report'}
+                for report in reversed(list(self._reports.values()))]
+
+    def report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        return self._reports.get(report_id)
+
+
+def process_memory(pid: int = None) -> Dict[str, int]:
+    """
+    Resident memory of a process in bytes, read from /proc on Linux
+
+    rss counts pages shared copy-on-write with a preforking parent in full;
+    pss splits shared pages between the processes sharing them, and private
+    counts the pages only this process holds, which is what one more worker
+    costs. Returns an empty dict where /proc is unavailable.
+    """
+    fields = {'Rss:': 'rss', 'Pss:': 'pss', 'Private_Clean:': 'private', 'Private_Dirty:': 'private'}
+    memory: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid or 'self'}/smaps_rollup") as f:
+            for line in f:
+                name, value = line.split()[:2]
+                if name in fields:
+                    memory[fields[name]] = memory.get(fields[name], 0) + int(value) * 1024
+    except (OSError, ValueError):
+        return memory
+    if 'rss' in memory and 'private' in memory:
+        memory['shared'] = memory['rss'] - memory['private']
+    return memory
+
+
+def _labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    """Render a label set, escaping values"""
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    """Render a sample value"""
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
@@ -0,0 +1,290 @@
+"""
+TrafficTelligence Online Learning
+Incremental per-location, per-hour-of-week corrections to the traffic model
+
+The batch-trained model knows location types, not individual locations, and
+only changes when it is retrained. Online corrections learn the residual
+between observed and predicted volume for every (location, hour of week) cell
+from each micro-batch of new readings, as an exponentially decayed mean, and
+add it to predictions straight away. An update costs one model evaluation
+over the new rows plus a scatter-add into the touched cells; nothing is
+recomputed for data already seen. Retraining stays the periodic fallback and
+starts the corrections afresh against the new model.
+"""
+
+import abc
+import copy
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import training
+from features import HOURS_PER_WEEK, LOCATION_TYPES, encode_categories, hour_of_week
+from uncertainty import RESIDUAL_EDGES, histogram_quantiles, relative_residuals
+
+logger = logging.getLogger(__name__)
+
+# Weights are rescaled once the newest reading is this many half-lives past the origin
+RESCALE_HALF_LIVES = 64
+
+# Readings learned before online residuals replace the trained model's interval table
+MIN_INTERVAL_READINGS = 200
+
+
+class DecayedWeights(abc.ABC):
+    """
+    Exponential decay by data time without touching old cells
+
+    Instead of decaying every cell as time passes, each reading is weighted
+    by 2 ** (age of the data in half-lives, from a fixed origin), so newer
+    readings count more and an update only touches the cells it adds to.
+    Subclasses keep weighted sums and scale them in _rescale.
+    """
+
+    def __init__(self, half_life_hours: float):
+        self.half_life_hours = half_life_hours
+        self.origin = None
+        self.newest = None
+
+    def reading_weights(self, hours: np.ndarray) -> np.ndarray:
+        """Weights of readings at data times hours (in hours since the epoch)"""
+        newest = float(hours.max())
+        if self.origin is None:
+            self.origin = float(hours.min())
+        if (newest - self.origin) / self.half_life_hours > RESCALE_HALF_LIVES:
+            self._rescale(np.exp2((self.origin - newest) / self.half_life_hours))
+            self.origin = newest
+        self.newest = newest if self.newest is None else max(self.newest, newest)
+        return np.exp2((hours - self.origin) / self.half_life_hours)
+
+    def current_scale(self) -> float:
+        """Weight of a reading at the newest data time"""
+        return float(np.exp2((self.newest - self.origin) / self.half_life_hours))
+
+    @abc.abstractmethod
+    def _rescale(self, factor: float) -> None:
+        """Multiply every weighted sum by factor, as the origin moves to the newest data time"""
+
+
+class ResidualTable(DecayedWeights):
+    """
+    Exponentially decayed residual means per (key, hour of week)
+
+    Means are shrunk towards zero by prior_weight readings, so a cell seen a
+    few times corrects less than one seen often.
+    """
+
+    def __init__(self, half_life_hours: float, prior_weight: float):
+        super().__init__(half_life_hours)
+        self.prior_weight = prior_weight
+        self.slots: Dict[str, int] = {}
+        self.sums = np.zeros((8, HOURS_PER_WEEK))
+        self.weights = np.zeros((8, HOURS_PER_WEEK))
+
+    def update(self, keys: np.ndarray, hour_of_week: np.ndarray, hours: np.ndarray, residuals: np.ndarray) -> None:
+        """Fold residuals observed at data times hours (in hours since the epoch) into their cells"""
+        codes, names = pd.factorize(keys)
+        slots = np.array([self._slot(name) for name in names], dtype=np.int64)[codes]
+
+        weights = self.reading_weights(hours)
+        cells = slots * HOURS_PER_WEEK + hour_of_week
+        size = self.sums.size
+        self.sums += np.bincount(cells, weights=weights * residuals, minlength=size).reshape(self.sums.shape)
+        self.weights += np.bincount(cells, weights=weights, minlength=size).reshape(self.weights.shape)
+
+    def lookup(self, keys: np.ndarray, hour_of_week: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the shrunk mean residual of each row's cell, and whether the cell has any data"""
+        codes, names = pd.factorize(keys)
+        slots = np.array([self.slots.get(name, -1) for name in names] + [-1], dtype=np.int64)[codes]
+        known_key = slots >= 0
+        if self.newest is None or not known_key.any():
+            return np.zeros(len(slots)), np.zeros(len(slots), dtype=bool)
+
+        sums = np.where(known_key, self.sums[slots, hour_of_week], 0.0)
+        weights = np.where(known_key, self.weights[slots, hour_of_week], 0.0)
+        known = weights > 0
+
+        # Weight expressed in readings at the newest data time, for the shrinkage
+        effective = weights / self.current_scale()
+        means = np.divide(sums, weights, out=np.zeros_like(sums), where=known)
+        return means * effective / (effective + self.prior_weight), known
+
+    def _slot(self, name: str) -> int:
+        index = self.slots.setdefault(name, len(self.slots))
+        if index >= self.sums.shape[0]:
+            self.sums = np.vstack([self.sums, np.zeros_like(self.sums)])
+            self.weights = np.vstack([self.weights, np.zeros_like(self.weights)])
+        return index
+
+    def _rescale(self, factor: float) -> None:
+        self.sums *= factor
+        self.weights *= factor
+
+
+class ResidualHistogram(DecayedWeights):
+    """Exponentially decayed histogram of relative residuals per hour of day"""
+
+    def __init__(self, half_life_hours: float):
+        super().__init__(half_life_hours)
+        self.weights = np.zeros((24, len(RESIDUAL_EDGES) - 1))
+        self._table = None
+
+    def update(self, hour_of_day: np.ndarray, hours: np.ndarray, residuals: np.ndarray) -> None:
+        bins = np.clip(np.searchsorted(RESIDUAL_EDGES, residuals, side='right') - 1, 0, self.weights.shape[1] - 1)
+        cells = hour_of_day * self.weights.shape[1] + bins
+        self.weights += np.bincount(cells, weights=self.reading_weights(hours),
+                                    minlength=self.weights.size).reshape(self.weights.shape)
+        self._table = None
+
+    def quantiles(self) -> np.ndarray:
+        """Residual quantile table on the uncertainty grid, rebuilt after each update"""
+        if self._table is None:
+            self._table = histogram_quantiles(self.weights)
+        return self._table
+
+    def _rescale(self, factor: float) -> None:
+        self.weights *= factor
+
+
+class OnlineCorrections:
+    """
+    Residual corrections learned from streaming observations
+
+    Corrections are kept per location and per location type; a prediction
+    for a named location uses its own cell when it has data and falls back
+    to its type's. The residuals left after correction, measured on each
+    batch before it is learned, also feed a histogram per hour of day from
+    which prediction intervals are read.
+    """
+
+    def __init__(self, half_life_hours: float = 7 * 24, prior_weight: float = 4.0):
+        self.half_life_hours = half_life_hours
+        self.prior_weight = prior_weight
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget every correction, e.g. when a retrained model replaces the one they were learned against"""
+        with self._lock:
+            self.by_location = ResidualTable(self.half_life_hours, self.prior_weight)
+            self.by_type = ResidualTable(self.half_life_hours, self.prior_weight)
+            self.spread = ResidualHistogram(self.half_life_hours)
+            self.updates = 0
+            self.rows_applied = 0
+            self.spread_rows = 0
+            self.updated_at = None
+            self.last_update_ms = None
+
+    def update(self, frame: pd.DataFrame, base_prediction: Callable[[Dict[str, np.ndarray]], np.ndarray],
+               fitted_until: datetime = None) -> None:
+        """
+        Learn from a batch of observations
+
+        Args:
+            frame: Observations as written to the TrafficStore
+            base_prediction: Uncorrected, noise-free model prediction for
+                prediction columns, e.g. TrafficPredictor.base_prediction
+            fitted_until: Time up to which the model may have been fitted on
+                the readings; older readings are learned but left out of the
+                interval residuals, which would otherwise be in-sample errors
+        """
+        if frame.empty:
+            return
+
+        started = datetime.now()
+        columns = training.observation_columns(frame)
+        columns['location_type_code'] = encode_categories(columns['location_type'], LOCATION_TYPES)
+        locations = columns['location']
+        observed = frame['vehicle_count'].to_numpy(dtype=np.float64)
+        base = base_prediction(columns)
+
+        # Rows the model cannot predict would poison every correction they touch
+        finite = np.isfinite(base) & np.isfinite(observed)
+        if not finite.all():
+            logger.warning(f"Skipping {int((~finite).sum())} observations without a finite prediction")
+            frame = frame[finite]
+            columns = {name: values[finite] for name, values in columns.items()}
+            locations, observed, base = locations[finite], observed[finite], base[finite]
+            if frame.empty:
+                return
+        residuals = observed - base
+        cells = self.hour_of_week(columns)
+        hours = np.asarray(frame['timestamp'], dtype='datetime64[s]').astype(np.int64) / 3600.0
+
+        # Interval residuals are measured against the corrections as they were before this batch
+        corrected = base + self.corrections(columns, locations)
+        unseen = np.ones(len(frame), dtype=bool)
+        if fitted_until is not None:
+            unseen = np.asarray(pd.DatetimeIndex(frame['timestamp']) > pd.Timestamp(fitted_until))
+
+        with self._lock:
+            self.by_location.update(locations, cells, hours, residuals)
+            self.by_type.update(columns['location_type_code'], cells, hours, residuals)
+            if unseen.any():
+                self.spread.update(cells[unseen] % 24, hours[unseen],
+                                   relative_residuals(observed[unseen], corrected[unseen]))
+            self.updates += 1
+            self.rows_applied += len(frame)
+            self.spread_rows += int(unseen.sum())
+            self.updated_at = datetime.now()
+            self.last_update_ms = round((self.updated_at - started).total_seconds() * 1000, 2)
+
+    def corrections(self, columns: Dict[str, np.ndarray], locations: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Volume correction for each prediction row
+
+        Args:
+            columns: Columns with hour, day_of_week and location_type_code,
+                as encoded by FeatureStore.encode
+            locations: Optional location names
+        """
+        cells = self.hour_of_week(columns)
+        with self._lock:
+            by_type, _ = self.by_type.lookup(columns['location_type_code'], cells)
+            if locations is None:
+                return by_type
+            by_location, known = self.by_location.lookup(locations, cells)
+        return np.where(known, by_location, by_type)
+
+    def residual_quantiles(self) -> Optional[np.ndarray]:
+        """Residual quantile table for prediction intervals, or None before enough out-of-sample readings were learned"""
+        with self._lock:
+            return self.spread.quantiles() if self.spread_rows >= MIN_INTERVAL_READINGS else None
+
+    def snapshot(self) -> 'OnlineCorrections':
+        """Independent copy of the current corrections, e.g. to send to a worker process"""
+        with self._lock:
+            return copy.deepcopy(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'updates': self.updates,
+                'rows_applied': self.rows_applied,
+                'interval_rows': self.spread_rows,
+                'locations': len(self.by_location.slots),
+                'half_life_hours': self.half_life_hours,
+                'prior_weight': self.prior_weight,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+                'last_update_ms': self.last_update_ms
+            }
+
+    @staticmethod
+    def hour_of_week(columns: Dict[str, np.ndarray]) -> np.ndarray:
+        return hour_of_week(columns['hour'], columns['day_of_week']).astype(np.int64)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {key: value for key, value in self.__dict__.items() if key != '_lock'}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'OnlineCorrections':
+        clone = object.__new__(OnlineCorrections)
+        clone.__setstate__(copy.deepcopy(self.__getstate__(), memo))
+        return clone
@@ -0,0 +1,617 @@
+"""
+TrafficTelligence Prediction
+Traffic volume predictor and prediction cache
+
+TrafficPredictor serves predictions from the latest trained artifact, falling
+back to multiplier heuristics when none exists. It is kept apart from the
+Flask app so worker processes can import it without starting the app.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import training
+import uncertainty
+from features import LOCATION_TYPES, WEATHER_CATEGORIES, FeatureStore
+from online import MIN_INTERVAL_READINGS, OnlineCorrections
+
+logger = logging.getLogger(__name__)
+
+# SplitMix64 constants, for hashing cache keys and drawing their random variation
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: a well-spread 64-bit hash of each value"""
+    values = (values ^ (values >> np.uint64(30))) * _MIX_MULTIPLIERS[0]
+    values = (values ^ (values >> np.uint64(27))) * _MIX_MULTIPLIERS[1]
+    return values ^ (values >> np.uint64(31))
+
+def _hash_text(text: str) -> int:
+    """Stable 64-bit hash of a string, unlike hash() which is salted per process"""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+def _category_table(multipliers: Dict[str, float], categories: List[str], default: float) -> np.ndarray:
+    """Multiplier per category code, with the default last so that code -1 (unknown) reads it"""
+    return np.array([multipliers.get(name, default) for name in categories] + [default])
+
+class PredictionCache:
+    """
+    Bounded LRU cache with per-entry TTL for prediction results
+    
+    Entries are keyed on a hash of the model version and a quantized feature
+    tuple, so a retrained model never reads results computed by an older one.
+    """
+    
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get_many(self, keys: List[Any]) -> List[Any]:
+        """Look up keys, returning None for each missing or expired entry"""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[1])
+        return results
+    
+    def put_many(self, items) -> None:
+        """Store (key, value) pairs, evicting the least recently used entries beyond max_size"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class TrafficPredictor:
+    """
+    Machine Learning model for traffic volume prediction
+    
+    This class implements a simplified ML model for demonstration purposes.
+    In a production environment, this would be replaced with more sophisticated
+    models like Random Forest, Neural Networks, or ensemble methods.
+    """
+    
+    # Weather impact
+    WEATHER_MULTIPLIERS = {
+        'clear': 1.0,
+        'cloudy': 0.95,
+        'rainy': 0.75,
+        'snowy': 0.5,
+        'foggy': 0.65
+    }
+    
+    # Location type impact
+    LOCATION_MULTIPLIERS = {
+        'highway': 1.5,
+        'urban': 1.2,
+        'suburban': 1.0,
+        'rural': 0.7
+    }
+    
+    # The multipliers as arrays indexed by the feature store's codes
+    HOUR_MULTIPLIERS = np.array([1.8 if 7 <= hour <= 9 or 17 <= hour <= 19 else 1.2 if 10 <= hour <= 16 else
+                                 1.1 if 20 <= hour <= 22 else 0.6 for hour in range(24)])
+    DAY_MULTIPLIERS = np.array([1.3, 1.3, 1.3, 1.3, 1.3, 1.5, 0.8])
+    WEATHER_TABLE = _category_table(WEATHER_MULTIPLIERS, WEATHER_CATEGORIES, 1.0)
+    LOCATION_TABLE = _category_table(LOCATION_MULTIPLIERS, LOCATION_TYPES, 1.0)
+    RELIABLE_WEATHER_CODES = [WEATHER_CATEGORIES.index('clear'), WEATHER_CATEGORIES.index('cloudy')]
+    
+    # Uniform draws consumed per row: two for the Box-Muller noise sample and
+    # four for the feature importance jitter. Drawing a fixed block per row
+    # keeps a batch bit-for-bit identical to the same rows predicted one by one.
+    RANDOM_DRAWS_PER_ROW = 6
+    
+    FACTOR_NAMES = ['hour_impact', 'day_impact', 'weather_impact', 'temperature_impact', 'event_impact', 'location_impact']
+    IMPORTANCE_NAMES = ['historical_patterns', 'weather_conditions', 'time_factors', 'special_events']
+    
+    # Temperature bucket width (degrees) and historical average step (vehicles) used when
+    # predictions are served through the cache
+    TEMPERATURE_STEP = 1.0
+    HISTORICAL_AVG_STEP = 1.0
+    
+    # Batches with more distinct keys than this, such as bulk forecasts, skip the cache
+    CACHE_MAX_KEYS = 256
+    
+    def __init__(self, model_dir: str = None, cache: 'PredictionCache' = None, online: OnlineCorrections = None,
+                 feature_store: FeatureStore = None):
+        self.model_dir = model_dir
+        self.cache = cache
+        self.online = online
+        self.feature_store = feature_store if feature_store is not None else FeatureStore()
+        self._artifact = None
+        self._artifact_checked = False
+        self.artifact_path = None
+        self.inference_calls = 0
+        self.rows_computed = 0
+        self._load_lock = threading.Lock()
+        self.feature_weights = {
+            'hour_of_day': 0.35,
+            'day_of_week': 0.18,
+            'weather_temp': 0.15,
+            'weather_condition': 0.12,
+            'special_events': 0.10,
+            'historical_avg': 0.10
+        }
+    
+    @property
+    def artifact(self) -> Dict[str, Any]:
+        """Trained model artifact, loaded lazily from model_dir on first use"""
+        if not self._artifact_checked:
+            with self._load_lock:
+                if not self._artifact_checked:
+                    path = training.latest_artifact_path(self.model_dir) if self.model_dir else None
+                    if path:
+                        self._artifact = training.load_artifact(path)
+                        self.artifact_path = path
+                        logger.info(f"Loaded traffic model {self._artifact['version']} from {path}")
+                    self._artifact_checked = True
+        return self._artifact
+    
+    @property
+    def model_version(self) -> str:
+        """Version of the loaded artifact, or 'heuristic' when predicting from the multipliers"""
+        artifact = self.artifact
+        return artifact['version'] if artifact is not None else 'heuristic'
+    
+    @property
+    def model_trained(self) -> bool:
+        """Whether predictions come from a trained model rather than the multipliers"""
+        return self.artifact is not None
+    
+    @property
+    def fitted_until(self) -> Optional[datetime]:
+        """When the loaded artifact was trained, bounding the readings it may have been fitted on; None for the multipliers"""
+        artifact = self.artifact
+        return datetime.fromisoformat(artifact['trained_at']) if artifact is not None else None
+    
+    def load(self, path: str = None) -> Dict[str, Any]:
+        """
+        Load a model artifact, replacing the current one
+        
+        Args:
+            path: Artifact to load; defaults to the latest one in model_dir
+            
+        Returns:
+            Metadata of the loaded artifact
+        """
+        path = path or training.latest_artifact_path(self.model_dir)
+        if path is None:
+            raise FileNotFoundError(f"No model artifact found in {self.model_dir}")
+            
+        artifact = training.load_artifact(path)
+        with self._load_lock:
+            self._artifact = artifact
+            self.artifact_path = path
+            self._artifact_checked = True
+        logger.info(f"Loaded traffic model {artifact['version']} from {path}")
+        return training.artifact_metadata(artifact)
+    
+    def model_info(self) -> Dict[str, Any]:
+        """Describe the model currently used for predictions"""
+        artifact = self.artifact
+        if artifact is None:
+            return {
+                'type': 'heuristic',
+                'version': None,
+                'accuracy': None,
+                'last_trained': None,
+                'features_used': list(self.feature_weights.keys())
+            }
+            
+        return {
+            'type': artifact['model_type'],
+            'version': artifact['version'],
+            'accuracy': artifact['metrics']['accuracy'],
+            'metrics': artifact['metrics'],
+            'last_trained': artifact['trained_at'],
+            'features_used': artifact['feature_columns']
+        }
+        
+    def predict_volume(self, features: Dict[str, Any], rng: np.random.Generator = None) -> Dict[str, Any]:
+        """
+        Predict traffic volume based on input features
+        
+        Args:
+            features: Dictionary containing prediction features
+            rng: Optional random generator, as for predict_batch
+            
+        Returns:
+            Dictionary with prediction results and confidence
+        """
+        try:
+            now = datetime.now()
+            columns = {
+                'hour': [features.get('hour', now.hour)],
+                'day_of_week': [features.get('day_of_week', now.weekday())],
+                'temperature': [features.get('temperature', 20)],
+                'weather_condition': [features.get('weather_condition', 'clear')],
+                'special_events': [features.get('special_events', False)],
+                'location_type': [features.get('location_type', 'urban')]
+            }
+            return self.batch_to_records(self.predict_batch(columns, rng=rng))[0]
+            
+        except Exception as e:
+            logger.error(f"Error in prediction: {str(e)}")
+            return {
+                'predicted_volume': 200,
+                'confidence': 0.5,
+                'error': str(e)
+            }
+    
+    def predict_batch(self, features: Any, rng: np.random.Generator = None,
+                      quantiles: Sequence[float] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Predict traffic volume for many rows at once
+        
+        Every multiplier, confidence and factor is computed with array
+        operations over the whole batch. With the same seed the results are
+        identical to calling predict_volume once per row in order.
+        
+        Without an explicit rng, predictions go through the cache when one is
+        configured: features are quantized, each distinct key is computed at
+        most once, and its random variation is derived from the key itself.
+        Batches with many distinct keys skip the cache lookups, which would
+        cost more than they save, and get the same results.
+        
+        Online corrections, when configured, are added after the cache, so
+        they apply as soon as they are learned without invalidating it.
+        
+        Requested quantiles are read for every row at once from a residual
+        quantile table (see interval_table) around the noise-free, corrected
+        prediction; no sampling is involved. The median read the same way
+        replaces predicted_volume, so the point forecast carries no random
+        variation, takes the model's residual bias into account and lies
+        inside its own intervals.
+        
+        Args:
+            features: DataFrame or mapping of column name to array-like with the
+                columns hour, day_of_week, temperature, weather_condition,
+                special_events and location_type, plus optional location
+                names, for per-location historical averages and corrections,
+                and timestamps, for holiday flags. Scalars are broadcast and
+                missing columns fall back to the predict_volume defaults.
+            rng: Optional random generator; bypasses the cache when given. The
+                global NumPy state is used if omitted and no cache is configured.
+            quantiles: Optional quantile levels, between 0.01 and 0.99; raises
+                uncertainty.ResidualsUnavailable when no residuals were observed
+            use_cache: Whether to read and fill the cache; callers predicting
+                many rows once, such as bulk forecasts, pass False
+            
+        Returns:
+            Columnar dictionary of NumPy arrays with predicted_volume, confidence,
+            expected_volume (before random variation), factors and
+            feature_importance; with quantiles, also a (rows, levels) quantiles
+            array plus quantile_levels and interval_method
+        """
+        columns = self._prepare_columns(features)
+        locations = columns.pop('location', None)
+        if rng is None and self.cache is not None:
+            batch = self._predict_cached(columns, use_cache)
+        else:
+            draws = (rng.random if rng is not None else np.random.random)((len(columns['hour']), self.RANDOM_DRAWS_PER_ROW))
+            batch = self._compute_batch(columns, draws)
+            
+        online = self.online
+        if online is not None and len(batch['predicted_volume']):
+            correction = online.corrections(columns, locations)
+            batch['predicted_volume'] = np.maximum(50, batch['predicted_volume'] + np.rint(correction)).astype(np.int64)
+            batch['expected_volume'] = batch['expected_volume'] + correction
+            
+        if quantiles is not None:
+            levels = uncertainty.parse_levels(quantiles)
+            table, batch['interval_method'] = self.interval_table(levels + (0.5,))
+            expected = np.maximum(batch['expected_volume'], 0.0)
+            volumes = np.maximum(0.0, np.rint(expected[:, None] * (1.0 + table[columns['hour'] % 24])))
+            batch['quantiles'] = volumes[:, :-1]
+            batch['predicted_volume'] = volumes[:, -1].astype(np.int64)
+            batch['quantile_levels'] = levels
+        return batch
+    
+    def interval_table(self, levels: Sequence[float]) -> Tuple[np.ndarray, str]:
+        """
+        Relative residual quantiles per hour of day at levels, shape (24, levels)
+        
+        Residuals come from the online corrections once they have seen enough
+        readings, else from the trained model's validation set. Without either
+        there is nothing to calibrate on, and ResidualsUnavailable is raised
+        rather than guessing a spread.
+        
+        Returns:
+            Tuple of (table, method), method naming the residuals used
+        """
+        online = self.online
+        table = online.residual_quantiles() if online is not None else None
+        if table is not None:
+            return uncertainty.select_levels(table, levels), 'online_residuals'
+            
+        artifact = self.artifact
+        if artifact is not None and 'residual_quantiles' in artifact:
+            return uncertainty.select_levels(np.asarray(artifact['residual_quantiles']), levels), 'validation_residuals'
+            
+        raise uncertainty.ResidualsUnavailable(
+            'Prediction intervals need observed residuals: train a model or let online learning see '
+            f"{MIN_INTERVAL_READINGS} readings")
+    
+    def base_prediction(self, features: Any) -> np.ndarray:
+        """Predicted volume from the model alone: no random variation, cache or online corrections"""
+        columns = self._prepare_columns(features)
+        columns.pop('location', None)
+        return self._base_volume(columns, self._multipliers(columns)).astype(np.float64)
+    
+    def _multipliers(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Heuristic multiplier of each factor, per row"""
+        temperature = columns['temperature']
+        
+        # Hour of day impact (rush hours have higher traffic)
+        hour_multiplier = self.HOUR_MULTIPLIERS[columns['hour'] % 24]
+        
+        # Day of week impact (weekdays, Friday, weekend); holidays count as Sundays
+        day_multiplier = np.where(columns['holiday'] > 0, self.DAY_MULTIPLIERS[6],
+                                  self.DAY_MULTIPLIERS[columns['day_of_week'] % 7])
+        
+        weather_multiplier = self.WEATHER_TABLE[columns['weather_code']]
+        
+        # Temperature impact (extreme temperatures reduce traffic)
+        temp_multiplier = np.select(
+            [(-10 <= temperature) & (temperature <= 30), temperature > 30],
+            [1.0, 0.9 - (temperature - 30) * 0.01],
+            default=0.9 - np.abs(temperature + 10) * 0.02
+        )
+        
+        # Special events impact
+        event_multiplier = np.where(columns['special_events'], 1.3, 1.0)
+        
+        location_multiplier = self.LOCATION_TABLE[columns['location_type_code']]
+        
+        return {
+            'hour_impact': hour_multiplier,
+            'day_impact': day_multiplier,
+            'weather_impact': weather_multiplier,
+            'temperature_impact': temp_multiplier,
+            'event_impact': event_multiplier,
+            'location_impact': location_multiplier
+        }
+    
+    def _base_volume(self, columns: Dict[str, np.ndarray], multipliers: Dict[str, np.ndarray]) -> np.ndarray:
+        """Predicted volume with the trained model, or the multipliers if none is available"""
+        n_rows = len(columns['hour'])
+        self.inference_calls += 1
+        self.rows_computed += n_rows
+        
+        artifact = self.artifact
+        if artifact is not None and n_rows:
+            features = training.encode_features(columns, artifact['feature_columns'])
+            return self._to_volume(artifact['model'].predict(features))
+            
+        # Base volume calculation (simplified model)
+        base_volume = 200
+        volume = (base_volume * multipliers['hour_impact'] * multipliers['day_impact'] *
+                  multipliers['weather_impact'] * multipliers['temperature_impact'] *
+                  multipliers['event_impact'] * multipliers['location_impact'])
+        
+        # Blend in the historical average where the feature store has one
+        historical = columns['historical_avg']
+        weight = self.feature_weights['historical_avg']
+        return self._to_volume(np.where(np.isnan(historical), volume, (1 - weight) * volume + weight * historical))
+    
+    @staticmethod
+    def _to_volume(volume: np.ndarray) -> np.ndarray:
+        """Cast predicted volumes to integers, with non-finite values (e.g. from a NaN input) as 0"""
+        return np.nan_to_num(volume, nan=0.0, posinf=0.0, neginf=0.0).astype(np.int64)
+    
+    def _compute_batch(self, columns: Dict[str, np.ndarray], draws: np.ndarray) -> Dict[str, Any]:
+        """Compute predictions for prepared columns, using one row of uniform draws per prediction"""
+        hour = columns['hour']
+        day_of_week = columns['day_of_week']
+        weather = columns['weather_code']
+        multipliers = self._multipliers(columns)
+        expected_volume = self._base_volume(columns, multipliers)
+        predicted_volume = expected_volume
+        
+        # Add some randomness to simulate real-world variation
+        noise = np.sqrt(-2.0 * np.log1p(-draws[:, 0])) * np.cos(2.0 * np.pi * draws[:, 1])
+        variation = noise * (predicted_volume * 0.1)
+        predicted_volume = np.maximum(50, (predicted_volume + variation).astype(np.int64))
+        
+        # Calculate confidence based on feature reliability
+        confidence = (np.where((6 <= hour) & (hour <= 22), 0.9, 0.7) +  # Time reliability
+                      np.where(day_of_week < 5, 0.85, 0.75) +  # Day reliability
+                      np.where(np.isin(weather, self.RELIABLE_WEATHER_CODES), 0.8, 0.6)) / 3  # Weather reliability
+        
+        # Feature importance for this prediction
+        jitter = draws[:, 2:]
+        feature_importance = {
+            'historical_patterns': self.feature_weights['historical_avg'] + (jitter[:, 0] * 0.10 - 0.05),
+            'weather_conditions': self.feature_weights['weather_condition'] + self.feature_weights['weather_temp'] + (jitter[:, 1] * 0.06 - 0.03),
+            'time_factors': self.feature_weights['hour_of_day'] + self.feature_weights['day_of_week'] + (jitter[:, 2] * 0.04 - 0.02),
+            'special_events': self.feature_weights['special_events'] + (jitter[:, 3] * 0.04 - 0.02)
+        }
+        
+        return {
+            'predicted_volume': predicted_volume,
+            'expected_volume': expected_volume.astype(np.float64),
+            'confidence': np.round(confidence, 3),
+            'feature_importance': feature_importance,
+            'factors': {name: np.round(values, 2) for name, values in multipliers.items()}
+        }
+    
+    def _predict_cached(self, columns: Dict[str, np.ndarray], use_cache: bool = True) -> Dict[str, Any]:
+        """Predict each distinct quantized key once, from the cache where it holds the key and use_cache is set"""
+        n_rows = len(columns['hour'])
+        if not n_rows:
+            return self._compute_batch(columns, np.empty((0, self.RANDOM_DRAWS_PER_ROW)))
+            
+        # Quantize, then collapse rows to distinct keys
+        columns = dict(
+            columns,
+            temperature=np.round(columns['temperature'] / self.TEMPERATURE_STEP) * self.TEMPERATURE_STEP,
+            historical_avg=np.round(columns['historical_avg'] / self.HISTORICAL_AVG_STEP) * self.HISTORICAL_AVG_STEP
+        )
+        codes, keys = pd.factorize(self._row_keys(self.model_version, columns))
+        first = np.empty(len(keys), dtype=np.int64)
+        first[codes[::-1]] = np.arange(n_rows - 1, -1, -1)
+        
+        if not use_cache or len(keys) > self.CACHE_MAX_KEYS:
+            # Looking up and storing this many keys costs more than computing them
+            rows = {name: values[first] for name, values in columns.items()}
+            return self._unpack(self._pack(self._compute_batch(rows, self._key_draws(keys)))[codes])
+            
+        cache_keys = keys.tolist()
+        packed = self.cache.get_many(cache_keys)
+        missing = [i for i, value in enumerate(packed) if value is None]
+        if missing:
+            rows = first[missing]
+            draws = self._key_draws(keys[missing])
+            computed = self._pack(self._compute_batch({name: values[rows] for name, values in columns.items()}, draws))
+            self.cache.put_many(zip((cache_keys[i] for i in missing), computed))
+            for i, values in zip(missing, computed):
+                packed[i] = values
+                
+        return self._unpack(np.stack(packed)[codes])
+    
+    @staticmethod
+    def _row_keys(version: str, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        64-bit cache key of each row: a hash of the model version and every
+        quantized, encoded feature, computed for all rows with array operations
+        """
+        n_rows = len(columns['hour'])
+        keys = np.full(n_rows, _hash_text(version), dtype=np.uint64)
+        for values in columns.values():
+            values = np.asarray(values)
+            if values.dtype.kind in 'OSU':
+                codes, names = pd.factorize(values)
+                bits = np.array([_hash_text(str(name)) for name in names], dtype=np.uint64)[codes]
+            else:
+                # Adding 0.0 turns -0.0 into 0.0, so both get the same key
+                bits = (values.astype(np.float64) + 0.0).view(np.uint64)
+            keys = _mix64(keys ^ bits)
+        return keys
+    
+    def _key_draws(self, keys: np.ndarray) -> np.ndarray:
+        """Uniform draws for each key, derived from the key itself so cached answers stay consistent"""
+        steps = np.arange(1, self.RANDOM_DRAWS_PER_ROW + 1, dtype=np.uint64) * _GOLDEN_GAMMA
+        bits = _mix64(np.asarray(keys, dtype=np.uint64)[:, None] + steps)
+        return (bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+    
+    def _pack(self, batch: Dict[str, Any]) -> np.ndarray:
+        """Flatten a columnar result into one float row per prediction"""
+        return np.column_stack(
+            [batch['predicted_volume'], batch['confidence'], batch['expected_volume']] +
+            [batch['factors'][name] for name in self.FACTOR_NAMES] +
+            [batch['feature_importance'][name] for name in self.IMPORTANCE_NAMES]
+        )
+    
+    def _unpack(self, matrix: np.ndarray) -> Dict[str, Any]:
+        """Inverse of _pack"""
+        offset = 3 + len(self.FACTOR_NAMES)
+        return {
+            'predicted_volume': matrix[:, 0].astype(np.int64),
+            'confidence': matrix[:, 1],
+            'expected_volume': matrix[:, 2],
+            'feature_importance': {name: matrix[:, offset + i] for i, name in enumerate(self.IMPORTANCE_NAMES)},
+            'factors': {name: matrix[:, 3 + i] for i, name in enumerate(self.FACTOR_NAMES)}
+        }
+    
+    @staticmethod
+    def batch_to_records(batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Convert a columnar predict_batch result into per-row dictionaries"""
+        volumes = batch['predicted_volume'].tolist()
+        confidences = batch['confidence'].tolist()
+        factors = {name: values.tolist() for name, values in batch['factors'].items()}
+        importance = {name: values.tolist() for name, values in batch['feature_importance'].items()}
+        
+        records = [
+            {
+                'predicted_volume': volumes[i],
+                'confidence': confidences[i],
+                'feature_importance': {name: values[i] for name, values in importance.items()},
+                'factors': {name: values[i] for name, values in factors.items()}
+            }
+            for i in range(len(volumes))
+        ]
+        if 'quantiles' in batch:
+            names = [f"{level:g}" for level in batch['quantile_levels']]
+            for record, row in zip(records, batch['quantiles'].astype(np.int64).tolist()):
+                record['quantiles'] = dict(zip(names, row))
+        return records
+    
+    def _prepare_columns(self, features: Any) -> Dict[str, np.ndarray]:
+        """Normalize batch input into equal-length NumPy columns, encoded by the feature store"""
+        if isinstance(features, pd.DataFrame):
+            features = {name: features[name].to_numpy() for name in features.columns}
+            
+        now = datetime.now()
+        defaults = {
+            'hour': now.hour,
+            'day_of_week': now.weekday(),
+            'temperature': 20,
+            'weather_condition': 'clear',
+            'special_events': False,
+            'location_type': 'urban'
+        }
+        raw = {name: np.asarray(features.get(name, default)) for name, default in defaults.items()}
+        for name in ('location', 'timestamp'):
+            if features.get(name) is not None:
+                raw[name] = np.asarray(features[name])
+            
+        lengths = {values.shape[0] for values in raw.values() if values.ndim > 0}
+        if len(lengths) > 1:
+            raise ValueError(f"Feature columns have mismatched lengths: {sorted(lengths)}")
+        n_rows = lengths.pop() if lengths else 1
+        
+        columns = {name: np.broadcast_to(values, (n_rows,)) for name, values in raw.items()}
+        prepared = self.feature_store.encode(columns)
+        if 'location' in columns:
+            prepared['location'] = columns['location'].astype(str)
+        return prepared
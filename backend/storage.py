@@ -0,0 +1,396 @@
+"""
+TrafficTelligence Storage Layer
+Persistent time-series storage for traffic observations
+
+Observations are kept in an append-only table keyed by (location, timestamp),
+so location and time-range queries are index range scans that only read the
+requested slice. Producers such as TrafficDataGenerator or live sensor feeds
+write into a TrafficStore; API endpoints read from it.
+"""
+
+import abc
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+# A (timestamp, location) row key, as used for keyset pagination
+Key = Tuple[datetime, str]
+
+
+class TrafficStore(abc.ABC):
+    """
+    Interface for traffic observation storage backends
+
+    Frames passed to append and returned by query use the columns in COLUMNS,
+    with timestamps as naive datetime64 values.
+    """
+
+    COLUMNS = ['timestamp', 'location', 'vehicle_count', 'average_speed', 'congestion_level',
+               'weather_condition', 'temperature', 'visibility', 'road_type', 'event_nearby']
+
+    CATEGORICAL_COLUMNS = ['location', 'congestion_level', 'weather_condition', 'road_type']
+
+    @abc.abstractmethod
+    def append(self, frame: pd.DataFrame) -> int:
+        """Append observations, replacing any with the same (location, timestamp); returns rows written"""
+
+    @abc.abstractmethod
+    def upsert(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Append observations like append, returning the stored rows they replaced in COLUMNS layout"""
+
+    # Columns of query_resampled results: per-bucket means, plus the number of readings averaged
+    RESAMPLED_COLUMNS = ['timestamp', 'location', 'vehicle_count', 'average_speed', 'temperature',
+                         'visibility', 'road_type', 'event_nearby', 'samples']
+
+    @abc.abstractmethod
+    def query(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+              limit: int = None, newest_first: bool = False, before: Key = None, after: Key = None) -> pd.DataFrame:
+        """
+        Read observations with start <= timestamp < end, ordered by (timestamp, location)
+
+        before and after are (timestamp, location) keys that exclusively bound
+        the rows read, for keyset pagination.
+        """
+
+    @abc.abstractmethod
+    def query_resampled(self, bucket: timedelta, start: datetime = None, end: datetime = None,
+                        locations: Iterable[str] = None, limit: int = None, newest_first: bool = False,
+                        before: Key = None, after: Key = None) -> pd.DataFrame:
+        """
+        Read per-location means over fixed-width time buckets, in RESAMPLED_COLUMNS layout
+
+        Buckets are keyed on (bucket start, location); limit, newest_first,
+        before and after work as in query, on those keys.
+        """
+
+    def iter_query(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+                   chunk_rows: int = 10000) -> Iterator[pd.DataFrame]:
+        """Read the same rows as query, oldest first, as frames of at most chunk_rows rows"""
+        frame = self.query(start, end, locations)
+        for offset in range(0, len(frame), chunk_rows):
+            yield frame.iloc[offset:offset + chunk_rows]
+
+    @abc.abstractmethod
+    def count(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+              bucket: timedelta = None) -> int:
+        """Count observations in a time range, or the query_resampled rows they make with a bucket width"""
+
+    @abc.abstractmethod
+    def locations(self) -> List[str]:
+        """List the distinct locations in the store"""
+
+    @abc.abstractmethod
+    def latest_timestamp(self) -> Optional[datetime]:
+        """Return the newest observation timestamp, or None when the store is empty"""
+
+    def match_locations(self, pattern: str) -> List[str]:
+        """Resolve a case-insensitive substring filter to the matching stored locations"""
+        return [name for name in self.locations() if pattern.lower() in name.lower()]
+
+    def close(self) -> None:
+        """Release the calling thread's connection; it is reopened on next use. Call before forking"""
+
+
+class SQLiteTrafficStore(TrafficStore):
+    """
+    SQLite-backed traffic store
+
+    Rows live in a WITHOUT ROWID table clustered on (location, timestamp) with a
+    secondary index on timestamp for all-location scans. Timestamps are stored as
+    integer microseconds since the epoch and measurements keep NUMERIC affinity,
+    so integer readings round-trip as integers. Each thread gets its own connection and
+    the database runs in WAL mode so readers never block the writer.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS observations (
+            location TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            vehicle_count INTEGER NOT NULL,
+            average_speed NUMERIC NOT NULL,
+            congestion_level TEXT NOT NULL,
+            weather_condition TEXT NOT NULL,
+            temperature NUMERIC,
+            visibility NUMERIC,
+            road_type TEXT,
+            event_nearby INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (location, timestamp)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS ix_observations_timestamp ON observations (timestamp);
+    """
+
+    # Filters on up to this many locations read each location's primary-key range separately
+    MAX_LOCATION_BRANCHES = 64
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        # In-memory databases are private to one connection, so share it
+        self._shared = sqlite3.connect(path, check_same_thread=False) if path == ':memory:' else None
+        self._connection().executescript(self.SCHEMA)
+
+    @classmethod
+    def from_url(cls, url: str) -> 'SQLiteTrafficStore':
+        """Create a store from a sqlite:///path URL"""
+        parsed = urlparse(url)
+        if parsed.scheme != 'sqlite':
+            raise ValueError(f"Unsupported database URL scheme '{parsed.scheme}'")
+        return cls(parsed.path[1:] if parsed.path.startswith('/') else parsed.path or ':memory:')
+
+    def append(self, frame: pd.DataFrame) -> int:
+        if frame.empty:
+            return 0
+
+        with self._write_lock:
+            self._write(frame)
+        return len(frame)
+
+    def upsert(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if frame.empty:
+            return self._to_frame([])
+
+        locations = frame['location'].astype(str).to_numpy()
+        timestamps = _to_micros(frame['timestamp'])
+        where, params = self._where(None, None, pd.unique(locations).tolist())
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM observations{where} AND timestamp BETWEEN ? AND ?"
+
+        with self._write_lock:
+            # Read the batch's (location, timestamp) span and write it in one transaction, so no
+            # other writer can replace a row in between; rows whose keys the batch rewrites are kept
+            connection = self._connection()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                rows = connection.execute(sql, params + [int(timestamps.min()), int(timestamps.max())]).fetchall()
+                self._write(frame)
+
+        stored = self._to_frame(rows)
+        keys = pd.MultiIndex.from_arrays([locations, timestamps])
+        replaced = pd.MultiIndex.from_arrays([stored['location'].astype(str).to_numpy(), _to_micros(stored['timestamp'])])
+        return stored[replaced.isin(keys)].reset_index(drop=True)
+
+    def query(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+              limit: int = None, newest_first: bool = False, before: Key = None, after: Key = None) -> pd.DataFrame:
+        direction = 'DESC' if newest_first else 'ASC'
+        locations = list(locations) if locations is not None else None
+        columns = ', '.join(self.COLUMNS)
+
+        if limit is not None and locations and len(locations) <= self.MAX_LOCATION_BRANCHES:
+            # One primary-key range scan per location, each reading at most limit rows
+            branches, params = [], []
+            for location in locations:
+                where, branch_params = self._where(start, end, [location], before, after)
+                branches.append(f"SELECT * FROM (SELECT {columns} FROM observations{where} "
+                                f"ORDER BY timestamp {direction} LIMIT ?)")
+                params.extend(branch_params + [int(limit)])
+            sql = ' UNION ALL '.join(branches) + f" ORDER BY timestamp {direction}, location {direction} LIMIT ?"
+            params.append(int(limit))
+        else:
+            where, params = self._where(start, end, locations, before, after)
+            sql = f"SELECT {columns} FROM observations{where} ORDER BY timestamp {direction}, location {direction}"
+            if limit is not None:
+                sql += ' LIMIT ?'
+                params.append(int(limit))
+
+        rows = self._connection().execute(sql, params).fetchall()
+        return self._to_frame(rows)
+
+    def query_resampled(self, bucket: timedelta, start: datetime = None, end: datetime = None,
+                        locations: Iterable[str] = None, limit: int = None, newest_first: bool = False,
+                        before: Key = None, after: Key = None) -> pd.DataFrame:
+        width = int(bucket / timedelta(microseconds=1))
+        if width <= 0:
+            raise ValueError('Bucket width must be positive')
+        locations = list(locations) if locations is not None else None
+        descending = after is None and (newest_first or before is not None)
+        key = f"(timestamp / {width}) * {width}"
+        sql = (f"SELECT {key} AS bucket, location, AVG(vehicle_count), AVG(average_speed), AVG(temperature), "
+               f"AVG(visibility), MAX(road_type), MAX(event_nearby), COUNT(*) FROM observations{{where}} "
+               f"GROUP BY bucket, location ORDER BY bucket {'DESC' if descending else 'ASC'}, "
+               f"location {'DESC' if descending else 'ASC'}")
+
+        def read(window_start: Optional[int], window_end: Optional[int]) -> List[tuple]:
+            where, params = self._where(start, end, locations, before, after, key=key)
+            bounds = [clause for clause, value in (('timestamp >= ?', window_start), ('timestamp < ?', window_end))
+                      if value is not None]
+            where += (' AND ' if where else ' WHERE ') + ' AND '.join(bounds) if bounds else ''
+            params += [value for value in (window_start, window_end) if value is not None]
+            limit_sql = ' LIMIT ?' if limit is not None else ''
+            return self._connection().execute(sql.format(where=where) + limit_sql,
+                                              params + ([int(limit)] if limit is not None else [])).fetchall()
+
+        if limit is None:
+            rows = read(None, None)
+        else:
+            # A page of limit groups spans at most limit buckets, so read a window of that many
+            # buckets from the cursor and widen it only when gaps in the data leave the page short
+            edges = self._connection().execute("SELECT MIN(timestamp), MAX(timestamp) FROM observations").fetchone()
+            if edges[0] is None:
+                return self._resampled_frame([])
+            first = max(edges[0], _to_micros(start)) if start is not None else edges[0]
+            last = min(edges[1] + 1, _to_micros(end)) if end is not None else edges[1] + 1
+            span = width * max(int(limit), 1)
+            while True:
+                if descending:
+                    upper = min(last, _to_micros(before[0]) // width * width + width) if before else last
+                    lower = upper - span
+                    rows = read(lower, upper)
+                    exhausted = lower <= first
+                else:
+                    lower = max(first, _to_micros(after[0]) // width * width) if after else first
+                    upper = lower // width * width + span
+                    rows = read(lower, upper)
+                    exhausted = upper >= last
+                if len(rows) >= limit or exhausted:
+                    break
+                span *= 2
+
+        return self._resampled_frame(rows)
+
+    def iter_query(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+                   chunk_rows: int = 10000) -> Iterator[pd.DataFrame]:
+        where, params = self._where(start, end, locations)
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM observations{where} ORDER BY timestamp, location"
+
+        # A dedicated connection keeps the cursor valid while the caller interleaves other queries
+        connection = self._shared or sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = connection.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    return
+                yield self._to_frame(rows)
+        finally:
+            if connection is not self._shared:
+                connection.close()
+
+    def count(self, start: datetime = None, end: datetime = None, locations: Iterable[str] = None,
+              bucket: timedelta = None) -> int:
+        where, params = self._where(start, end, locations)
+        sql = f"SELECT COUNT(*) FROM observations{where}"
+        if bucket is not None:
+            width = int(bucket / timedelta(microseconds=1))
+            sql = f"SELECT COUNT(*) FROM (SELECT 1 FROM observations{where} GROUP BY timestamp / {width}, location)"
+        return self._connection().execute(sql, params).fetchone()[0]
+
+    def locations(self) -> List[str]:
+        # Skip from each location to the next on the primary key: one index seek per location rather than
+        # a scan of every row, cheap enough to run per call, so writes by other processes are always seen
+        rows = self._connection().execute("""
+            WITH RECURSIVE names(location) AS (
+                SELECT MIN(location) FROM observations
+                UNION ALL
+                SELECT (SELECT MIN(location) FROM observations WHERE location > names.location)
+                FROM names WHERE names.location IS NOT NULL
+            )
+            SELECT location FROM names WHERE location IS NOT NULL
+        """).fetchall()
+        return [row[0] for row in rows]
+
+    def latest_timestamp(self) -> Optional[datetime]:
+        value = self._connection().execute("SELECT MAX(timestamp) FROM observations").fetchone()[0]
+        return None if value is None else pd.Timestamp(value, unit='us').to_pydatetime()
+
+    def close(self) -> None:
+        # A file connection must not be used from a forked child, so the parent drops its own first
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            connection.close()
+
+    def _write(self, frame: pd.DataFrame) -> None:
+        """Insert or replace rows; the caller holds the write lock"""
+        columns = {
+            'location': frame['location'].astype(str).tolist(),
+            'timestamp': _to_micros(frame['timestamp']).tolist(),
+            'vehicle_count': frame['vehicle_count'].astype(np.int64).tolist(),
+            'average_speed': frame['average_speed'].tolist(),
+            'congestion_level': frame['congestion_level'].astype(str).tolist(),
+            'weather_condition': frame['weather_condition'].astype(str).tolist(),
+            'temperature': frame['temperature'].tolist(),
+            'visibility': frame['visibility'].tolist(),
+            'road_type': frame['road_type'].astype(str).tolist(),
+            'event_nearby': frame['event_nearby'].astype(bool).tolist()
+        }
+        placeholders = ', '.join('?' for _ in columns)
+        statement = f"INSERT OR REPLACE INTO observations ({', '.join(columns)}) VALUES ({placeholders})"
+
+        connection = self._connection()
+        with connection:
+            connection.executemany(statement, zip(*columns.values()))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        if self._shared is not None:
+            return self._shared
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _where(start: datetime, end: datetime, locations: Iterable[str], before: Key = None, after: Key = None,
+               key: str = 'timestamp'):
+        """Build the WHERE clause and parameters for a range query; key is the time column keyset bounds compare"""
+        clauses, params = [], []
+        if before is not None:
+            clauses.append(f"({key}, location) < (?, ?)")
+            params.extend([_to_micros(before[0]), before[1]])
+        if after is not None:
+            clauses.append(f"({key}, location) > (?, ?)")
+            params.extend([_to_micros(after[0]), after[1]])
+        if locations is not None:
+            locations = list(locations)
+            clauses.append(f"location IN ({', '.join('?' for _ in locations)})" if locations else '0')
+            params.extend(locations)
+        if start is not None:
+            clauses.append('timestamp >= ?')
+            params.append(_to_micros(start))
+        if end is not None:
+            clauses.append('timestamp < ?')
+            params.append(_to_micros(end))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _resampled_frame(self, rows: List[tuple]) -> pd.DataFrame:
+        """Convert grouped result rows to a RESAMPLED_COLUMNS frame"""
+        frame = pd.DataFrame.from_records(rows, columns=self.RESAMPLED_COLUMNS)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'].to_numpy(dtype=np.int64), unit='us')
+        for name in ['vehicle_count', 'average_speed', 'temperature', 'visibility']:
+            frame[name] = frame[name].astype(np.float64).round(2)
+        frame['event_nearby'] = frame['event_nearby'].astype(bool)
+        frame['samples'] = frame['samples'].astype(np.int64)
+        frame['location'] = frame['location'].astype('category')
+        frame['road_type'] = frame['road_type'].astype('category')
+        return frame
+
+    def _to_frame(self, rows: List[tuple]) -> pd.DataFrame:
+        """Convert result rows to a frame with compact dtypes"""
+        frame = pd.DataFrame.from_records(rows, columns=self.COLUMNS)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'].to_numpy(dtype=np.int64), unit='us')
+        frame['event_nearby'] = frame['event_nearby'].astype(bool)
+        for name in self.CATEGORICAL_COLUMNS:
+            frame[name] = frame[name].astype('category')
+        return frame
+
+
+def _to_micros(value: Any):
+    """Convert a datetime or datetime column to integer microseconds since the epoch"""
+    if isinstance(value, (pd.Series, pd.Index, np.ndarray)):
+        return np.asarray(value, dtype='datetime64[us]').astype(np.int64)
+    return int(np.datetime64(pd.Timestamp(value).to_datetime64(), 'us').astype(np.int64))
+
+
+def create_store(url: str) -> TrafficStore:
+    """Create the traffic store configured by a database URL"""
+    return SQLiteTrafficStore.from_url(url)
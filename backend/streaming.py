@@ -0,0 +1,254 @@
+"""
+TrafficTelligence Streaming
+Server-Sent Events push channel for live dashboard updates
+
+A single LiveFeed ticker computes each update once per tick: new readings,
+changes to the active alerts and changed predictions. Updates are grouped by
+location and serialized once, then fanned out to every subscriber whose
+location filter matches. Each subscriber has a bounded queue; one that falls
+behind is told to resync instead of slowing the ticker down.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ('readings', 'alerts', 'predictions')
+
+
+def format_event(event: str, data: Any) -> str:
+    """Serialize one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class FeedFull(RuntimeError):
+    """The feed already has its maximum number of subscribers"""
+
+
+class Subscription:
+    """One connected client: its filters and a bounded queue of serialized events"""
+
+    def __init__(self, locations: Optional[Iterable[str]], topics: Iterable[str], max_queue: int):
+        self.locations = set(locations) if locations else None
+        self.topics = set(topics)
+        self.queue = deque()
+        self.max_queue = max_queue
+        self.overflows = 0
+        self._ready = threading.Condition()
+
+    def wants(self, topic: str, location: str) -> bool:
+        return topic in self.topics and (self.locations is None or location in self.locations)
+
+    def push(self, message: str) -> None:
+        """Queue an event; a full queue is replaced by a single resync event"""
+        with self._ready:
+            if len(self.queue) >= self.max_queue:
+                self.queue.clear()
+                self.overflows += 1
+                self.queue.append(format_event('resync', {'reason': 'client too slow', 'overflows': self.overflows}))
+            else:
+                self.queue.append(message)
+            self._ready.notify()
+
+    def drain(self, timeout: float) -> List[str]:
+        """Wait up to timeout for events and take everything queued"""
+        with self._ready:
+            if not self.queue:
+                self._ready.wait(timeout)
+            messages = list(self.queue)
+            self.queue.clear()
+            return messages
+
+
+class LiveFeed:
+    """
+    Shared per-tick computation and fan-out of live updates
+
+    Providers are plain callables so the feed stays independent of the app:
+    alerts() returns the active alerts, predictions() returns upcoming
+    predictions per location and to_records() turns a readings frame into
+    JSON-ready rows. Every connected client holds a server thread or
+    connection for as long as it stays subscribed, so at most max_subscribers
+    are accepted.
+    """
+
+    def __init__(self, alerts: Callable[[], List[Dict[str, Any]]],
+                 predictions: Callable[[], Dict[str, List[Dict[str, Any]]]],
+                 to_records: Callable[[pd.DataFrame], List[Dict[str, Any]]],
+                 on_tick: Callable[[], None] = None, tick_seconds: float = 2.0,
+                 prediction_interval_seconds: float = 60.0, heartbeat_seconds: float = 15.0,
+                 max_queue: int = 256, live_window: timedelta = timedelta(hours=2), max_subscribers: int = 100):
+        self.alerts = alerts
+        self.predictions = predictions
+        self.to_records = to_records
+        self.on_tick = on_tick
+        self.tick_seconds = tick_seconds
+        self.prediction_interval_seconds = prediction_interval_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_queue = max_queue
+        self.live_window = live_window
+        self.max_subscribers = max_subscribers
+        self._subscriptions: List[Subscription] = []
+        self._pending_readings: List[pd.DataFrame] = []
+        self._lock = threading.Lock()
+        self._ticker = None
+        self._alerts: Dict[str, Dict[str, Any]] = {}
+        self._predictions: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._predictions_at = None
+        self.ticks = 0
+        self.events_sent = 0
+        self.rejected_subscribers = 0
+
+    def publish_readings(self, frame: pd.DataFrame) -> None:
+        """Queue newly written live readings for the next tick (observation subscriber)"""
+        # Backfilled history is not pushed; clients load it through the REST API
+        frame = frame[pd.DatetimeIndex(frame['timestamp']) >= datetime.now() - self.live_window]
+        if frame.empty:
+            return
+        with self._lock:
+            if self._subscriptions:
+                self._pending_readings.append(frame)
+
+    def subscribe(self, locations: Optional[Iterable[str]] = None, topics: Iterable[str] = TOPICS) -> Subscription:
+        """Register a client and queue the current alerts and predictions for it; raises FeedFull at capacity"""
+        subscription = Subscription(locations, topics, self.max_queue)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                self.rejected_subscribers += 1
+                raise FeedFull(f"Live feed is at its limit of {self.max_subscribers} subscribers")
+            for topic, location, message in self._snapshot_messages():
+                if subscription.wants(topic, location):
+                    subscription.push(message)
+            self._subscriptions.append(subscription)
+            if self._ticker is None or not self._ticker.is_alive():
+                self._ticker = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self._ticker.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def stream(self, subscription: Subscription) -> Iterator[str]:
+        """Yield Server-Sent Events for a subscription until the client disconnects"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                messages = subscription.drain(self.heartbeat_seconds)
+                yield ''.join(messages) if messages else ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'max_subscribers': self.max_subscribers,
+                'rejected_subscribers': self.rejected_subscribers,
+                'ticks': self.ticks,
+                'events_sent': self.events_sent,
+                'slow_client_resyncs': sum(subscription.overflows for subscription in self._subscriptions)
+            }
+
+    def _run(self) -> None:
+        """Tick until the last subscriber leaves"""
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                if not self._subscriptions:
+                    self._pending_readings = []
+                    return
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error in live feed tick: {str(e)}")
+            time.sleep(max(0.0, self.tick_seconds - (time.monotonic() - started)))
+
+    def tick(self) -> None:
+        """Compute this tick's deltas once and fan them out to matching subscribers"""
+        if self.on_tick is not None:
+            self.on_tick()
+
+        with self._lock:
+            frames, self._pending_readings = self._pending_readings, []
+
+        messages = self._reading_messages(frames) + self._alert_messages()
+        if self._predictions_at is None or time.monotonic() - self._predictions_at >= self.prediction_interval_seconds:
+            messages += self._prediction_messages()
+            self._predictions_at = time.monotonic()
+
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self.ticks += 1
+        for topic, location, message in messages:
+            for subscription in subscriptions:
+                if subscription.wants(topic, location):
+                    subscription.push(message)
+                    self.events_sent += 1
+
+    def _reading_messages(self, frames: List[pd.DataFrame]) -> List[Tuple[str, str, str]]:
+        """One 'readings' event per location with the rows written since the last tick"""
+        if not frames:
+            return []
+        readings = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        readings = readings.assign(location=readings['location'].astype(str))
+        return [
+            ('readings', location, format_event('readings', {'location': location, 'readings': self.to_records(rows)}))
+            for location, rows in readings.groupby('location', sort=False)
+        ]
+
+    def _alert_messages(self) -> List[Tuple[str, str, str]]:
+        """One 'alerts' event per location whose alerts were raised, updated or expired"""
+        current = {alert['id']: alert for alert in self.alerts()}
+        changes: Dict[str, Dict[str, list]] = {}
+
+        for alert_id, alert in current.items():
+            previous = self._alerts.get(alert_id)
+            if previous is None or previous['last_updated'] != alert['last_updated']:
+                changes.setdefault(alert['location'], {'upserted': [], 'removed': []})['upserted'].append(alert)
+        for alert_id, alert in self._alerts.items():
+            if alert_id not in current:
+                changes.setdefault(alert['location'], {'upserted': [], 'removed': []})['removed'].append(alert_id)
+
+        self._alerts = current
+        return [
+            ('alerts', location, format_event('alerts', {'location': location, **change}))
+            for location, change in changes.items()
+        ]
+
+    def _prediction_messages(self) -> List[Tuple[str, str, str]]:
+        """One 'predictions' event per location with only the hours whose prediction changed"""
+        messages = []
+        for location, predictions in self.predictions().items():
+            previous = self._predictions.get(location, {})
+            current = {prediction['timestamp']: prediction for prediction in predictions}
+            changed = [prediction for timestamp, prediction in current.items() if previous.get(timestamp) != prediction]
+            self._predictions[location] = current
+            if changed:
+                messages.append(('predictions', location,
+                                 format_event('predictions', {'location': location, 'predictions': changed})))
+        return messages
+
+    def _snapshot_messages(self) -> List[Tuple[str, str, str]]:
+        """Full current state, sent to a client when it connects"""
+        by_location: Dict[str, list] = {}
+        for alert in self._alerts.values():
+            by_location.setdefault(alert['location'], []).append(alert)
+        messages = [
+            ('alerts', location, format_event('alerts', {'location': location, 'upserted': alerts, 'removed': []}))
+            for location, alerts in by_location.items()
+        ]
+        messages += [
+            ('predictions', location, format_event('predictions', {'location': location, 'predictions': list(predictions.values())}))
+            for location, predictions in self._predictions.items()
+        ]
+        return messages
@@ -0,0 +1,45 @@
+"""
+Shared fixtures for the backend tests
+
+The app is imported once per session against a throwaway database and model
+directory, so tests never touch backend/traffic.db or backend/models.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix='traffictelligence-tests-')
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'traffic.db')}"
+os.environ['ML_MODEL_PATH'] = os.path.join(TEST_DIR, 'models')
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def backend():
+    """The app module, with the synthetic history generated as at server start"""
+    import app
+    app.warm_up()
+    return app
+
+
+@pytest.fixture
+def client(backend):
+    """Flask test client"""
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def ingest(client):
+    """Post readings to the ingestion endpoint, waiting for them to be written; returns the response body"""
+    def post(readings):
+        body = '\n'.join(json.dumps(reading) for reading in readings)
+        response = client.post('/api/traffic-data/ingest?wait=true', data=body, content_type='application/x-ndjson')
+        assert response.status_code == 202, response.get_json()
+        return response.get_json()
+    return post
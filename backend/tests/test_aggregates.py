@@ -0,0 +1,71 @@
+"""Rolling aggregates and historical averages kept in step with the store"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def aggregate_totals(backend):
+    """Reading count and volume summed over the rolling aggregates' retention window"""
+    window = backend.rolling_aggregates.window(backend.HISTORY_DAYS * 24, end=backend.current_hour() + timedelta(hours=1))
+    fields = backend.analytics_engine.FIELDS
+    totals = window['weather'].sum(axis=0)
+    return totals[fields.index('count')], totals[fields.index('vehicle_count')]
+
+
+def store_totals(backend):
+    """Reading count and volume of the same window, read from the store"""
+    history = backend.traffic_store.query(start=backend.history_start())
+    return len(history), history['vehicle_count'].sum()
+
+
+def test_resent_reading_is_counted_once(backend, ingest):
+    timestamp = (datetime.now() - timedelta(minutes=30)).replace(second=0, microsecond=0).isoformat()
+    reading = {'timestamp': timestamp, 'location': 'Resend Avenue', 'vehicle_count': 120, 'average_speed': 35}
+    ingest([reading])
+    ingest([dict(reading, vehicle_count=180)])
+
+    assert np.allclose(aggregate_totals(backend), store_totals(backend))
+    slot = backend.feature_store.slots['Resend Avenue']
+    assert backend.feature_store.location_counts[slot].sum() == 1
+    assert backend.feature_store.location_sums[slot].sum() == 180
+
+
+def test_duplicates_within_a_batch_are_counted_once(backend, ingest):
+    timestamp = (datetime.now() - timedelta(minutes=20)).replace(second=0, microsecond=0).isoformat()
+    reading = {'timestamp': timestamp, 'location': 'Duplicate Street', 'vehicle_count': 50, 'average_speed': 30}
+    backend.ingestion_buffer.submit(backend.validate_batch(pd.DataFrame([reading]))[0])
+    ingest([dict(reading, vehicle_count=70)])
+
+    assert np.allclose(aggregate_totals(backend), store_totals(backend))
+
+
+def test_rebuild_matches_incremental_updates(backend):
+    before = aggregate_totals(backend)
+    backend.rebuild_derived_state()
+    assert np.allclose(aggregate_totals(backend), before)
+
+
+def test_trends_compare_the_current_window_with_the_previous_one(backend):
+    engine = backend.analytics_engine
+    start = datetime(2024, 3, 4)
+    frame = pd.DataFrame({
+        'timestamp': [start, start, start + timedelta(hours=1), start + timedelta(hours=1)],
+        'vehicle_count': [100, 100, 150, 150],
+        'average_speed': [40.0, 40.0, 40.5, 40.5],
+        'congestion_level': ['low', 'high', 'low', 'low'],
+        'weather_condition': ['clear'] * 4
+    })
+    previous, current = engine.aggregate(frame.iloc[:2]), engine.aggregate(frame.iloc[2:])
+
+    assert engine.trends(current, previous) == {'volume_trend': 'increasing', 'speed_trend': 'stable', 'efficiency_score': 100.0}
+    assert engine.trends(previous, current) == {'volume_trend': 'decreasing', 'speed_trend': 'stable', 'efficiency_score': 50.0}
+
+
+def test_analytics_trends_are_repeatable(client):
+    first = client.get('/api/analytics?period=7d').get_json()['trends']
+    assert client.get('/api/analytics?period=7d').get_json()['trends'] == first
+    assert first['volume_trend'] in ('increasing', 'decreasing', 'stable')
+    assert first['speed_trend'] in ('improving', 'declining', 'stable')
+    assert 0 <= first['efficiency_score'] <= 100
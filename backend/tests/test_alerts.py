@@ -0,0 +1,103 @@
+"""Alert rules, dedup and expiry"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alerts import AlertEngine
+
+HISTORY_HOURS = 14 * 24
+
+
+class FixedForecast:
+    """Predictor stand-in forecasting the same volume everywhere"""
+
+    def __init__(self, volume):
+        self.volume = volume
+
+    def predict_batch(self, columns, use_cache=True):
+        return {'predicted_volume': np.full(len(columns['hour']), self.volume, dtype=np.int64)}
+
+
+def readings(timestamps, location='Main Street', vehicle_count=100, average_speed=50.0, weather_condition='clear'):
+    """Readings at one location in the columns the aggregates and rules read"""
+    return pd.DataFrame({'timestamp': pd.DatetimeIndex(timestamps), 'location': location,
+                         'vehicle_count': vehicle_count, 'average_speed': average_speed,
+                         'congestion_level': 'low', 'weather_condition': weather_condition})
+
+
+@pytest.fixture
+def engine(backend):
+    """Engine over two weeks of steady history at Main Street, with a forecast under capacity"""
+    aggregates = backend.RollingAggregates(backend.analytics_engine, retention_hours=HISTORY_HOURS)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    aggregates.update(readings(pd.date_range(end=now - timedelta(hours=1), periods=HISTORY_HOURS, freq='h')))
+    forecast = FixedForecast(volume=50)
+    engine = AlertEngine(aggregates, predictor=lambda: forecast, history_hours=HISTORY_HOURS)
+    engine.forecast = forecast
+    return engine
+
+
+def live(**values):
+    return readings([datetime.now() - timedelta(minutes=5)], **values)
+
+
+def test_volume_spike_raises_one_alert_per_location(engine):
+    engine.evaluate(pd.concat([live(vehicle_count=160), live(vehicle_count=200), live(vehicle_count=120)]))
+    alerts = engine.active_alerts()
+    assert [alert['type'] for alert in alerts] == ['critical_congestion']
+    assert alerts[0]['severity'] == 'high'
+    assert alerts[0]['observed_volume'] == 200
+    assert alerts[0]['baseline_volume'] == 100.0
+
+
+def test_normal_readings_raise_nothing(engine):
+    engine.evaluate(live(vehicle_count=110, weather_condition='rainy', average_speed=45.0))
+    assert engine.active_alerts() == []
+    assert engine.stats()['rows_evaluated'] == 1
+
+
+def test_adverse_weather_slowdown_raises_a_weather_alert(engine):
+    engine.evaluate(pd.concat([live(weather_condition='rainy', average_speed=30.0), live(average_speed=20.0)]))
+    alerts = engine.active_alerts()
+    assert [alert['type'] for alert in alerts] == ['weather_impact']
+    assert alerts[0]['observed_speed'] == 30.0
+
+
+def test_forecast_above_capacity_raises_an_alert(engine):
+    engine.forecast.volume = 200
+    engine.evaluate(live())
+    alerts = engine.active_alerts()
+    assert [alert['type'] for alert in alerts] == ['capacity_forecast']
+    assert alerts[0]['capacity'] == 130
+    assert alerts[0]['severity'] == 'high'
+
+
+def test_retriggered_alerts_are_refreshed_not_duplicated(engine):
+    engine.evaluate(live(vehicle_count=160))
+    first = engine.active_alerts()[0]
+    engine.evaluate(live(vehicle_count=200))
+
+    alerts = engine.active_alerts()
+    assert len(alerts) == 1
+    assert engine.stats()['alerts_raised'] == 1
+    assert alerts[0]['first_detected'] == first['first_detected']
+    assert alerts[0]['severity'] == 'high'
+    assert alerts[0]['expires_at'] >= first['expires_at']
+
+
+def test_alerts_expire_unless_retriggered(engine):
+    engine.evaluate(live(vehicle_count=200))
+    assert len(engine.active_alerts()) == 1
+
+    engine._expire(datetime.now() + timedelta(minutes=engine.rules['alert_ttl_minutes'] + 1))
+    assert engine.active_alerts() == []
+    assert engine.stats()['active_alerts'] == 0
+
+
+def test_old_readings_are_history_not_live_traffic(engine):
+    engine.evaluate(readings([datetime.now() - timedelta(hours=5)], vehicle_count=500))
+    assert engine.active_alerts() == []
+    assert engine.stats()['rows_evaluated'] == 0
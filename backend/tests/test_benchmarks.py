@@ -0,0 +1,18 @@
+"""Benchmark suite coverage"""
+
+import re
+
+import benchmarks
+
+# Routes the load test cannot drive without extra setup
+UNBENCHMARKED = {('GET', '/api/metrics/profiles/{}')}
+
+
+def test_load_test_covers_every_endpoint(backend):
+    routes = {
+        (method, re.sub(r'<[^>]+>', '{}', rule.rule))
+        for rule in backend.app.url_map.iter_rules() if rule.endpoint != 'static'
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+    }
+    benchmarked = {(method, re.sub(r'\{[^}]+\}', '{}', path.split('?')[0])) for _, method, path, _ in benchmarks.ENDPOINTS}
+    assert routes - UNBENCHMARKED <= benchmarked
@@ -0,0 +1,21 @@
+"""Feature store and calendar features"""
+
+import numpy as np
+import pandas as pd
+
+from features import FeatureStore, epoch_hour_of_week, hour_of_week
+
+
+def test_epoch_hour_of_week_matches_calendar():
+    timestamps = pd.date_range('2024-02-26', periods=24 * 9, freq='h')
+    hour_index = np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+    expected = hour_of_week(timestamps.hour, timestamps.dayofweek)
+    assert (epoch_hour_of_week(hour_index) == expected).all()
+    assert epoch_hour_of_week(hour_index[:1])[0] == 0
+
+
+def test_memory_bytes_covers_every_table():
+    store = FeatureStore()
+    tables = [store.location_means, store.type_means, store.location_sums, store.location_counts,
+              store.type_sums, store.type_counts]
+    assert store.stats()['memory_bytes'] == sum(table.nbytes for table in tables)
@@ -0,0 +1,68 @@
+"""Bulk forecasts streamed as NDJSON"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import forecasting
+
+LOCATIONS = ['Highway A1', 'Main Street', 'Downtown Bridge']
+
+
+def lines(body):
+    """Parse an NDJSON body"""
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_bulk_forecast_has_one_line_per_location_and_hour(client):
+    response = client.post('/api/predictions/bulk', json={
+        'locations': LOCATIONS, 'start': '2024-03-04T08:00:00', 'horizon_hours': 5
+    })
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['X-Forecast-Rows'] == '15'
+
+    forecast = lines(response.get_data(as_text=True))
+    hours = pd.date_range('2024-03-04T08:00:00', periods=5, freq='h')
+    assert [(row['location'], row['timestamp']) for row in forecast] == [
+        (location, hour.isoformat()) for location in LOCATIONS for hour in hours
+    ]
+    assert all(set(row) == {'location', 'timestamp', 'predicted_volume', 'confidence'} for row in forecast)
+    assert all(row['predicted_volume'] >= 0 for row in forecast)
+
+
+def test_chunks_from_a_pool_keep_location_order(backend, monkeypatch):
+    monkeypatch.setattr(forecasting, 'CHUNK_ROWS', 48)
+    monkeypatch.setattr(forecasting, '_worker_predictor', None)
+    start = datetime(2024, 3, 4, 8)
+
+    def keys(chunks):
+        return [(row['location'], row['timestamp']) for chunk in chunks for row in lines(chunk)]
+
+    in_process = list(forecasting.iter_forecast(backend.predictor, LOCATIONS, start, 24))
+    assert len(in_process) == 2
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pooled = list(forecasting.iter_forecast(backend.predictor, LOCATIONS, start, 24,
+                                                executor=executor, max_in_flight=1))
+    assert keys(pooled) == keys(in_process)
+    assert len(keys(pooled)) == 3 * 24
+
+
+@pytest.mark.parametrize('body', [
+    {'locations': 'Highway A1'},
+    {'locations': ['Highway A1', 3]},
+    {'horizon_hours': 0},
+    {'horizon_hours': forecasting.MAX_HORIZON_HOURS + 1},
+    {'horizon_days': 15},
+    {'horizon_hours': 'soon'},
+    {'start': 'tomorrow-ish'},
+    {'weather_forecast': {'temperature': None}},
+    {'special_events': 'parade'}
+])
+def test_invalid_bulk_requests_are_rejected(client, body):
+    response = client.post('/api/predictions/bulk', json={'locations': ['Highway A1'], **body})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,110 @@
+"""Ingestion buffer and batch validation"""
+
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from ingestion import IngestionBuffer, validate_batch
+from storage import SQLiteTrafficStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteTrafficStore(str(tmp_path / 'traffic.db'))
+
+
+def readings(*vehicle_counts, location='Main Street'):
+    """Validated readings at distinct minutes of 2024-01-01 08:00"""
+    raw = pd.DataFrame({
+        'timestamp': [datetime(2024, 1, 1, 8, minute) for minute in range(len(vehicle_counts))],
+        'location': location,
+        'vehicle_count': list(vehicle_counts),
+        'average_speed': 50
+    })
+    return validate_batch(raw, now=datetime(2024, 1, 2))[0]
+
+
+def test_validate_batch_rejects_invalid_rows():
+    raw = pd.DataFrame({
+        'timestamp': ['2024-01-01T08:00:00', 'not a time', '2024-01-03T08:00:00', '2024-01-01T08:05:00',
+                      '2024-01-01T08:10:00', '2024-01-01T08:15:00'],
+        'location': ['Main Street', 'Main Street', 'Main Street', '  ', 'Main Street', 'Main Street'],
+        'vehicle_count': [100, 100, 100, 100, -1, 100],
+        'average_speed': [50, 50, 50, 50, 50, 300]
+    })
+    readings, rejected, errors = validate_batch(raw, now=datetime(2024, 1, 2))
+    assert len(readings) == 1
+    assert rejected == 5
+    assert [error['errors'] for error in errors] == [
+        ['invalid timestamp'], ['timestamp in the future'], ['missing location'],
+        ['vehicle_count must be a non-negative number'], ['average_speed must be between 0 and 250']
+    ]
+
+
+def test_validate_batch_fills_optional_fields():
+    raw = pd.DataFrame({
+        'timestamp': ['2024-01-01T08:00:00', '2024-01-01T08:00:00'],
+        'location': ['Highway A1', 'Main Street'],
+        'vehicle_count': [100.4, 80],
+        'average_speed': [15, 60],
+        'event_nearby': ['yes', None]
+    })
+    readings = validate_batch(raw, now=datetime(2024, 1, 2))[0]
+    assert readings['vehicle_count'].tolist() == [100, 80]
+    assert readings['congestion_level'].tolist() == ['critical', 'low']
+    assert readings['weather_condition'].tolist() == ['unknown', 'unknown']
+    assert readings['road_type'].tolist() == ['Highway', 'Urban']
+    assert readings['event_nearby'].tolist() == [True, False]
+    assert readings['temperature'].isna().all()
+
+
+def test_validate_batch_keeps_the_last_duplicate():
+    readings = validate_batch(pd.DataFrame({
+        'timestamp': ['2024-01-01T08:00:00'] * 2,
+        'location': ['Main Street'] * 2,
+        'vehicle_count': [100, 120],
+        'average_speed': [50, 50]
+    }), now=datetime(2024, 1, 2))[0]
+    assert readings['vehicle_count'].tolist() == [120]
+
+
+def test_validate_batch_requires_columns():
+    with pytest.raises(ValueError, match='vehicle_count'):
+        validate_batch(pd.DataFrame({'timestamp': [], 'location': [], 'average_speed': []}))
+
+
+def test_ingest_endpoint_reports_rejected_rows(client, backend):
+    body = '{"timestamp": "2020-01-01T00:00:00", "location": "Main Street", "vehicle_count": -5, "average_speed": 40}'
+    response = client.post('/api/traffic-data/ingest', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == 1
+
+
+def test_flush_does_not_wait_for_subscribers(store):
+    buffer = IngestionBuffer(store)
+    release = threading.Event()
+    seen = []
+    buffer.subscribe(lambda frame: (release.wait(5), seen.append(len(frame))))
+
+    buffer.submit(readings(10, 20))
+    assert buffer.flush() == 2
+    assert store.count() == 2
+    assert seen == []
+
+    release.set()
+    buffer.drain()
+    assert seen == [2]
+
+
+def test_subscribers_receive_replaced_rows_first(store):
+    buffer = IngestionBuffer(store)
+    calls = []
+    buffer.subscribe_replaced(lambda frame: calls.append(('replaced', frame['vehicle_count'].tolist())))
+    buffer.subscribe(lambda frame: calls.append(('written', frame['vehicle_count'].tolist())))
+
+    buffer.write(readings(10, 20))
+    buffer.write(readings(30))
+    buffer.drain()
+    assert calls == [('written', [10, 20]), ('replaced', [10]), ('written', [30])]
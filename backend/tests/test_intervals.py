@@ -0,0 +1,83 @@
+"""Prediction intervals read from residual quantile tables"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import training
+import uncertainty
+from features import FeatureStore
+from online import OnlineCorrections
+from prediction import TrafficPredictor
+
+LEVELS = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+@pytest.fixture(scope='module')
+def weeks(backend):
+    """Five weeks of generated readings: three to train on, one learned online and one held out"""
+    frame = backend.TrafficDataGenerator(seed=7).generate_historical_frame(days=35, end=datetime(2024, 3, 4))
+    week = (frame['timestamp'] - frame['timestamp'].min()) // pd.Timedelta(days=7)
+    return frame[week < 3], frame[week == 3], frame[week == 4]
+
+
+@pytest.fixture(scope='module')
+def artifact_path(weeks, tmp_path_factory):
+    return training.save_artifact(training.train_model(weeks[0]), str(tmp_path_factory.mktemp('models')))
+
+
+def interval_predictor(setup, weeks, artifact_path):
+    """Predictor whose intervals come from the residuals setup names"""
+    train, online_week, _ = weeks
+    seen = pd.concat([train, online_week])
+    predictor = TrafficPredictor(feature_store=FeatureStore.from_history(seen))
+    if setup != 'heuristic+online':
+        predictor.load(artifact_path)
+    if setup != 'trained':
+        # Replayed a day at a time, as seed_online_corrections does
+        predictor.online = OnlineCorrections()
+        fitted_until = train['timestamp'].max() if predictor.model_trained else None
+        for _, readings in seen.groupby(pd.DatetimeIndex(seen['timestamp']).floor('D')):
+            predictor.online.update(readings, predictor.base_prediction, fitted_until)
+    return predictor
+
+
+@pytest.mark.parametrize('setup, method', [
+    ('trained', 'validation_residuals'),
+    ('trained+online', 'online_residuals'),
+    ('heuristic+online', 'online_residuals')
+])
+def test_intervals_are_calibrated_on_a_held_out_week(weeks, artifact_path, setup, method):
+    held_out = weeks[2]
+    batch = interval_predictor(setup, weeks, artifact_path).predict_batch(
+        training.observation_columns(held_out), quantiles=LEVELS)
+    quantiles = batch['quantiles']
+    observed = held_out['vehicle_count'].to_numpy()
+    assert batch['interval_method'] == method
+
+    assert (np.diff(quantiles, axis=1) >= 0).all()
+    assert ((quantiles[:, 0] <= batch['predicted_volume']) & (batch['predicted_volume'] <= quantiles[:, -1])).all()
+    coverage = ((quantiles[:, 0] <= observed) & (observed <= quantiles[:, -1])).mean()
+    assert 0.85 <= coverage <= 0.97
+
+
+def test_readings_the_model_was_fitted_on_do_not_calibrate_it(weeks, artifact_path):
+    predictor = TrafficPredictor()
+    predictor.load(artifact_path)
+    predictor.online = OnlineCorrections()
+    predictor.online.update(weeks[0], predictor.base_prediction, weeks[0]['timestamp'].max())
+    assert predictor.online.residual_quantiles() is None
+    assert predictor.interval_table(LEVELS)[1] == 'validation_residuals'
+
+
+def test_intervals_need_observed_residuals(client, backend, monkeypatch):
+    with pytest.raises(uncertainty.ResidualsUnavailable):
+        TrafficPredictor().predict_batch({'hour': [8]}, quantiles=LEVELS)
+
+    monkeypatch.setattr(backend.predictor, 'online', None)
+    response = client.post('/api/predictions', json={'hours_ahead': 3, 'quantiles': [0.05, 0.95]})
+    assert response.status_code == 503
+    response = client.post('/api/predictions/bulk', json={'locations': ['Highway A1'], 'quantiles': [0.05, 0.95]})
+    assert response.status_code == 503
@@ -0,0 +1,68 @@
+"""Health checks and the gunicorn model reload hook"""
+
+import importlib.util
+import logging
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import training
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+@pytest.fixture
+def gunicorn_config(monkeypatch):
+    """The gunicorn config module, loaded without leaving its environment defaults behind"""
+    monkeypatch.setenv('STREAM_MAX_SUBSCRIBERS', os.environ.get('STREAM_MAX_SUBSCRIBERS', '4'))
+    spec = importlib.util.spec_from_file_location('gunicorn_config', CONFIG_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def model_dir(backend, monkeypatch, tmp_path):
+    """A model directory holding one freshly trained artifact, restoring the serving predictor afterwards"""
+    history = backend.TrafficDataGenerator(seed=5).generate_historical_frame(days=14, end=datetime(2024, 3, 4))
+    training.save_artifact(training.train_model(history), str(tmp_path))
+    monkeypatch.setattr(backend, 'MODEL_DIR', str(tmp_path))
+    monkeypatch.setattr(backend, 'predictor', backend.predictor)
+    return tmp_path
+
+
+def test_ready_when_the_store_answers_and_the_model_is_loaded(client):
+    response = client.get('/api/health/ready')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready'
+    assert body['checks']['store']['ok'] and body['checks']['model']['ok']
+    assert body['checks']['model']['latest_artifact_loaded']
+    assert client.get('/api/health/live').get_json()['status'] == 'alive'
+
+
+def test_not_ready_when_the_store_fails(client, backend, monkeypatch):
+    def unavailable():
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(backend.traffic_store, 'latest_timestamp', unavailable)
+    response = client.get('/api/health/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'not_ready'
+    assert response.get_json()['checks']['store'] == {'ok': False, 'error': 'database is locked'}
+    assert client.get('/api/health/live').status_code == 200
+
+
+def test_reload_hook_swaps_in_a_new_artifact_once(client, backend, gunicorn_config, model_dir):
+    assert not client.get('/api/health/ready').get_json()['checks']['model']['latest_artifact_loaded']
+    server = SimpleNamespace(cfg=SimpleNamespace(preload_app=True), log=logging.getLogger('gunicorn'))
+
+    gunicorn_config.on_reload(server)
+    swapped = backend.predictor
+    assert swapped.artifact_path == training.latest_artifact_path(str(model_dir))
+    assert client.get('/api/health/ready').get_json()['checks']['model']['latest_artifact_loaded']
+
+    gunicorn_config.on_reload(server)
+    assert backend.predictor is swapped
@@ -0,0 +1,65 @@
+"""Prometheus metrics and the opt-in request profiler"""
+
+import pytest
+
+import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = metrics.MetricsRegistry(prefix='test')
+    histogram = registry.histogram('latency_seconds', 'Latency', ['endpoint'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, endpoint='/a')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE test_latency_seconds histogram' in lines
+    assert 'test_latency_seconds_bucket{endpoint="/a",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{endpoint="/a",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{endpoint="/a",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{endpoint="/a"} 4' in lines
+
+
+def test_metrics_endpoint_counts_requests_by_route(client):
+    client.get('/api/analytics?period=7d')
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    text = response.get_data(as_text=True)
+    assert 'traffic_requests_total{endpoint="/api/analytics",method="GET",status="200"}' in text
+    assert 'traffic_stage_duration_seconds_count{endpoint="/api/analytics",stage="aggregation"}' in text
+    assert '# TYPE traffic_prediction_cache_hits_total counter' in text
+    assert 'traffic_process_rss_memory_bytes' in text
+
+
+def test_requests_are_not_profiled_by_default(client):
+    response = client.get('/health', headers={'X-Profile': '1'})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/api/metrics/profiles').get_json()['mode'] == 'off'
+
+
+def test_header_mode_profiles_requests_that_ask(client, backend, monkeypatch):
+    monkeypatch.setattr(backend, 'request_profiler', metrics.RequestProfiler(mode='header'))
+    assert 'X-Profile-Id' not in client.get('/health').headers
+
+    report_id = client.get('/api/analytics', headers={'X-Profile': '1'}).headers['X-Profile-Id']
+    profiles = client.get('/api/metrics/profiles').get_json()['profiles']
+    assert [profile['id'] for profile in profiles] == [report_id]
+    assert profiles[0]['request'].startswith('GET /api/analytics')
+
+    report = client.get(f'/api/metrics/profiles/{report_id}')
+    assert report.status_code == 200
+    assert 'function calls' in report.get_data(as_text=True)
+    assert client.get('/api/metrics/profiles/unknown').status_code == 404
+
+
+def test_sampled_profiles_are_kept_only_for_slow_requests():
+    profiler = metrics.RequestProfiler(mode='sample', sample_rate=1.0, slow_ms=1000.0)
+    assert profiler.finish(profiler.start(requested=False), 'GET /fast', elapsed=0.01) is None
+    assert profiler.finish(profiler.start(requested=False), 'GET /slow', elapsed=2.0) is not None
+    assert [report['request'] for report in profiler.reports()] == ['GET /slow']
+
+
+def test_unknown_profiling_modes_are_rejected():
+    with pytest.raises(ValueError):
+        metrics.RequestProfiler(mode='always')
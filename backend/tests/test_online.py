@@ -0,0 +1,32 @@
+"""Online corrections learned from ingested readings"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from online import DecayedWeights
+
+
+def test_reading_without_temperature_keeps_predictions_finite(client, backend, ingest):
+    timestamp = datetime.now().replace(minute=0, second=0, microsecond=0).isoformat()
+    result = ingest([{'timestamp': timestamp, 'location': 'Highway A1',
+                     'vehicle_count': 300, 'average_speed': 50}])
+    assert result['accepted'] == 1
+
+    response = client.post('/api/predictions', json={'location': 'Highway A1', 'hours_ahead': 3})
+    assert response.status_code == 200
+    volumes = [prediction['predicted_volume'] for prediction in response.get_json()['predictions']]
+    assert all(0 <= volume < 10000 for volume in volumes)
+
+    sums = backend.predictor.online.by_location.sums
+    assert np.isfinite(sums).all()
+    assert np.abs(sums).max() < 1e6
+
+
+def test_decayed_tables_must_rescale():
+    class Unscaled(DecayedWeights):
+        pass
+
+    with pytest.raises(TypeError):
+        Unscaled(half_life_hours=24)
@@ -0,0 +1,89 @@
+"""Prediction cache keys and cached predictions"""
+
+import numpy as np
+import pytest
+
+from features import FeatureStore
+from prediction import PredictionCache, TrafficPredictor
+
+
+@pytest.fixture
+def predictor(tmp_path):
+    return TrafficPredictor(model_dir=str(tmp_path), cache=PredictionCache(), feature_store=FeatureStore())
+
+
+def rows(n_rows=1, **values):
+    """Prediction columns for n_rows identical rows"""
+    columns = {'hour': 8, 'day_of_week': 1, 'temperature': 20.0, 'weather_condition': 'rainy',
+               'special_events': False, 'location_type': 'highway', **values}
+    return {name: [value] * n_rows for name, value in columns.items()}
+
+
+def test_equivalent_inputs_share_a_cache_entry(predictor):
+    first = predictor.predict_batch(rows(temperature=20.2, weather_condition='Rainy', location_type='Highway'))
+    second = predictor.predict_batch({**rows(temperature=19.8, special_events=0), 'hour': np.array([8], dtype=np.int8)})
+    assert first['predicted_volume'].tolist() == second['predicted_volume'].tolist()
+    assert predictor.cache.stats()['size'] == 1
+    assert predictor.cache.stats()['hits'] == 1
+
+
+def test_distinct_inputs_get_distinct_entries(predictor):
+    for changed in [{}, {'hour': 9}, {'temperature': 25.0}, {'weather_condition': 'clear'},
+                    {'special_events': True}, {'location_type': 'rural'}]:
+        predictor.predict_batch(rows(**changed))
+    assert predictor.cache.stats()['size'] == 6
+
+
+def test_scalar_and_batch_predictions_agree(predictor):
+    batch = predictor.predict_batch(rows(n_rows=5))
+    scalar = predictor.predict_volume({name: values[0] for name, values in rows().items()})
+    assert set(batch['predicted_volume'].tolist()) == {scalar['predicted_volume']}
+    assert predictor.rows_computed == 1
+
+
+def test_keys_include_the_model_version(predictor):
+    columns = predictor._prepare_columns(rows())
+    assert TrafficPredictor._row_keys('v1', columns) != TrafficPredictor._row_keys('v2', columns)
+    same = predictor._prepare_columns({**rows(temperature=-0.0), 'hour': np.array([8], dtype=np.int8)})
+    assert TrafficPredictor._row_keys('v1', predictor._prepare_columns(rows(temperature=0.0))) == \
+        TrafficPredictor._row_keys('v1', same)
+
+
+def test_batches_with_many_keys_skip_the_cache_with_the_same_results(predictor):
+    many = {**rows(n_rows=300), 'temperature': np.arange(300) - 100.0}
+    first = predictor.predict_batch(many)
+    assert predictor.cache.stats()['size'] == 0
+    assert predictor.cache.stats()['hits'] + predictor.cache.stats()['misses'] == 0
+
+    predictor.predict_batch({name: values[:10] for name, values in many.items()})
+    assert predictor.cache.stats()['size'] == 10
+    again = predictor.predict_batch(many, use_cache=False)
+    assert first['predicted_volume'].tolist() == again['predicted_volume'].tolist()
+    assert first['feature_importance']['time_factors'].tolist() == again['feature_importance']['time_factors'].tolist()
+
+
+def test_seeded_scalar_predictions_match_the_batch():
+    predictor = TrafficPredictor(feature_store=FeatureStore())
+    features = {**rows(n_rows=3), 'hour': [6, 12, 18], 'temperature': [-15.0, 20.0, 35.0],
+                'special_events': [False, True, False]}
+    batch = predictor.predict_batch(features, rng=np.random.default_rng(7))
+
+    rng = np.random.default_rng(7)
+    for i, expected in enumerate(predictor.batch_to_records(batch)):
+        assert predictor.predict_volume({name: values[i] for name, values in features.items()}, rng=rng) == expected
+
+
+@pytest.mark.parametrize('body', [
+    {'hours_ahead': 'x'},
+    {'hours_ahead': 0},
+    {'hours_ahead': -3},
+    {'hours_ahead': 10000},
+    {'weather_forecast': {'temperature': None}},
+    {'weather_forecast': {'temperature': 'warm'}},
+    {'weather_forecast': 'sunny'},
+    {'special_events': 3}
+])
+def test_invalid_prediction_requests_are_rejected(client, body):
+    response = client.post('/api/predictions', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,51 @@
+"""Background retraining jobs and the model hot-swap"""
+
+import time
+
+import pytest
+
+import training
+
+
+@pytest.fixture
+def model_dir(backend, monkeypatch, tmp_path):
+    """Retrain into a throwaway model directory, restoring the serving predictor afterwards"""
+    monkeypatch.setattr(backend, 'MODEL_DIR', str(tmp_path))
+    monkeypatch.setattr(backend, 'predictor', backend.predictor)
+    return tmp_path
+
+
+def wait_for_job(client, status_url, timeout=120):
+    """Poll a job until it finishes, returning its last status"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).get_json()
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Job did not finish: {job}")
+
+
+def test_retrain_job_swaps_in_the_new_model(client, backend, model_dir):
+    previous = backend.predictor
+    response = client.post('/api/model/retrain')
+    assert response.status_code == 202
+    accepted = response.get_json()
+    assert accepted['job']['status'] == 'queued'
+
+    job = wait_for_job(client, accepted['status_url'])
+    assert job['status'] == 'succeeded', job
+    assert job['progress'] == 1.0
+
+    # The callback rebinds the module-level predictor once the artifact is loaded
+    assert backend.predictor is not previous
+    assert backend.predictor.model_info()['version'] == job['training_info']['model_version']
+    assert training.latest_artifact_path(str(model_dir)) is not None
+    response = client.post('/api/predictions', json={'location': 'Highway A1', 'hours_ahead': 3})
+    assert response.status_code == 200
+    assert response.get_json()['model_info']['version'] == job['training_info']['model_version']
+
+
+def test_unknown_jobs_are_not_found(client, model_dir):
+    assert client.get('/api/model/jobs/0123456789ab').status_code == 404
+    assert client.get('/api/model/jobs/not-a-job').status_code == 404
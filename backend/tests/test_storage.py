@@ -0,0 +1,47 @@
+"""SQLite traffic store"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from storage import SQLiteTrafficStore, TrafficStore
+
+
+def observations(locations, timestamps, vehicle_count=100):
+    """Observations in TrafficStore.COLUMNS layout, one per (timestamp, location) pair"""
+    index = pd.MultiIndex.from_product([pd.DatetimeIndex(timestamps), locations], names=['timestamp', 'location'])
+    frame = index.to_frame(index=False)
+    return frame.assign(vehicle_count=vehicle_count, average_speed=50.0, congestion_level='low',
+                        weather_condition='clear', temperature=20.0, visibility=10.0, road_type='urban',
+                        event_nearby=False)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteTrafficStore(str(tmp_path / 'traffic.db'))
+
+
+def test_backends_must_implement_the_interface():
+    class PartialStore(TrafficStore):
+        def append(self, frame):
+            return len(frame)
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_locations_include_writes_from_other_connections(store):
+    store.append(observations(['Main Street'], [datetime(2024, 1, 1)]))
+    assert store.locations() == ['Main Street']
+
+    # A second store on the same file stands in for another worker process
+    SQLiteTrafficStore(store.path).append(observations(['Bridge Road'], [datetime(2024, 1, 1)]))
+    assert store.locations() == ['Bridge Road', 'Main Street']
+
+
+def test_count_with_bucket_matches_resampled_rows(store):
+    store.append(observations(['Main Street', 'Bridge Road'], pd.date_range('2024-01-01', periods=6, freq='20min')))
+    assert store.count() == 12
+    assert store.count(bucket=timedelta(hours=1)) == len(store.query_resampled(timedelta(hours=1))) == 4
+    assert store.count(locations=['Main Street'], bucket=timedelta(days=1)) == 1
@@ -0,0 +1,23 @@
+"""Live feed subscriptions"""
+
+import pytest
+
+from streaming import FeedFull, LiveFeed
+
+
+def test_subscribers_beyond_the_cap_are_rejected():
+    feed = LiveFeed(alerts=list, predictions=dict, to_records=list, tick_seconds=60, max_subscribers=1)
+    first = feed.subscribe()
+    with pytest.raises(FeedFull):
+        feed.subscribe()
+    assert feed.stats()['rejected_subscribers'] == 1
+
+    feed.unsubscribe(first)
+    feed.unsubscribe(feed.subscribe())
+
+
+def test_stream_answers_503_at_capacity(client, backend, monkeypatch):
+    monkeypatch.setattr(backend.live_feed, 'max_subscribers', 0)
+    response = client.get('/api/stream')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,62 @@
+"""Traffic data endpoint"""
+
+import pytest
+
+
+def test_total_records_counts_rows_at_the_requested_resolution(client):
+    raw = client.get('/api/traffic-data?time_range=7d&limit=all').get_json()
+    daily = client.get('/api/traffic-data?time_range=7d&resolution=day&limit=all').get_json()
+    assert raw['total_records'] == len(raw['data'])
+    assert daily['total_records'] == len(daily['data'])
+    assert daily['total_records'] < raw['total_records']
+
+
+def test_unpaged_columns_format_is_limited(client, backend, monkeypatch):
+    monkeypatch.setattr(backend.encoding, 'MAX_COLUMNS_ROWS', 10)
+    assert client.get('/api/traffic-data?time_range=24h&limit=all&format=columns').status_code == 400
+    assert client.get('/api/traffic-data?time_range=24h&limit=10&format=columns').status_code == 200
+    assert client.get('/api/traffic-data?time_range=24h&limit=all&format=ndjson').status_code == 200
+
+
+def rows_key(rows):
+    """(timestamp, location) of each row, in order"""
+    return [(row['timestamp'], row['location']) for row in rows]
+
+
+def walk_back(client, query):
+    """Read a range newest page first, following older_cursor; returns the pages oldest first"""
+    pages = [client.get(f'/api/traffic-data?{query}').get_json()]
+    while pages[-1]['older_cursor']:
+        pages.append(client.get(f"/api/traffic-data?{query}&before={pages[-1]['older_cursor']}").get_json())
+    return pages[::-1]
+
+
+def walk_forward(client, query, page):
+    """Read a range from page onwards, following newer_cursor; returns the pages oldest first"""
+    pages = [page]
+    while pages[-1]['newer_cursor']:
+        pages.append(client.get(f"/api/traffic-data?{query}&after={pages[-1]['newer_cursor']}").get_json())
+    return pages
+
+
+@pytest.mark.parametrize('query, limit', [
+    ('time_range=24h', 7),
+    ('time_range=7d&resolution=hour', 50),
+    ('time_range=30d&resolution=day', 3),
+    ('time_range=7d&location=highway', 11)
+])
+def test_keyset_walks_cover_the_range_once(client, query, limit):
+    everything = rows_key(client.get(f'/api/traffic-data?{query}&limit=all').get_json()['data'])
+    assert everything == sorted(everything)
+
+    backward = walk_back(client, f'{query}&limit={limit}')
+    assert all(len(page['data']) <= limit for page in backward)
+    assert rows_key(row for page in backward for row in page['data']) == everything
+
+    forward = walk_forward(client, f'{query}&limit={limit}', backward[0])
+    assert rows_key(row for page in forward for row in page['data']) == everything
+
+
+def test_cursors_need_a_numeric_limit(client):
+    page = client.get('/api/traffic-data?limit=5').get_json()
+    assert client.get(f"/api/traffic-data?limit=all&before={page['older_cursor']}").status_code == 400
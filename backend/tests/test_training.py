@@ -0,0 +1,41 @@
+"""Model training and memory-mapped artifacts"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import training
+from prediction import TrafficPredictor
+
+
+@pytest.fixture(scope='module')
+def history(backend):
+    return backend.TrafficDataGenerator(seed=3).generate_historical_frame(days=14, end=datetime(2024, 3, 4))
+
+
+def test_saved_artifact_loads_memory_mapped_with_the_same_predictions(history, tmp_path):
+    artifact = training.train_model(history)
+    path = training.save_artifact(artifact, str(tmp_path))
+    assert training.latest_artifact_path(str(tmp_path)) == path
+
+    loaded = training.load_artifact(path)
+    assert isinstance(loaded['model']._predictors[0][0].nodes, np.memmap)
+    features, _, _ = training.build_training_set(history)
+    assert np.array_equal(loaded['model'].predict(features), artifact['model'].predict(features))
+
+    predictor = TrafficPredictor(model_dir=str(tmp_path))
+    assert predictor.model_trained
+    assert predictor.model_info()['version'] == artifact['version']
+
+
+def test_training_needs_enough_history(history):
+    with pytest.raises(ValueError):
+        training.train_model(history.iloc[:50])
+
+
+def test_missing_artifact_falls_back_to_the_multipliers(tmp_path):
+    assert training.latest_artifact_path(str(tmp_path)) is None
+    predictor = TrafficPredictor(model_dir=str(tmp_path))
+    assert not predictor.model_trained
+    assert predictor.model_info()['type'] == 'heuristic'
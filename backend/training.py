@@ -0,0 +1,290 @@
+"""
+TrafficTelligence Model Training
+Feature engineering, model fitting and versioned model artifacts
+
+Models are trained on traffic observations read from the TrafficStore and
+saved as uncompressed joblib artifacts, so they can be loaded memory-mapped
+and shared between worker processes. Training can run as a background job in
+a separate process, reporting its progress through a status file per job.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+import uncertainty
+from features import FeatureStore
+from storage import create_store
+
+# Model inputs, as encoded by FeatureStore.encode, in the column order the estimator is fitted on
+FEATURE_COLUMNS = ['hour', 'day_of_week', 'temperature', 'weather_code', 'special_events', 'location_type_code',
+                   'holiday', 'historical_avg']
+CATEGORICAL_FEATURES = ['hour', 'day_of_week', 'weather_code', 'location_type_code']
+
+MODEL_PARAMS = {
+    'max_iter': 200,
+    'learning_rate': 0.1,
+    'max_leaf_nodes': 31,
+    'random_state': 42
+}
+
+# Fraction of the history, taken from its most recent end, held out for validation
+VALIDATION_FRACTION = 0.2
+
+LATEST_POINTER = 'latest.json'
+JOBS_DIR = 'jobs'
+
+
+def location_type(location: str) -> str:
+    """Location type assumed for a monitored location, judged from its name"""
+    return 'highway' if 'highway' in location.lower() else 'urban'
+
+
+def encode_features(columns: Dict[str, np.ndarray], feature_columns: List[str] = FEATURE_COLUMNS) -> np.ndarray:
+    """
+    Build the model feature matrix from encoded columns
+
+    Args:
+        columns: Equal-length arrays as returned by FeatureStore.encode
+        feature_columns: Columns the model was fitted on, e.g. an older
+            artifact's 'feature_columns'
+
+    Returns:
+        Float matrix with one column per entry in feature_columns
+    """
+    return np.column_stack(
+        [np.asarray(columns[name], dtype=np.float64) for name in feature_columns]
+    ).reshape(-1, len(feature_columns))
+
+
+# Values assumed for observation inputs stored without one, e.g. ingested readings with no temperature
+MISSING_INPUTS = {'temperature': 20, 'weather_condition': 'clear', 'event_nearby': False, 'road_type': 'urban'}
+
+
+def observation_columns(history: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Prediction columns describing stored traffic observations
+
+    The observation's road type stands in for the location type used at
+    prediction time and nearby events for the special-events flag. Inputs
+    a reading was stored without take the values predictions assume when
+    they are omitted.
+    """
+    history = history.fillna({name: value for name, value in MISSING_INPUTS.items() if name in history})
+    timestamps = pd.DatetimeIndex(history['timestamp'])
+    return {
+        'hour': timestamps.hour.to_numpy(),
+        'day_of_week': timestamps.dayofweek.to_numpy(),
+        'temperature': history['temperature'].to_numpy(),
+        'weather_condition': history['weather_condition'].to_numpy(),
+        'special_events': history['event_nearby'].to_numpy(),
+        'location_type': history['road_type'].to_numpy(),
+        'location': history['location'].astype(str).to_numpy(),
+        'timestamp': timestamps.to_numpy()
+    }
+
+
+def build_training_set(history: pd.DataFrame, store: FeatureStore = None):
+    """
+    Turn stored traffic observations into a feature matrix and target
+
+    Args:
+        history: Observations as returned by TrafficStore.query
+        store: Feature store to read historical averages from, for rows it
+            has not seen; by default one is built from history itself and
+            each row's own reading is left out of its average
+
+    Returns:
+        Tuple of (features, vehicle counts, timestamps)
+    """
+    target = history['vehicle_count'].to_numpy(dtype=np.float64)
+    if store is None:
+        columns = FeatureStore.from_history(history).encode(observation_columns(history), exclude=target)
+    else:
+        columns = store.encode(observation_columns(history))
+    return encode_features(columns), target, pd.DatetimeIndex(history['timestamp'])
+
+
+def evaluate(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """Compute validation metrics; accuracy is 100 x (1 - weighted absolute percentage error)"""
+    wape = np.abs(y_true - y_pred).sum() / max(np.abs(y_true).sum(), 1e-9)
+    return {
+        'accuracy': round(float(max(0.0, 100 * (1 - wape))), 2),
+        'mae': round(float(mean_absolute_error(y_true, y_pred)), 3),
+        'rmse': round(float(np.sqrt(mean_squared_error(y_true, y_pred))), 3),
+        'r2': round(float(r2_score(y_true, y_pred)), 4)
+    }
+
+
+def train_model(history: pd.DataFrame, progress: Callable[[str, float], None] = None) -> Dict[str, Any]:
+    """
+    Fit a gradient-boosted regressor on stored traffic history
+
+    The most recent VALIDATION_FRACTION of the history is held out to measure
+    metrics, then the model is refitted on all rows.
+
+    Args:
+        history: Observations as returned by TrafficStore.query
+        progress: Optional callback receiving (stage, fraction complete)
+
+    Returns:
+        Model artifact dictionary ready for save_artifact
+    """
+    if len(history) < 100:
+        raise ValueError(f"Not enough traffic history to train on ({len(history)} rows)")
+
+    progress = progress or (lambda stage, fraction: None)
+    started = time.perf_counter()
+    progress('building_features', 0.2)
+    features, target, timestamps = build_training_set(history)
+    cutoff = timestamps.sort_values()[int(len(timestamps) * (1 - VALIDATION_FRACTION))]
+    train = np.asarray(timestamps < cutoff)
+
+    # Validation rows read historical averages from the training rows only, as later readings would
+    train_features, _, _ = build_training_set(history[train])
+    validation_features, _, _ = build_training_set(history[~train], FeatureStore.from_history(history[train]))
+
+    categorical = [name in CATEGORICAL_FEATURES for name in FEATURE_COLUMNS]
+    progress('validating', 0.3)
+    validation_model = HistGradientBoostingRegressor(categorical_features=categorical, **MODEL_PARAMS)
+    validation_model.fit(train_features, target[train])
+    validation_predictions = validation_model.predict(validation_features)
+    metrics = evaluate(target[~train], validation_predictions)
+
+    # Held-out residuals calibrate prediction intervals until online residuals take over
+    residual_quantiles = uncertainty.quantile_table(
+        uncertainty.relative_residuals(target[~train], validation_predictions), timestamps[~train].hour.to_numpy())
+
+    progress('fitting', 0.6)
+    model = HistGradientBoostingRegressor(categorical_features=categorical, **MODEL_PARAMS)
+    model.fit(features, target)
+
+    trained_at = datetime.now()
+    return {
+        'model': model,
+        'version': trained_at.strftime('%Y%m%dT%H%M%S%f'),
+        'model_type': type(model).__name__,
+        'feature_columns': list(FEATURE_COLUMNS),
+        'metrics': metrics,
+        'residual_quantiles': residual_quantiles,
+        'data_points_used': int(len(history)),
+        'training_time_seconds': round(time.perf_counter() - started, 2),
+        'trained_at': trained_at.isoformat()
+    }
+
+
+def artifact_metadata(artifact: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the JSON-serializable part of an artifact"""
+    return {key: value for key, value in artifact.items() if key not in ('model', 'residual_quantiles')}
+
+
+def save_artifact(artifact: Dict[str, Any], model_dir: str) -> str:
+    """
+    Write a versioned artifact and point LATEST_POINTER at it
+
+    The artifact is stored uncompressed so it can be memory-mapped. Both files
+    are written under temporary names and renamed into place, so readers never
+    see a partial artifact.
+
+    Returns:
+        Path of the saved artifact
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    filename = f"traffic_model_{artifact['version']}.joblib"
+    path = os.path.join(model_dir, filename)
+
+    joblib.dump(artifact, path + '.tmp', compress=0)
+    os.replace(path + '.tmp', path)
+
+    pointer = os.path.join(model_dir, LATEST_POINTER)
+    with open(pointer + '.tmp', 'w') as f:
+        json.dump({'artifact': filename, **artifact_metadata(artifact)}, f, indent=2)
+    os.replace(pointer + '.tmp', pointer)
+
+    return path
+
+
+def latest_artifact_path(model_dir: str) -> Optional[str]:
+    """Return the artifact LATEST_POINTER refers to, or None if there is none"""
+    try:
+        with open(os.path.join(model_dir, LATEST_POINTER)) as f:
+            path = os.path.join(model_dir, json.load(f)['artifact'])
+    except (OSError, ValueError, KeyError):
+        return None
+    return path if os.path.exists(path) else None
+
+
+def load_artifact(path: str) -> Dict[str, Any]:
+    """Load an artifact with its arrays memory-mapped read-only"""
+    return joblib.load(path, mmap_mode='r')
+
+
+def run_training(database_url: str, model_dir: str, start: datetime,
+                 progress: Callable[[str, float], None] = None) -> Dict[str, Any]:
+    """
+    Train on the stored history since start and save the result as the latest artifact
+
+    Only picklable arguments are taken, so this can run in a worker process.
+
+    Returns:
+        Artifact metadata, including the 'path' it was saved to
+    """
+    progress = progress or (lambda stage, fraction: None)
+    progress('loading_data', 0.05)
+    history = create_store(database_url).query(start=start)
+
+    artifact = train_model(history, progress)
+
+    progress('saving', 0.9)
+    path = save_artifact(artifact, model_dir)
+    return {**artifact_metadata(artifact), 'path': path}
+
+
+def run_training_job(job_id: str, database_url: str, model_dir: str, start: datetime) -> Dict[str, Any]:
+    """Process pool entry point for run_training that records progress in the job's status file"""
+    def progress(stage: str, fraction: float) -> None:
+        write_job_status(model_dir, job_id, status='running', stage=stage, progress=fraction)
+
+    write_job_status(model_dir, job_id, status='running', stage='starting', progress=0.0,
+                     started_at=datetime.now().isoformat())
+    return run_training(database_url, model_dir, start, progress)
+
+
+def write_job_status(model_dir: str, job_id: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Merge fields into a job's status file
+
+    Status files live under the model directory, so any worker process can
+    answer status requests for a job started by another one.
+    """
+    jobs_dir = os.path.join(model_dir, JOBS_DIR)
+    os.makedirs(jobs_dir, exist_ok=True)
+    path = os.path.join(jobs_dir, f"{job_id}.json")
+
+    status = read_job_status(model_dir, job_id) or {'job_id': job_id}
+    status.update(fields)
+    status['updated_at'] = datetime.now().isoformat()
+
+    with open(f"{path}.{os.getpid()}.tmp", 'w') as f:
+        json.dump(status, f, indent=2)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return status
+
+
+def read_job_status(model_dir: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """Return a job's status, or None if the job is unknown"""
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(model_dir, JOBS_DIR, f"{job_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
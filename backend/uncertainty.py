@@ -0,0 +1,84 @@
+"""
+TrafficTelligence Prediction Intervals
+Residual quantile tables for calibrated probabilistic forecasts
+
+Intervals are built from the model's own errors rather than from sampling.
+The distribution of relative residuals, (observed - predicted) / predicted,
+is summarized per hour of day as quantiles on a fixed grid of levels: from a
+held-out validation set when a model is trained, and online from every batch
+of new readings. A forecast for any set of levels is then one table lookup
+per row: predicted * (1 + residual quantile of the row's hour).
+"""
+
+from typing import Iterable, Tuple
+
+import numpy as np
+
+# Levels every residual table holds; requested levels are interpolated between them
+QUANTILE_GRID = np.round(np.linspace(0.01, 0.99, 99), 2)
+
+# Relative residual histogram: bins of 0.02 from -1 (nothing observed) to +3 (four times the prediction)
+RESIDUAL_EDGES = np.linspace(-1.0, 3.0, 201)
+
+# Readings' worth of the pooled distribution mixed into each hour's histogram
+POOLED_PRIOR_WEIGHT = 20.0
+
+
+class ResidualsUnavailable(RuntimeError):
+    """Raised when intervals are requested before any residuals were observed"""
+
+
+def parse_levels(levels: Iterable[float]) -> Tuple[float, ...]:
+    """Validate requested quantile levels; raises ValueError for levels outside the grid"""
+    parsed = tuple(float(level) for level in levels)
+    if not parsed or len(parsed) > 20:
+        raise ValueError('Between 1 and 20 quantile levels are required')
+    if any(not QUANTILE_GRID[0] <= level <= QUANTILE_GRID[-1] for level in parsed):
+        raise ValueError(f"Quantile levels must be between {QUANTILE_GRID[0]} and {QUANTILE_GRID[-1]}")
+    return parsed
+
+
+def relative_residuals(observed: np.ndarray, predicted: np.ndarray) -> np.ndarray:
+    predicted = np.maximum(np.asarray(predicted, dtype=np.float64), 0.0)
+    return (np.asarray(observed, dtype=np.float64) - predicted) / np.maximum(predicted, 1.0)
+
+
+def quantile_table(residuals: np.ndarray, hours: np.ndarray) -> np.ndarray:
+    """Empirical residual quantiles on QUANTILE_GRID for each hour of day, shape (24, grid)"""
+    weights = np.zeros((24, len(RESIDUAL_EDGES) - 1))
+    bins = np.clip(np.searchsorted(RESIDUAL_EDGES, residuals, side='right') - 1, 0, weights.shape[1] - 1)
+    np.add.at(weights, (np.asarray(hours, dtype=np.int64) % 24, bins), 1.0)
+    return histogram_quantiles(weights)
+
+
+def histogram_quantiles(weights: np.ndarray) -> np.ndarray:
+    """
+    Quantiles on QUANTILE_GRID from per-hour residual histograms, shape (24, grid)
+
+    Each hour is mixed with POOLED_PRIOR_WEIGHT readings of the pooled
+    distribution, so hours with few readings still get a stable table.
+    """
+    pooled = weights.sum(axis=0)
+    if pooled.sum() <= 0:
+        raise ValueError('No residuals to build quantiles from')
+    blended = weights + POOLED_PRIOR_WEIGHT * pooled / pooled.sum()
+    cdf = np.cumsum(blended, axis=1) / blended.sum(axis=1, keepdims=True)
+
+    # Linear interpolation inside the bin where each level is crossed
+    table = np.empty((weights.shape[0], len(QUANTILE_GRID)))
+    for hour in range(weights.shape[0]):
+        upper = np.minimum(np.searchsorted(cdf[hour], QUANTILE_GRID), len(RESIDUAL_EDGES) - 2)
+        below = np.where(upper > 0, cdf[hour][upper - 1], 0.0)
+        mass = np.maximum(cdf[hour][upper] - below, 1e-12)
+        width = RESIDUAL_EDGES[upper + 1] - RESIDUAL_EDGES[upper]
+        table[hour] = RESIDUAL_EDGES[upper] + width * np.clip((QUANTILE_GRID - below) / mass, 0.0, 1.0)
+    return table
+
+
+def select_levels(table: np.ndarray, levels: Tuple[float, ...]) -> np.ndarray:
+    """Columns of a grid table interpolated at the requested levels, shape (24, len(levels))"""
+    position = np.interp(levels, QUANTILE_GRID, np.arange(len(QUANTILE_GRID)))
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, len(QUANTILE_GRID) - 1)
+    fraction = position - lower
+    return table[:, lower] * (1 - fraction) + table[:, upper] * fraction